@@ -1,14 +1,60 @@
 import os
 import json
+import copy
 import uuid
 import datetime as dt
 from io import BytesIO
+import io
 import re
-
-from flask import Flask, request, render_template_string, send_file, redirect, url_for, jsonify
-from openpyxl import Workbook, load_workbook
-from openpyxl.styles import PatternFill, Alignment, Border, Side, Font
-from openpyxl.utils import get_column_letter
+import csv
+import time
+import cProfile
+import pstats
+import tracemalloc
+import threading
+import unicodedata
+import gzip
+import zlib
+import hashlib
+import hmac
+import queue
+import base64
+import bisect
+import heapq
+import mmap
+import struct
+import multiprocessing
+import contextlib
+import contextvars
+import functools
+import itertools
+from collections import deque, OrderedDict, Counter
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlencode
+
+MODULE_IMPORT_STARTED = time.time()  # Mốc đo thời gian khởi động (trước khi nạp Flask)
+
+import click
+
+from werkzeug.local import LocalProxy
+from markupsafe import Markup
+from flask import Flask, Response, request, render_template, send_file, redirect, url_for, jsonify, g, abort, make_response
+# openpyxl chỉ được nạp khi import/export Excel (giảm thời gian khởi động)
+
+try:
+    import brotli  # Tuỳ chọn: nén "br" nếu đã cài
+except ImportError:
+    brotli = None
+
+try:
+    import numpy as np  # Tổng hợp thống kê dạng vector (có trong requirements.txt; thiếu thì dùng vòng lặp Python)
+except ImportError:
+    np = None
+
+try:
+    import fcntl  # Khoá file khi ghi log thay đổi (chỉ có trên POSIX)
+except ImportError:
+    fcntl = None
 
 app = Flask(__name__)
 
@@ -17,6 +63,135 @@ COMPANY_NAME = "Đồng Tiến Bakery"
 DATA_PATH = os.path.join(os.path.dirname(__file__), "data", "meeting_schedule.json")  # Lưu JSON
 WEEK_DAYS = 6  # Thứ 2 -> Thứ 7
 
+# Khối ghi chú + chữ ký cuối file Excel: (chức danh, họ tên) theo thứ tự cột 2, 4, 6
+EXCEL_NOTE = "Ghi chú: Các cuộc họp phát sinh TL.BGĐ xin ý kiến BGĐ thống nhất -> HV cập nhật lên phần mềm"
+EXCEL_CITY = "Đà Nẵng"
+EXCEL_SIGNATURES = [("BGĐ KIỂM TRA", "Phan Thị Yến Tuyết"), ("TP.NS&ĐT Kiểm tra", "Trần Thị Kim Oanh"),
+                    ("Người lập biểu", "Trần Thị Mỹ Tân")]
+
+# Nhiều chi nhánh trong 1 tiến trình (mỗi chi nhánh 1 thư mục con của TENANTS_DIR)
+TENANTS_DIR = os.environ.get("TENANTS_DIR", os.path.join(os.path.dirname(__file__), "data", "tenants"))
+TENANT_BASE_DOMAIN = os.environ.get("TENANT_BASE_DOMAIN", "")  # VD: lichhop.example.com -> <mã>.lichhop.example.com
+DEFAULT_TENANT = os.environ.get("TENANT", "")  # Chi nhánh dùng cho CLI / request không chỉ định ("" = data/)
+TENANT_MAX_LOADED = int(os.environ.get("TENANT_MAX_LOADED", "16"))  # Số chi nhánh giữ cache/chỉ mục trong bộ nhớ
+TENANT_IDLE_SECONDS = int(os.environ.get("TENANT_IDLE_SECONDS", "1800"))  # Không dùng quá lâu -> giải phóng
+
+# Quản trị & profiling (bật bằng biến môi trường ADMIN_TOKEN)
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(os.path.dirname(__file__), "profiles"))
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", "50"))  # Số bản ghi profile giữ lại
+PROFILE_TOP_ALLOCS = 30
+
+# HTTP cache & nén
+COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", "1024"))  # bytes
+COMPRESS_MIMETYPES = {"text/html", "application/json", "text/calendar", "text/plain", "text/css", "application/javascript"}
+STATIC_MAX_AGE = 365 * 24 * 3600
+APP_BUILD = str(int(os.path.getmtime(__file__)))  # Đổi khi deploy code mới -> ETag mới
+
+# Cập nhật trực tiếp (SSE) - log thay đổi dùng chung giữa các worker gunicorn
+BROKER_PATH = os.environ.get("BROKER_PATH", os.path.join(os.path.dirname(__file__), "data", "changes.log"))
+BROKER_MAX_BYTES = 2 * 1024 * 1024  # Xoay vòng log khi vượt ngưỡng
+BROKER_POLL_SECONDS = 0.5
+SSE_KEEPALIVE_SECONDS = 15
+SSE_MAX_SECONDS = 55  # Đóng stream định kỳ, EventSource tự kết nối lại
+SSE_MAX_STREAMS = int(os.environ.get("SSE_MAX_STREAMS", "4"))  # Mỗi stream giữ 1 luồng của worker suốt SSE_MAX_SECONDS
+SSE_POLL_SECONDS = 30  # Quá SSE_MAX_STREAMS: trả thay đổi đã lỡ rồi đóng, trình duyệt hỏi lại sau 30s (polling)
+
+BATCH_MAX_OPERATIONS = 2000  # Giới hạn số thao tác trong 1 lần gọi /api/events:batch
+COPY_POLICIES = ("skip", "merge", "overwrite")
+COPY_MAX_TARGETS = 60  # Số tuần đích tối đa cho 1 lần sao chép
+
+# Xếp lịch tự động
+SOLVER_SLOT_MINUTES = 15
+SOLVER_DAY_START = "07:00"
+SOLVER_WINDOWS = {"SÁNG": ("07:30", "12:00"), "CHIỀU": ("13:00", "17:30")}
+SOLVER_MAX_REQUESTS = 300
+
+# Xem lịch theo khoảng ngày (tháng/quý)
+RANGE_MAX_DAYS = 400
+SCHEDULE_CACHE_SIZE = 256  # Số tuần giữ kết quả build_schedule trong bộ nhớ
+FRAGMENT_CACHE_SIZE = 4096  # Số mảnh HTML (ô lịch / nhóm dòng bảng) của trang chủ giữ trong bộ nhớ
+
+# Truy vấn sự kiện theo khoảng ngày
+EVENTS_PAGE_DEFAULT = 100
+EVENTS_PAGE_MAX = 500
+AGENDA_PAGE_DEFAULT = 20  # Số cuộc họp mỗi trang lịch cá nhân
+
+# Gợi ý tên cuộc họp khi gõ
+TITLE_SUGGEST_LIMIT = 8
+TITLE_SUGGEST_MAX = 20
+TITLE_TRIE_DEPTH = 24  # Trie chỉ sâu đến 24 ký tự (đã bỏ dấu); tiền tố dài hơn lọc bằng startswith
+TITLE_HALF_LIFE_DAYS = 90  # Tên không dùng 90 ngày thì điểm giảm một nửa
+
+# Xuất toàn bộ lịch sử dạng luồng
+EXPORT_FIELDS = ["session_id", "id", "date", "session_buoi", "start_time", "end_time",
+                 "title", "category", "chair", "attendees", "location"]
+EXPORT_CHUNK_ROWS = 500  # Số sự kiện lấy từ chỉ mục mỗi lần
+EXPORT_FLUSH_BYTES = 64 * 1024  # Gom dòng thành khối ~64KB trước khi gửi
+
+# Thống kê sử dụng
+ANALYTICS_TOP = 20  # Số phòng/người hiển thị trong mỗi bảng
+ANALYTICS_HOURS = range(6, 21)  # Cột giờ trên heatmap của trang thống kê
+
+# Kiểm tra trùng lịch toàn bộ lịch sử
+AUDIT_CACHE_PATH = os.environ.get("AUDIT_CACHE_PATH", os.path.join(os.path.dirname(__file__), "data", "audit_cache.json"))
+
+# Dòng lệnh (flask --app app ...)
+CLI_BATCH_SIZE = 2000  # Số sự kiện mỗi lần ghi khi import hàng loạt
+VERIFY_MAX_REPORT = 200  # Số lỗi in ra tối đa của lệnh verify
+
+# Snapshot nhị phân dùng chung giữa các worker (mmap)
+SNAPSHOT_PATH = os.environ.get("SNAPSHOT_PATH", os.path.join(os.path.dirname(__file__), "data", "snapshot.bin"))
+
+# Nhắc lịch họp
+REMINDER_SINK = os.environ.get("REMINDER_SINK", "log")  # log | smtp | webhook | off
+REMINDER_LEAD_MINUTES = int(os.environ.get("REMINDER_LEAD_MINUTES", "15"))  # Nhắc trước giờ bắt đầu
+REMINDER_BATCH_SECONDS = 60  # Các lời nhắc đến hạn gần nhau gộp thành 1 thông báo cho mỗi người
+REMINDER_POLL_SECONDS = 15  # Chu kỳ kiểm tra file dữ liệu để thấy thay đổi do worker khác ghi
+REMINDER_STATE_PATH = os.environ.get("REMINDER_STATE_PATH", os.path.join(os.path.dirname(__file__), "data", "reminders_sent.json"))
+REMINDER_LOG_PATH = os.environ.get("REMINDER_LOG_PATH", os.path.join(os.path.dirname(__file__), "data", "reminders.log"))
+REMINDER_SMTP_HOST = os.environ.get("REMINDER_SMTP_HOST", "localhost")
+REMINDER_SMTP_PORT = int(os.environ.get("REMINDER_SMTP_PORT", "1025"))  # VD: python -m aiosmtpd -n -l localhost:1025
+REMINDER_MAIL_FROM = os.environ.get("REMINDER_MAIL_FROM", "lichhop@localhost")
+REMINDER_MAIL_DOMAIN = os.environ.get("REMINDER_MAIL_DOMAIN", "localhost")  # Địa chỉ mặc định: <tên không dấu>@domain
+REMINDER_ADDRESS_BOOK = os.environ.get("REMINDER_ADDRESS_BOOK", "")  # File JSON {"Tên": "email"} (tuỳ chọn)
+REMINDER_WEBHOOK_URL = os.environ.get("REMINDER_WEBHOOK_URL", "")
+
+# Khôi phục từ backup JSON
+RESTORE_POLICIES = ("merge_id", "merge_content", "replace")
+RESTORE_READ_BYTES = 64 * 1024  # Đọc file backup theo khối
+
+# Đồng bộ theo phiên bản (/api/sync) + client offline
+SYNC_LOG_PATH = os.environ.get("SYNC_LOG_PATH", os.path.join(os.path.dirname(__file__), "data", "sync.log"))
+SYNC_LOG_MAX_ENTRIES = 50000  # Vượt ngưỡng -> giữ lại nửa mới nhất
+SYNC_PAGE_MAX = 1000  # Số thay đổi tối đa mỗi lần gọi /api/sync
+OFFLINE_WEEKS_BACK = 4  # Client offline tải sẵn các tuần quanh tuần hiện tại
+OFFLINE_WEEKS_AHEAD = 8
+
+# Kiểm soát tải: giới hạn request xuất/nhập nặng trong mỗi worker
+WORKER_THREADS = int(os.environ.get("GUNICORN_THREADS", "1"))  # Do gunicorn.conf.py đặt; chạy không qua file đó: 1 luồng
+HEAVY_CONCURRENCY = int(os.environ.get("HEAVY_CONCURRENCY", "2"))  # Số request nặng chạy cùng lúc
+HEAVY_QUEUE = int(os.environ.get("HEAVY_QUEUE", "2"))  # Số request nặng được xếp hàng chờ
+HEAVY_QUEUE_TIMEOUT = float(os.environ.get("HEAVY_QUEUE_TIMEOUT", "15"))  # Chờ quá lâu -> 503
+INTERACTIVE_RESERVED = int(os.environ.get("INTERACTIVE_RESERVED", "4"))  # Luồng luôn dành cho trang thường
+HEAVY_ENDPOINTS = {"export_excel", "export_ics", "import_data", "api_import", "restore_data", "copy_week",
+                   "api_audit_conflicts"}
+
+# Trang tuần tĩnh (HTML + ICS) cho người chỉ xem; PUBLISH_DIR="" để tắt
+PUBLISH_DIR = os.environ.get("PUBLISH_DIR", os.path.join(os.path.dirname(__file__), "public"))
+PUBLISH_DEBOUNCE_SECONDS = 1.0  # Gom các lần ghi liên tiếp thành 1 lần xuất bản
+
+# Import dạng luồng (ICS/CSV/JSONL)
+IMPORT_BATCH_SIZE = 1000  # Số sự kiện mỗi lần ghi
+IMPORT_MAX_ERRORS = 50  # Số lỗi chi tiết trả về
+# Giờ lịch lưu theo giờ địa phương (Asia/Ho_Chi_Minh, UTC+7, không có giờ mùa hè): giờ "...Z" trong file ICS
+# được cộng thêm số giờ này khi nhập và trừ đi khi xuất
+ICS_UTC_OFFSET_HOURS = float(os.environ.get("ICS_UTC_OFFSET_HOURS", "7"))
+SCHEDULE_TZ = dt.timezone(dt.timedelta(hours=ICS_UTC_OFFSET_HOURS))  # Múi giờ của giờ họp, không theo múi giờ server
+
+# Danh mục người/phòng -> ID số nguyên
+REGISTRY_PATH = os.environ.get("REGISTRY_PATH", os.path.join(os.path.dirname(__file__), "data", "registry.json"))
+
 # Bảng màu Chủ trì
 CHAIR_COLORS = {
     'TGĐ': '#fcba03',
@@ -58,22 +233,275 @@ CHAIR_COLORS = {
 CATEGORIES = ["Họp định kỳ", "Họp nội bộ", "Đào tạo", "Phỏng vấn"]
 ROOMS = ["Phòng họp 1", "Phòng họp 2", "Phòng họp 3", "Phòng Tổng Giám Đốc"]
 
+# ========== NHIỀU CHI NHÁNH (TENANT) ==========
+# Mỗi chi nhánh là 1 thư mục TENANTS_DIR/<mã>/ gồm tenant.json (tên công ty, phòng, màu chủ trì, khối chữ ký
+# Excel) và các file dữ liệu riêng. Chi nhánh "" dùng data/ và cấu hình trong code như trước.
+# Chọn chi nhánh theo đường dẫn /t/<mã>/... hoặc subdomain <mã>.TENANT_BASE_DOMAIN; CLI dùng biến TENANT.
+# Danh mục tên, chỉ mục, thống kê, snapshot... của chi nhánh chỉ nạp khi có request; giữ tối đa
+# TENANT_MAX_LOADED chi nhánh (LRU) và giải phóng chi nhánh không dùng quá TENANT_IDLE_SECONDS.
+TENANT_SLUG_RE = re.compile(r"[a-z0-9][a-z0-9-]{0,39}")
+TENANT_FILES = {"data": "meeting_schedule.json", "registry": "registry.json", "broker": "changes.log",
+                "snapshot": "snapshot.bin", "audit_cache": "audit_cache.json",
+                "reminder_state": "reminders_sent.json", "reminder_log": "reminders.log", "sync_log": "sync.log",
+                "config": "tenant.json"}
+
+def tenant_paths(slug):
+    if not slug:
+        return {"data": DATA_PATH, "registry": REGISTRY_PATH, "broker": BROKER_PATH, "snapshot": SNAPSHOT_PATH,
+                "audit_cache": AUDIT_CACHE_PATH, "reminder_state": REMINDER_STATE_PATH,
+                "reminder_log": REMINDER_LOG_PATH, "sync_log": SYNC_LOG_PATH, "config": None}
+    base = os.path.join(TENANTS_DIR, slug)
+    return {kind: os.path.join(base, name) for kind, name in TENANT_FILES.items()}
+
+def tenant_exists(slug) -> bool:
+    return slug == "" or bool(TENANT_SLUG_RE.fullmatch(slug or "")) and os.path.isfile(tenant_paths(slug)["config"])
+
+def tenant_slugs():
+    slugs = {DEFAULT_TENANT}
+    if os.path.isdir(TENANTS_DIR):
+        slugs.update(name for name in os.listdir(TENANTS_DIR) if tenant_exists(name))
+    return sorted(slugs)
+
+def default_tenant_config(company):
+    return {"company": company, "rooms": ROOMS, "categories": CATEGORIES, "chair_colors": CHAIR_COLORS,
+            "excel_note": EXCEL_NOTE, "excel_city": EXCEL_CITY, "excel_signatures": EXCEL_SIGNATURES}
+
+class Tenant:
+    def __init__(self, slug):
+        self.slug = slug
+        paths = tenant_paths(slug)
+        self.data_path, self.snapshot_path = paths["data"], paths["snapshot"]
+        self.audit_cache_path, self.reminder_log_path = paths["audit_cache"], paths["reminder_log"]
+        config = default_tenant_config(COMPANY_NAME)
+        if paths["config"]:
+            with open(paths["config"], "r", encoding="utf-8") as f:
+                config.update(json.load(f))
+        self.company = config["company"]
+        self.rooms, self.categories, self.chair_colors = config["rooms"], config["categories"], config["chair_colors"]
+        self.excel_note, self.excel_city = config["excel_note"], config["excel_city"]
+        self.excel_signatures = [tuple(x) for x in config["excel_signatures"]]
+        self.name_registry = NameRegistry(paths["registry"], self.chair_colors, self.rooms)
+        self.change_broker = ChangeBroker(paths["broker"])
+        self.sync_log = SyncLog(paths["sync_log"])
+        self.event_index = EventIndex()
+        self.analytics_rollups = AnalyticsRollups()
+        self.title_index = TitleIndex()
+        self.snapshot_state = {"key": None, "snapshot": None}
+        self.last_used = time.time()
+
+    def busy(self) -> bool:
+        # Còn stream SSE đang mở -> không giải phóng
+        return bool(self.change_broker.subscribers)
+
+    def close(self):
+        self.change_broker.stopped = True
+        self.snapshot_state = {"key": None, "snapshot": None}
+        with _schedule_cache_lock:
+            for key in [k for k in _schedule_cache if k[0] == self.slug]:
+                del _schedule_cache[key]
+        fragment_cache.drop(self.slug)
+
+    def status(self):
+        return {"slug": self.slug, "company": self.company, "idle_seconds": round(time.time() - self.last_used, 1),
+                "indexed_events": len(self.event_index.events), "names": len(self.name_registry.names),
+                "sse_streams": len(self.change_broker.subscribers), "snapshot_open": self.snapshot_state["snapshot"] is not None}
+
+class TenantCache:
+    SWEEP_SECONDS = 60
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loaded = OrderedDict()
+        self.last_sweep = time.time()
+        self.evicted = 0
+
+    def get(self, slug):
+        with self.lock:
+            now = time.time()
+            tenant = self.loaded.get(slug)
+            if tenant is None:
+                tenant = self.loaded[slug] = Tenant(slug)
+                self._evict(lambda t: len(self.loaded) > TENANT_MAX_LOADED)
+            else:
+                self.loaded.move_to_end(slug)
+            tenant.last_used = now
+            if now - self.last_sweep > self.SWEEP_SECONDS:
+                self.last_sweep = now
+                self._evict(lambda t: now - t.last_used > TENANT_IDLE_SECONDS, scan_all=True)
+            return tenant
+
+    def _evict(self, should_evict, scan_all=False):
+        # Duyệt từ chi nhánh ít dùng nhất; bỏ qua chi nhánh mặc định và chi nhánh đang có stream SSE
+        for slug, tenant in list(self.loaded.items()):
+            if not should_evict(tenant):
+                if scan_all:
+                    continue
+                break
+            if slug == DEFAULT_TENANT or tenant.busy():
+                continue
+            del self.loaded[slug]
+            tenant.close()
+            self.evicted += 1
+            print(f"Giải phóng cache chi nhánh {slug} (không dùng {time.time() - tenant.last_used:.0f}s)")
+
+    def status(self):
+        with self.lock:
+            tenants_loaded = list(self.loaded.values())
+        return {"loaded": [t.status() for t in tenants_loaded], "max_loaded": TENANT_MAX_LOADED,
+                "idle_seconds": TENANT_IDLE_SECONDS, "evicted": self.evicted, "known": tenant_slugs()}
+
+tenants = TenantCache()
+_current_tenant = contextvars.ContextVar("tenant", default=None)
+
+def current_tenant():
+    # Trong request: chi nhánh do TenantMiddleware chọn; ngoài request (CLI, luồng nền): DEFAULT_TENANT
+    tenant = _current_tenant.get()
+    if tenant is None:
+        tenant = tenants.get(DEFAULT_TENANT)
+    return tenant
+
+@contextlib.contextmanager
+def use_tenant(slug):
+    token = _current_tenant.set(tenants.get(slug))
+    try:
+        yield _current_tenant.get()
+    finally:
+        _current_tenant.reset(token)
+
+class TenantMiddleware:
+    # /t/<mã>/... -> "/t/<mã>" chuyển sang SCRIPT_NAME để route giữ nguyên và url_for sinh link đúng chi nhánh
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        slug = DEFAULT_TENANT
+        host = environ.get("HTTP_HOST", "").split(":")[0].lower()
+        if TENANT_BASE_DOMAIN and host.endswith("." + TENANT_BASE_DOMAIN):
+            slug = host[:-len(TENANT_BASE_DOMAIN) - 1]
+        m = re.match(r"/t/([^/]+)(/.*)?$", environ.get("PATH_INFO", ""))
+        if m:
+            slug = m.group(1)
+            environ["SCRIPT_NAME"] = environ.get("SCRIPT_NAME", "") + "/t/" + slug
+            environ["PATH_INFO"] = m.group(2) or "/"
+        if not tenant_exists(slug):
+            start_response("404 NOT FOUND", [("Content-Type", "text/plain; charset=utf-8")])
+            return ["Không tìm thấy chi nhánh".encode("utf-8")]
+        _current_tenant.set(tenants.get(slug))
+        return self.wsgi_app(environ, start_response)
+
+app.wsgi_app = TenantMiddleware(app.wsgi_app)
+
+@app.cli.command("tenant-create")
+@click.argument("slug")
+@click.option("--company", required=True, help="Tên hiển thị trên lịch / file Excel")
+def tenant_create_command(slug, company):
+    """Tạo chi nhánh mới (sửa TENANTS_DIR/<mã>/tenant.json để đổi phòng, màu, chữ ký). Lệnh khác: TENANT=<mã> flask ..."""
+    if not TENANT_SLUG_RE.fullmatch(slug):
+        raise click.ClickException("Mã chi nhánh chỉ gồm a-z, 0-9, '-' (tối đa 40 ký tự)")
+    config_path = tenant_paths(slug)["config"]
+    if os.path.exists(config_path):
+        raise click.ClickException(f"Chi nhánh đã tồn tại: {config_path}")
+    os.makedirs(os.path.dirname(config_path), exist_ok=True)
+    with open(config_path, "w", encoding="utf-8") as f:
+        json.dump(default_tenant_config(company), f, ensure_ascii=False, indent=2)
+    print(f"Đã tạo chi nhánh {slug}: {config_path}")
+
 # ========== TIỆN ÍCH ==========
 def ensure_data_file():
-    data_dir = os.path.dirname(DATA_PATH)
-    os.makedirs(data_dir, exist_ok=True)
-    if not os.path.exists(DATA_PATH):
-        with open(DATA_PATH, "w", encoding="utf-8") as f:
-            json.dump({"sessions": []}, f, ensure_ascii=False, indent=2)
+    data_path = current_tenant().data_path
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+    if not os.path.exists(data_path):
+        write_atomic(data_path, json.dumps({"sessions": []}, ensure_ascii=False, indent=2).encode("utf-8"))
+
+# Khoá đọc-sửa-ghi: mọi đoạn load_data() -> sửa -> save_data() chạy trong data_lock()
+# (RLock trong tiến trình + flock trên <data>.lock giữa các worker và lệnh CLI). Gọi lồng nhau được.
+# File dữ liệu được ghi ra file tạm rồi os.replace -> người đọc không bao giờ thấy file ghi dở.
+_data_lock = threading.RLock()
+_data_lock_depth = threading.local()
+
+@contextlib.contextmanager
+def data_lock():
+    with _data_lock:
+        depth = getattr(_data_lock_depth, "n", 0)
+        lock_file = None
+        if depth == 0:
+            path = current_tenant().data_path + ".lock"
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            lock_file = open(path, "a")
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+        _data_lock_depth.n = depth + 1
+        try:
+            yield
+        finally:
+            _data_lock_depth.n = depth
+            if lock_file is not None:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+
+def writes_data(fn):
+    # Giữ data_lock() suốt hàm (route/lệnh CLI đọc rồi ghi dữ liệu)
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with data_lock():
+            return fn(*args, **kwargs)
+    return wrapper
+
+def data_file_key():
+    try:
+        st = os.stat(current_tenant().data_path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def synced_index(index):
+    # Chỉ mục trong bộ nhớ (sự kiện, thống kê, gợi ý tên): chỉ đọc lại dữ liệu khi file JSON đổi
+    # (worker khác ghi) hoặc danh mục tên đổi epoch; trong cùng worker on_commit đã cập nhật sẵn.
+    # Lấy khoá TRƯỚC khi đọc: file đổi giữa chừng thì lần sau đồng bộ lại (không bao giờ bỏ sót).
+    name_registry.ensure_loaded()
+    key = (data_file_key(), name_registry.epoch)
+    if not index.built or index.data_key != key:
+        index.sync(load_data_readonly())
+        index.data_key = key
+    return index
+
+def resync_after_commit(index, data):
+    # Gọi trong save_data (đang giữ data_lock): file trên đĩa đúng là data vừa ghi
+    if index.built:
+        index.sync(data)
+        index.data_key = (data_file_key(), name_registry.epoch)
 
 def load_data():
     ensure_data_file()
-    with open(DATA_PATH, "r", encoding="utf-8") as f:
-        return json.load(f)
+    with open(current_tenant().data_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    check_name_ids(data)
+    return data
 
 def save_data(data):
-    with open(DATA_PATH, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    if data.get("read_only"):
+        raise RuntimeError("Dữ liệu đọc từ snapshot không được ghi lại")
+    with data_lock():
+        data["registry_epoch"] = name_registry.epoch
+        path = current_tenant().data_path
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+        flush_changes()
+        for hook in COMMIT_HOOKS:
+            try:
+                hook(data)
+            except Exception as e:
+                print(f"Lỗi khi chạy {hook.__name__} sau khi lưu: {e}")
+
+# Các hàm chạy sau mỗi lần save_data thành công (cập nhật chỉ mục, cache...)
+COMMIT_HOOKS = []
+
+def on_commit(fn):
+    COMMIT_HOOKS.append(fn)
+    return fn
 
 def monday_of_week(any_date: dt.date) -> dt.date:
     return any_date - dt.timedelta(days=any_date.weekday())
@@ -119,10 +547,15 @@ def compute_conflicts(events):
         arr.sort(key=lambda x: hhmm_to_minutes(x["start_time"]))
         for i in range(len(arr)):
             arr[i]["conflict"] = False
-        for i in range(1, len(arr)):
-            if overlap(arr[i - 1], arr[i]):
-                arr[i]["conflict"] = True
-                arr[i - 1]["conflict"] = True
+        # So với mọi cuộc bắt đầu trước khi cuộc này kết thúc (không chỉ cuộc liền kề)
+        for i in range(len(arr)):
+            end = hhmm_to_minutes(arr[i]["end_time"])
+            for other in arr[i + 1:]:
+                if hhmm_to_minutes(other["start_time"]) >= end:
+                    break
+                if overlap(arr[i], other):
+                    arr[i]["conflict"] = True
+                    other["conflict"] = True
 
 def compute_attendees_location_conflicts(events):
     by_key = {}
@@ -131,17 +564,16 @@ def compute_attendees_location_conflicts(events):
         by_key.setdefault(key, []).append(ev)
 
     for key, arr in by_key.items():
+        # So sánh bằng ID trong danh mục (đã chuẩn hoá hoa/thường, dấu, khoảng trắng)
+        masks = [event_attendee_mask(ev) for ev in arr]
         for i, ev in enumerate(arr):
             ev["attendees_conflict"] = False
             ev["location_conflict"] = False
             ev["chair_conflict"] = False
             for j, other_ev in enumerate(arr):
                 if i != j:
-                    # Chuẩn hóa danh sách người tham dự để so sánh
-                    ev_attendees = set([a.strip() for a in ev.get("attendees", "").split(",") if a.strip()])
-                    other_attendees = set([a.strip() for a in other_ev.get("attendees", "").split(",") if a.strip()])
-                    same_attendees = ev_attendees.intersection(other_attendees)
-                    same_location = ev.get("location") and other_ev.get("location") and ev["location"] == other_ev["location"]
+                    same_attendees = masks[i] & masks[j]
+                    same_location = ev["room_id"] is not None and ev["room_id"] == other_ev["room_id"]
                     time_overlap = overlap(ev, other_ev)
 
                     # Cảnh báo "Trùng giờ" đã được xử lý trong compute_conflicts
@@ -154,17 +586,21 @@ def compute_attendees_location_conflicts(events):
                         ev["attendees_conflict"] = True
                         other_ev["attendees_conflict"] = True
 
+def new_session_for(any_date: dt.date):
+    return {
+        "id": session_id_from_date(any_date),
+        "week_start": monday_of_week(any_date).isoformat(),
+        "week_end": saturday_of_week(any_date).isoformat(),
+        "version": 0,
+        "events": []
+    }
+
 def get_or_create_session(data, any_date: dt.date):
     sid = session_id_from_date(any_date)
     for s in data["sessions"]:
         if s["id"] == sid:
             return s
-    new_session = {
-        "id": sid,
-        "week_start": monday_of_week(any_date).isoformat(),
-        "week_end": saturday_of_week(any_date).isoformat(),
-        "events": []
-    }
+    new_session = new_session_for(any_date)
     data["sessions"].append(new_session)
     save_data(data)
     return new_session
@@ -175,10 +611,29 @@ def find_session_by_id(data, sid: str):
             return s
     return None
 
-def upsert_event(session, payload):
-    _id = payload.get("id") or str(uuid.uuid4())
+def bump_session_version(session) -> int:
+    # Mỗi thay đổi của tuần tăng version -> dùng làm ETag cho các route đọc
+    session["version"] = session.get("version", 0) + 1
+    return session["version"]
+
+def build_event(payload):
+    # Chuẩn hoá & kiểm tra payload -> dict sự kiện (ValueError nếu không hợp lệ)
+    for field in ("date", "start_time", "end_time", "title"):
+        if not str(payload.get(field) or "").strip():
+            raise ValueError(f"Thiếu trường bắt buộc: {field}")
+    try:
+        dt.date.fromisoformat(payload["date"])
+    except (TypeError, ValueError):
+        raise ValueError(f"Ngày không hợp lệ: {payload['date']}")
+    for field in ("start_time", "end_time"):
+        if not re.fullmatch(r"\d{1,2}:\d{2}", str(payload[field])):
+            raise ValueError(f"Giờ không hợp lệ ({field}): {payload[field]}")
+
+    attendees = payload.get("attendees", "")
+    if isinstance(attendees, (list, tuple)):
+        attendees = ", ".join(a.strip() for a in attendees if a and a.strip())
     ev = {
-        "id": _id,
+        "id": payload.get("id") or str(uuid.uuid4()),
         "date": payload["date"],
         "session_buoi": payload.get("buoi") or payload.get("session_buoi") or guess_buoi(payload["start_time"]),
         "start_time": payload["start_time"],
@@ -186,26 +641,333 @@ def upsert_event(session, payload):
         "title": payload["title"],
         "category": payload.get("category", ""),
         "chair": payload.get("chair", ""),
-        "attendees": payload.get("attendees", ""),
+        "attendees": attendees,
         "location": payload.get("location", "")
     }
 
+    if ev["session_buoi"] not in ("SÁNG", "CHIỀU"):
+        raise ValueError(f"Buổi không hợp lệ: {ev['session_buoi']}")
     if hhmm_to_minutes(ev["start_time"]) >= hhmm_to_minutes(ev["end_time"]):
         raise ValueError("Giờ kết thúc phải lớn hơn giờ bắt đầu.")
+    return attach_name_ids(ev)
+
+def upsert_event(session, payload):
+    ev = build_event(payload)
+    _id = ev["id"]
 
     for i, e in enumerate(session["events"]):
         if e["id"] == _id:
             session["events"][i] = ev
+            bump_session_version(session)
+            record_change("upsert", session, ev, cells=[(e["date"], e["session_buoi"]), (ev["date"], ev["session_buoi"])])
             return ev
 
     session["events"].append(ev)
+    bump_session_version(session)
+    record_change("upsert", session, ev, cells=[(ev["date"], ev["session_buoi"])])
     return ev
 
 def delete_event(session, event_id: str):
+    removed = [e for e in session["events"] if e["id"] == event_id]
     session["events"] = [e for e in session["events"] if e["id"] != event_id]
+    bump_session_version(session)
+    record_change("delete", session, {"id": event_id}, cells=[(e["date"], e["session_buoi"]) for e in removed])
+
+# ========== DANH MỤC NGƯỜI/PHÒNG (ID SỐ NGUYÊN) ==========
+# Chủ trì, thành phần tham dự và phòng được quy về ID số nguyên bất biến (không phân biệt hoa/thường,
+# dấu, khoảng trắng, ".", "_", "-"). Danh mục chỉ ghi thêm, có khoá file -> các worker dùng chung ID.
+# Sự kiện lưu sẵn chair_id/attendee_ids/room_id; kiểm tra xung đột dùng phép toán bitmask.
+def fold_name(text) -> str:
+    text = unicodedata.normalize("NFD", str(text or ""))
+    text = "".join(c for c in text if unicodedata.category(c) != "Mn").replace("đ", "d").replace("Đ", "D")
+    return re.sub(r"[._\-\s]+", "", text).casefold()
+
+def split_people(value):
+    if isinstance(value, str):
+        value = value.split(",")
+    return [v.strip() for v in value or [] if v and v.strip()]
+
+class NameRegistry:
+    def __init__(self, path, seed_people=(), seed_rooms=()):
+        self.path = path
+        self.seed_people, self.seed_rooms = seed_people, seed_rooms
+        self.lock = threading.Lock()
+        self.names, self.kinds, self.aliases = [], [], {}
+        self.epoch = None
+        self.loaded = False
+
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except FileNotFoundError:
+            return False
+        self.names, self.kinds, self.aliases = raw["names"], raw["kinds"], raw["aliases"]
+        self.epoch = raw["epoch"]
+        return True
+
+    def _write(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"epoch": self.epoch, "names": self.names, "kinds": self.kinds, "aliases": self.aliases},
+                      f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
+
+    def _locked_update(self, fn):
+        # Đọc lại danh mục dưới khoá file để không cấp trùng ID giữa các worker
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path + ".lock", "a") as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    if not self._read():
+                        self.names, self.kinds, self.aliases = [], [], {}
+                        self.epoch = uuid.uuid4().hex
+                    result = fn()
+                    self._write()
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+            self.loaded = True
+            return result
+
+    def ensure_loaded(self):
+        if self.loaded:
+            return
+        with self.lock:
+            self.loaded = self._read()
+        seeds = [(n, "person") for n in self.seed_people] + [(n, "room") for n in self.seed_rooms]
+        if not self.loaded or any(f"{k}:{fold_name(n)}" not in self.aliases for n, k in seeds):
+            self._locked_update(lambda: [self._intern(n, k) for n, k in seeds])
+
+    def _intern(self, name, kind):
+        key = f"{kind}:{fold_name(name)}"
+        if key not in self.aliases:
+            self.aliases[key] = len(self.names)
+            self.names.append(name.strip())
+            self.kinds.append(kind)
+        return self.aliases[key]
+
+    def lookup(self, name, kind="person"):
+        self.ensure_loaded()
+        return self.aliases.get(f"{kind}:{fold_name(name)}")
+
+    def resolve(self, name, kind="person"):
+        if not name or not fold_name(name):
+            return None
+        found = self.lookup(name, kind)
+        if found is not None:
+            return found
+        return self._locked_update(lambda: self._intern(name, kind))
+
+    def add_alias(self, alias, name, kind="person"):
+        # Gộp alias vào tên chuẩn -> đổi epoch để các ID đã lưu trong sự kiện được tính lại
+        target = self.resolve(name, kind)
+
+        def update():
+            self.aliases[f"{kind}:{fold_name(alias)}"] = target
+            self.epoch = uuid.uuid4().hex
+            return target
+        return self._locked_update(update)
+
+    def name(self, name_id) -> str:
+        self.ensure_loaded()
+        if name_id is None or name_id >= len(self.names):
+            return ""
+        return self.names[name_id]
+
+    def entries(self):
+        self.ensure_loaded()
+        aliases = {}
+        for key, name_id in self.aliases.items():
+            aliases.setdefault(name_id, []).append(key.split(":", 1)[1])
+        return [{"id": i, "name": n, "kind": k, "aliases": sorted(aliases.get(i, []))}
+                for i, (n, k) in enumerate(zip(self.names, self.kinds))]
+
+name_registry = LocalProxy(lambda: current_tenant().name_registry)
+
+def attach_name_ids(ev):
+    ev["chair_id"] = name_registry.resolve(ev.get("chair"), "person")
+    ev["attendee_ids"] = sorted({i for i in (name_registry.resolve(a, "person") for a in split_people(ev.get("attendees"))) if i is not None})
+    ev["room_id"] = name_registry.resolve(ev.get("location"), "room")
+    return ev
+
+def event_name_ids(ev):
+    # Dữ liệu cũ chưa có ID -> tính 1 lần và giữ trong sự kiện
+    if "attendee_ids" not in ev:
+        attach_name_ids(ev)
+    return ev
+
+def ids_mask(ids) -> int:
+    mask = 0
+    for i in ids:
+        mask |= 1 << i
+    return mask
+
+def event_attendee_mask(ev) -> int:
+    return ids_mask(event_name_ids(ev)["attendee_ids"])
+
+def event_people_ids(ev):
+    event_name_ids(ev)
+    ids = set(ev["attendee_ids"])
+    if ev.get("chair_id") is not None:
+        ids.add(ev["chair_id"])
+    return ids
+
+def check_name_ids(data):
+    # Danh mục bị tạo lại hoặc alias thay đổi -> bỏ các ID cũ, tính lại khi cần
+    name_registry.ensure_loaded()
+    if data.get("registry_epoch") == name_registry.epoch:
+        return
+    for s in data["sessions"]:
+        for ev in s["events"]:
+            for field in ("chair_id", "attendee_ids", "room_id"):
+                ev.pop(field, None)
+    data["registry_epoch"] = name_registry.epoch
+
+def event_matches_name(ev, q: str) -> bool:
+    # Tìm theo tên người/phòng đã đăng ký (kể cả alias, không dấu)
+    person = name_registry.lookup(q, "person")
+    room = name_registry.lookup(q, "room")
+    event_name_ids(ev)
+    return (person is not None and person in event_people_ids(ev)) or (room is not None and ev.get("room_id") == room)
+
+# ========== BATCH: NHIỀU THAO TÁC, 1 LẦN GHI ==========
+# operations: [{"op": "create", "event": {...}},
+#              {"op": "update", "id": "...", "session_id": "...", "event": {các trường cần đổi}},
+#              {"op": "upsert", "event": {...}}  (update nếu id đã có, ngược lại create),
+#              {"op": "delete", "id": "...", "session_id": "..."}]
+# Các tuần bị ảnh hưởng được sửa trên bản sao; chỉ khi mọi thao tác hợp lệ (hoặc skip_invalid)
+# mới thay vào data. Người gọi tự save_data(data) đúng 1 lần.
+class BatchWork:
+    def __init__(self, data):
+        self.data = data
+        self.touched = {}
+        self._owner = None
+
+    def session(self, sid, any_date=None):
+        if sid not in self.touched:
+            src = find_session_by_id(self.data, sid)
+            if src is None:
+                if any_date is None:
+                    return None
+                src = new_session_for(any_date)
+            self.touched[sid] = copy.deepcopy(src)
+        return self.touched[sid]
+
+    def session_for_date(self, date_iso):
+        any_date = dt.date.fromisoformat(date_iso)
+        return self.session(session_id_from_date(any_date), any_date)
+
+    def locate(self, event_id):
+        # Tìm tuần chứa sự kiện qua chỉ mục id -> tuần (dựng 1 lần, cập nhật theo từng thao tác qua moved())
+        if self._owner is None:
+            self._owner = {e["id"]: s["id"] for s in self.data["sessions"] for e in s["events"]}
+        sid = self._owner.get(event_id)
+        return self.session(sid) if sid else None
+
+    def moved(self, event_id, sid):
+        # sid = None: sự kiện đã bị xoá
+        if self._owner is None:
+            self.locate(event_id)
+        if sid is None:
+            self._owner.pop(event_id, None)
+        else:
+            self._owner[event_id] = sid
+
+    def commit(self):
+        by_id = {s["id"]: i for i, s in enumerate(self.data["sessions"])}
+        for sid, sess in self.touched.items():
+            if sid in by_id:
+                self.data["sessions"][by_id[sid]] = sess
+            else:
+                self.data["sessions"].append(sess)
+        return {sid: sess.get("version", 0) for sid, sess in self.touched.items()}
+
+def apply_batch_op(work, op):
+    kind = op.get("op")
+    if kind == "upsert":
+        event_id = (op.get("event") or {}).get("id")
+        kind = "update" if event_id and work.locate(event_id) else "create"
+    if kind == "create":
+        payload = dict(op.get("event") or {})
+        ev = build_event(payload)
+        if work.locate(ev["id"]):
+            raise ValueError(f"Sự kiện đã tồn tại: {ev['id']}")
+        sess = work.session_for_date(ev["date"])
+        ev = upsert_event(sess, {**payload, "id": ev["id"]})
+        work.moved(ev["id"], sess["id"])
+        return {"id": ev["id"], "session_id": sess["id"]}
+
+    event_id = op.get("id") or (op.get("event") or {}).get("id")
+    if not event_id:
+        raise ValueError("Thiếu id sự kiện")
+    sess = work.locate(event_id)
+    if sess is None:
+        raise ValueError(f"Không tìm thấy sự kiện: {event_id}")
+
+    if kind == "delete":
+        delete_event(sess, event_id)
+        work.moved(event_id, None)
+        return {"id": event_id, "session_id": sess["id"]}
+    if kind == "update":
+        current = next(e for e in sess["events"] if e["id"] == event_id)
+        changes = dict(op.get("event") or {})
+        if "buoi" in changes:
+            changes["session_buoi"] = changes.pop("buoi")
+        merged = {**current, **changes, "id": event_id}
+        if "start_time" in changes and "session_buoi" not in changes:
+            merged.pop("session_buoi")  # Đổi giờ -> nhận diện lại buổi
+        ev = build_event(merged)
+        target = work.session_for_date(ev["date"])
+        if target is not sess:
+            delete_event(sess, event_id)  # Dời sang tuần khác
+        upsert_event(target, ev)
+        work.moved(event_id, target["id"])
+        return {"id": event_id, "session_id": target["id"]}
+    raise ValueError(f"Thao tác không hợp lệ: {kind}")
+
+def apply_batch(data, operations, skip_invalid=False):
+    # Trả về (results, versions); versions = None nếu có lỗi và không skip_invalid (data giữ nguyên)
+    work = BatchWork(data)
+    mark = len(pending_changes())
+    results = []
+    for i, op in enumerate(operations):
+        if not isinstance(op, dict):
+            results.append({"index": i, "ok": False, "error": "Thao tác phải là object"})
+            continue
+        try:
+            results.append({"index": i, "op": op.get("op"), "ok": True, **apply_batch_op(work, op)})
+        except (ValueError, TypeError) as e:
+            results.append({"index": i, "op": op.get("op"), "ok": False, "error": str(e)})
+    if not skip_invalid and any(not r["ok"] for r in results):
+        del pending_changes()[mark:]
+        return results, None
+    return results, work.commit()
 
 # ======= DỮ LIỆU GỘP THEO NGÀY/BUỔI (dùng cho Export & Preview) =======
-def build_schedule(session):
+# Kết quả được nhớ theo (chi nhánh, tuần, version): mở lại 1 tuần chưa đổi không phải dựng lại.
+# Không sửa trực tiếp dates/schedule trả về (dùng chung giữa các request).
+_schedule_cache = OrderedDict()
+_schedule_cache_lock = threading.Lock()
+
+def build_schedule(session, with_conflicts=False):
+    key = (current_tenant().slug, session["id"], session.get("version", 0), session["week_start"],
+           len(session["events"]), with_conflicts, name_registry.epoch)
+    with _schedule_cache_lock:
+        if key in _schedule_cache:
+            _schedule_cache.move_to_end(key)
+            return _schedule_cache[key]
+    result = _build_schedule(session, with_conflicts)
+    with _schedule_cache_lock:
+        _schedule_cache[key] = result
+        while len(_schedule_cache) > SCHEDULE_CACHE_SIZE:
+            _schedule_cache.popitem(last=False)
+    return result
+
+def _build_schedule(session, with_conflicts):
     dates = []
     schedule = {}
     week_start = dt.date.fromisoformat(session["week_start"])
@@ -215,7 +977,11 @@ def build_schedule(session):
         dates.append(date)
         schedule[date.isoformat()] = {"SÁNG": [], "CHIỀU": []}
 
-    for ev in session["events"]:
+    events = [dict(ev) for ev in session["events"]]  # Bản sao: kết quả được cache
+    if with_conflicts:
+        compute_conflicts(events)
+        compute_attendees_location_conflicts(events)
+    for ev in events:
         try:
             date_iso = dt.date.fromisoformat(ev["date"]).isoformat()
             if date_iso in schedule:
@@ -242,8 +1008,85 @@ def build_schedule(session):
     return dates, schedule
 
 
+# ========== CACHE MẢNH HTML THEO Ô LỊCH (ngày × buổi) ==========
+# Trang chủ ghép lịch tuần từ các mảnh đã render sẵn: mỗi ô lịch và mỗi nhóm dòng của bảng (cùng ngày/buổi).
+# Khoá = (chi nhánh, tuần, ngày, buổi, phiên bản nội dung của ô, cờ xung đột): sửa 1 cuộc họp sáng thứ 3
+# chỉ render lại đúng ô đó (và ô cũ nếu đổi ngày/buổi), các ô khác lấy từ LRU.
+CONFLICT_FLAGS = ("conflict", "attendees_conflict", "location_conflict")
+
+class FragmentCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.items = OrderedDict()
+        self.counts = {}  # kind -> [hit, miss]
+        self.evicted = 0
+
+    def get_or_render(self, kind, key, render):
+        key = (kind,) + key
+        with self.lock:
+            counts = self.counts.setdefault(kind, [0, 0])
+            html = self.items.get(key)
+            if html is not None:
+                self.items.move_to_end(key)
+                counts[0] += 1
+                return html
+            counts[1] += 1
+        html = Markup(render())
+        with self.lock:
+            self.items[key] = html
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+                self.evicted += 1
+        return html
+
+    def drop(self, slug):
+        with self.lock:
+            for key in [k for k in self.items if k[1] == slug]:
+                del self.items[key]
+
+    def status(self):
+        with self.lock:
+            kinds = {kind: {"hits": h, "misses": m, "hit_rate": round(h / (h + m), 3) if h + m else None}
+                     for kind, (h, m) in self.counts.items()}
+            return {"size": len(self.items), "max_size": self.maxsize, "evicted": self.evicted, "kinds": kinds}
+
+fragment_cache = FragmentCache(FRAGMENT_CACHE_SIZE)
+
+def cell_fragment_key(session, date_iso, buoi, events):
+    # Phiên bản nội dung = băm các sự kiện trong ô (kèm màu chủ trì); cờ xung đột đưa riêng vào khoá
+    colors = current_tenant().chair_colors
+    content = [({k: v for k, v in ev.items() if k not in CONFLICT_FLAGS}, colors.get(ev.get("chair"))) for ev in events]
+    version = hashlib.sha1(json.dumps(content, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+    flags = tuple(tuple(int(bool(ev.get(f))) for f in CONFLICT_FLAGS) for ev in events)
+    return (current_tenant().slug, request.script_root, session["id"], date_iso, buoi, version, flags)
+
+def render_week_fragments(session, dates, schedule, events):
+    # cells[ngày][buổi]: HTML ô lịch; rows: HTML các dòng bảng (events đã sắp theo ngày, buổi, giờ)
+    ctx = {"chair_colors": current_tenant().chair_colors, "session_id": session["id"]}
+    cells = {}
+    for d in dates:
+        key = d.isoformat()
+        cells[key] = {}
+        for buoi in ("SÁNG", "CHIỀU"):
+            cell = schedule.get(key, {}).get(buoi, [])
+            cells[key][buoi] = fragment_cache.get_or_render(
+                "cell", cell_fragment_key(session, key, buoi, cell),
+                lambda: render_page(TEMPLATE_CAL_CELL, cell=cell, **ctx))
+    rows = []
+    for (date_iso, buoi), group in itertools.groupby(events, key=lambda ev: (ev["date"], ev["session_buoi"])):
+        group = list(group)
+        rows.append(fragment_cache.get_or_render(
+            "rows", cell_fragment_key(session, date_iso, buoi, group),
+            lambda: render_page(TEMPLATE_TABLE_ROWS, rows=group, **ctx)))
+    return cells, Markup("").join(rows)
+
+
 # ========== XUẤT EXCEL DẠNG BẢNG LỊCH HỌP ==========
 def export_session_to_excel(session):
+    from openpyxl import Workbook
+    from openpyxl.styles import PatternFill, Alignment, Border, Side, Font
+    from openpyxl.utils import get_column_letter
     print(f"Bắt đầu xuất file Excel cho session: {session['id']}")
     wb = Workbook()
     ws = wb.active
@@ -264,7 +1107,7 @@ def export_session_to_excel(session):
 
     # Row 1: Tiêu đề
     ws.merge_cells('A1:G1')
-    ws['A1'] = f"LỊCH HỌP TUẦN {COMPANY_NAME.upper()}"
+    ws['A1'] = f"LỊCH HỌP TUẦN {current_tenant().company.upper()}"
     ws['A1'].font = Font(bold=True, size=14)
     ws['A1'].alignment = Alignment(horizontal='center')
 
@@ -340,7 +1183,7 @@ def export_session_to_excel(session):
                     dcell.alignment = Alignment(wrap_text=True, vertical='top', horizontal='left')
 
                     # Khôi phục tính năng tô màu
-                    hexcol = CHAIR_COLORS.get(ev["chair"])
+                    hexcol = current_tenant().chair_colors.get(ev["chair"])
                     if hexcol:
                         fill = PatternFill(start_color=excel_color(hexcol), end_color=excel_color(hexcol), fill_type="solid")
                         hcell.fill = fill
@@ -374,16 +1217,13 @@ def export_session_to_excel(session):
 
     notes_row = start_row + 1
     ws.merge_cells(start_row=notes_row, start_column=1, end_row=notes_row, end_column=6)
-    ws.cell(row=notes_row, column=1, value="Ghi chú: Các cuộc họp phát sinh TL.BGĐ xin ý kiến BGĐ thống nhất -> HV cập nhật lên phần mềm")
-    ws.cell(row=notes_row, column=7, value=f"Đà Nẵng, Ngày {week_end.strftime('%d')} tháng {week_end.strftime('%m')} năm {week_end.strftime('%Y')}").alignment = Alignment(horizontal='center')
+    tenant = current_tenant()
+    ws.cell(row=notes_row, column=1, value=tenant.excel_note)
+    ws.cell(row=notes_row, column=7, value=f"{tenant.excel_city}, Ngày {week_end.strftime('%d')} tháng {week_end.strftime('%m')} năm {week_end.strftime('%Y')}").alignment = Alignment(horizontal='center')
 
-    ws.cell(row=notes_row+1, column=2, value="BGĐ KIỂM TRA")
-    ws.cell(row=notes_row+1, column=4, value="TP.NS&ĐT Kiểm tra")
-    ws.cell(row=notes_row+1, column=6, value="Người lập biểu")
-
-    ws.cell(row=notes_row+4, column=2, value="Phan Thị Yến Tuyết")
-    ws.cell(row=notes_row+4, column=4, value="Trần Thị Kim Oanh")
-    ws.cell(row=notes_row+4, column=6, value="Trần Thị Mỹ Tân")
+    for col, (role, name) in zip((2, 4, 6), tenant.excel_signatures):
+        ws.cell(row=notes_row+1, column=col, value=role)
+        ws.cell(row=notes_row+4, column=col, value=name)
 
     # Lưu file và kiểm tra lỗi
     output = BytesIO()
@@ -401,12 +1241,13 @@ def export_session_to_ics(session):
     lines = [
         "BEGIN:VCALENDAR",
         "VERSION:2.0",
-        f"PRODID:-//{COMPANY_NAME}//Meeting Calendar//VN"
+        f"PRODID:-//{current_tenant().company}//Meeting Calendar//VN"
     ]
+    to_utc = dt.timedelta(hours=ICS_UTC_OFFSET_HOURS)
     for ev in session["events"]:
         date = dt.date.fromisoformat(ev["date"])
-        start = dt.datetime.combine(date, dt.time.fromisoformat(ev["start_time"] + ":00"))
-        end = dt.datetime.combine(date, dt.time.fromisoformat(ev["end_time"] + ":00"))
+        start = dt.datetime.combine(date, dt.time.fromisoformat(ev["start_time"] + ":00")) - to_utc
+        end = dt.datetime.combine(date, dt.time.fromisoformat(ev["end_time"] + ":00")) - to_utc
         uid = ev["id"]
         title = ev["title"].replace("\n", " ")
         desc = []
@@ -431,14 +1272,39 @@ def export_session_to_ics(session):
     return BytesIO(ics_bytes), f"lich_hop_tuan_{session['id']}.ics"
 
 # ========== IMPORT TỪ EXCEL ==========
+@writes_data
 def import_from_excel(file, target_date: dt.date):
+    from openpyxl import load_workbook
     wb = load_workbook(file)
     ws = wb.active
 
-    # Lấy ngày từ tuần mục tiêu
     data = load_data()
-    target_session = get_or_create_session(data, target_date)
-    target_week_start = dt.date.fromisoformat(target_session["week_start"])
+    operations = excel_import_operations(ws, target_date)
+
+    results, _ = apply_batch(data, operations, skip_invalid=True)
+    imported_count = 0
+    for op, r in zip(operations, results):
+        ev = op["event"]
+        if r["ok"]:
+            imported_count += 1
+            print(f"Đã thêm sự kiện: {ev['title']} - {ev['date']} {ev['session_buoi']} {ev['start_time']}")
+        else:
+            print(f"Lỗi khi thêm sự kiện: {r['error']} - Payload: {ev}")
+
+    save_data(data)
+    print(f"Đã import thành công {imported_count} sự kiện.")
+    return session_id_from_date(target_date)
+
+def excel_week_date(ws):
+    # Dòng 2 của file do hệ thống xuất: "Tuần:  dd/mm/yyyy -> dd/mm/yyyy"
+    m = re.search(r"(\d{1,2})/(\d{1,2})/(\d{4})", str(ws["A2"].value or ""))
+    if not m:
+        return None
+    return dt.date(int(m.group(3)), int(m.group(2)), int(m.group(1)))
+
+def excel_import_operations(ws, target_date: dt.date):
+    # Đọc bảng lịch tuần -> danh sách thao tác "create" cho apply_batch (không đụng tới data)
+    target_week_start = monday_of_week(target_date)
     week_days = [target_week_start + dt.timedelta(days=i) for i in range(6)]  # Thứ 2 đến Thứ 7
 
     # Xác định buoi và nội dung
@@ -462,8 +1328,8 @@ def import_from_excel(file, target_date: dt.date):
             if cell:
                 contents[col].append((current_buoi, cell))
 
-    # Parse và thêm sự kiện
-    imported_count = 0
+    # Parse và gom thành 1 batch
+    operations = []
     for col, day in enumerate(week_days, start=2):
         for buoi, content in contents.get(col, []):
             if not content:
@@ -489,16 +1355,8 @@ def import_from_excel(file, target_date: dt.date):
                     "attendees": parsed['attendees'],
                     "location": parsed['location']
                 }
-                try:
-                    event = upsert_event(target_session, payload)
-                    imported_count += 1
-                    print(f"Đã thêm sự kiện: {event['title']} - {event['date']} {event['session_buoi']} {event['start_time']}")
-                except ValueError as e:
-                    print(f"Lỗi khi thêm sự kiện: {e} - Payload: {payload}")
-
-    save_data(data)
-    print(f"Đã import thành công {imported_count} sự kiện.")
-    return target_session["id"]
+                operations.append({"op": "create", "event": payload})
+    return operations
 
 def parse_cell(cell_content):
     if not cell_content:
@@ -559,72 +1417,3610 @@ def parse_cell(cell_content):
     return parsed_events
 
 
+# ========== IMPORT DẠNG LUỒNG (ICS / CSV / JSONL) ==========
+# Đọc file theo từng dòng (không nạp cả file), chuyển thành payload sự kiện và ghi theo lô IMPORT_BATCH_SIZE.
+CSV_HEADER_ALIASES = {
+    "date": ("date", "ngay"), "start_time": ("start_time", "start", "batdau", "giobatdau"),
+    "end_time": ("end_time", "end", "ketthuc", "gioketthuc"), "title": ("title", "tieude", "tenhop", "noidung"),
+    "session_buoi": ("session_buoi", "buoi"), "category": ("category", "loai"), "chair": ("chair", "chutri"),
+    "attendees": ("attendees", "thamdu", "thanhphanthamdu", "thanhphan"), "location": ("location", "diadiem", "phong"),
+    "id": ("id", "uid"),
+}
+IMPORT_FORMATS = {".ics": "ics", ".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+def iter_text_lines(stream):
+    if isinstance(stream, io.TextIOBase):
+        yield from stream
+        return
+    yield from io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+def normalize_import_date(value) -> str:
+    value = str(value or "").strip()
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y"):
+        try:
+            return dt.datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f"Ngày không hợp lệ: {value}")
+
+def normalize_import_time(value) -> str:
+    m = re.fullmatch(r"(\d{1,2})\s*[:hH]\s*(\d{2})?(?::\d{2})?", str(value or "").strip())
+    if not m:
+        raise ValueError(f"Giờ không hợp lệ: {value}")
+    return f"{int(m.group(1)):02d}:{int(m.group(2) or 0):02d}"
+
+def row_to_payload(row):
+    payload = {
+        "date": normalize_import_date(row.get("date")),
+        "start_time": normalize_import_time(row.get("start_time")),
+        "end_time": normalize_import_time(row.get("end_time")),
+        "title": str(row.get("title") or "").strip(),
+        "category": str(row.get("category") or "").strip(),
+        "chair": str(row.get("chair") or "").strip(),
+        "attendees": row.get("attendees") or "",
+        "location": str(row.get("location") or "").strip(),
+    }
+    buoi = str(row.get("session_buoi") or row.get("buoi") or "").strip().upper()
+    payload["session_buoi"] = buoi if buoi in ("SÁNG", "CHIỀU") else guess_buoi(payload["start_time"])
+    if row.get("id"):
+        payload["id"] = str(row["id"]).strip()
+    return payload
+
+def ics_unescape(value: str) -> str:
+    return re.sub(r"\\([nN,;\\])", lambda m: "\n" if m.group(1) in "nN" else m.group(1), value)
+
+def parse_ics_datetime(value, params, utc_offset_hours):
+    if any(p.upper() == "VALUE=DATE" for p in params) or re.fullmatch(r"\d{8}", value):
+        raise ValueError("Bỏ qua sự kiện cả ngày")
+    stamp = dt.datetime.strptime(value.rstrip("Z")[:15], "%Y%m%dT%H%M%S")
+    if value.endswith("Z"):
+        stamp += dt.timedelta(hours=utc_offset_hours)
+    return stamp
+
+def parse_ics_duration(value) -> dt.timedelta:
+    m = re.fullmatch(r"P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?", value or "")
+    if not m:
+        raise ValueError(f"DURATION không hợp lệ: {value}")
+    d, h, mi, se = (int(x or 0) for x in m.groups())
+    return dt.timedelta(days=d, hours=h, minutes=mi, seconds=se)
+
+def iter_ics_rows(lines, utc_offset_hours=ICS_UTC_OFFSET_HOURS):
+    def unfolded():
+        buf = None
+        for raw in lines:
+            line = raw.rstrip("\r\n")
+            if line[:1] in (" ", "\t") and buf is not None:
+                buf += line[1:]
+                continue
+            if buf is not None:
+                yield buf
+            buf = line
+        if buf is not None:
+            yield buf
+
+    current = None
+    for line in unfolded():
+        name, _, value = line.partition(":")
+        prop, *params = name.split(";")
+        prop = prop.upper()
+        if prop == "BEGIN" and value.upper() == "VEVENT":
+            current = {}
+        elif prop == "END" and value.upper() == "VEVENT" and current is not None:
+            try:
+                yield ics_event_to_row(current, utc_offset_hours)
+            except ValueError as e:
+                yield e
+            current = None
+        elif current is not None:
+            current.setdefault(prop, (value, params))
+
+def ics_event_to_row(props, utc_offset_hours):
+    if "DTSTART" not in props:
+        raise ValueError("VEVENT thiếu DTSTART")
+    start = parse_ics_datetime(*props["DTSTART"], utc_offset_hours)
+    if "DTEND" in props:
+        end = parse_ics_datetime(*props["DTEND"], utc_offset_hours)
+    else:
+        end = start + parse_ics_duration(props.get("DURATION", ("PT1H", []))[0])
+    row = {
+        "id": props.get("UID", ("", []))[0],
+        "date": start.date().isoformat(),
+        "start_time": start.strftime("%H:%M"),
+        "end_time": end.strftime("%H:%M") if end.date() == start.date() else "23:59",
+        "title": ics_unescape(props.get("SUMMARY", ("", []))[0]),
+        "location": ics_unescape(props.get("LOCATION", ("", []))[0]),
+    }
+    # DESCRIPTION do chính hệ thống xuất: "Chu tri: ...\nTham du: ...\nLoai: ..."
+    for part in ics_unescape(props.get("DESCRIPTION", ("", []))[0]).split("\n"):
+        label, _, text = part.partition(":")
+        field = {"chutri": "chair", "thamdu": "attendees", "loai": "category"}.get(fold_name(label))
+        if field:
+            row[field] = text.strip()
+    return row
+
+def iter_csv_rows(lines, mapping=None):
+    reader = csv.DictReader(lines)
+    if mapping is None:
+        headers = {fold_name(h): h for h in reader.fieldnames or []}
+        mapping = {}
+        for field, aliases in CSV_HEADER_ALIASES.items():
+            for alias in aliases:
+                if alias in headers:
+                    mapping[field] = headers[alias]
+                    break
+    for row in reader:
+        yield {field: row.get(column, "") for field, column in mapping.items()}
+
+def iter_jsonl_rows(lines):
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+            yield row if isinstance(row, dict) else ValueError("Mỗi dòng JSONL phải là object")
+        except ValueError as e:
+            yield ValueError(f"JSON không hợp lệ: {e}")
+
+@writes_data
+def import_rows(rows, on_duplicate="skip", batch_size=IMPORT_BATCH_SIZE):
+    started = time.perf_counter()
+    data = load_data()
+    stats = {"read": 0, "imported": 0, "invalid": 0, "batches": 0, "weeks": set(), "errors": []}
+    ops = []
+
+    def error(row_no, message):
+        stats["invalid"] += 1
+        if len(stats["errors"]) < IMPORT_MAX_ERRORS:
+            stats["errors"].append({"row": row_no, "error": message})
+
+    def commit():
+        results, _ = apply_batch(data, ops, skip_invalid=True)
+        for op, r in zip(ops, results):
+            if r["ok"]:
+                stats["imported"] += 1
+                stats["weeks"].add(r["session_id"])
+            else:
+                error(op["row"], r["error"])
+        save_data(data)
+        stats["batches"] += 1
+        ops.clear()
+
+    for row_no, row in enumerate(rows, 1):
+        stats["read"] += 1
+        try:
+            if isinstance(row, Exception):
+                raise row
+            payload = row_to_payload(row)
+        except ValueError as e:
+            error(row_no, str(e))
+            continue
+        ops.append({"op": "upsert" if on_duplicate == "update" else "create", "event": payload, "row": row_no})
+        if len(ops) >= batch_size:
+            commit()
+    if ops:
+        commit()
+
+    elapsed = time.perf_counter() - started
+    stats["weeks"] = sorted(stats["weeks"])
+    stats["elapsed_seconds"] = round(elapsed, 3)
+    stats["events_per_second"] = round(stats["imported"] / elapsed, 1) if elapsed > 0 else None
+    return stats
+
+def import_stream(stream, fmt, mapping=None, utc_offset_hours=ICS_UTC_OFFSET_HOURS, on_duplicate="skip"):
+    lines = iter_text_lines(stream)
+    if fmt == "ics":
+        rows = iter_ics_rows(lines, utc_offset_hours)
+    elif fmt == "csv":
+        rows = iter_csv_rows(lines, mapping)
+    elif fmt == "jsonl":
+        rows = iter_jsonl_rows(lines)
+    else:
+        raise ValueError(f"Định dạng không hỗ trợ: {fmt}")
+    stats = import_rows(rows, on_duplicate=on_duplicate)
+    stats["format"] = fmt
+    print(f"Import {fmt}: {stats['imported']}/{stats['read']} sự kiện, {stats['events_per_second']} sự kiện/giây")
+    return stats
+
+def import_options_from_request():
+    mapping = request.form.get("mapping") or None
+    if mapping:
+        try:
+            mapping = json.loads(mapping)
+        except ValueError:
+            # Dạng rút gọn: "date=Ngày,start_time=Bắt đầu"
+            mapping = dict(part.split("=", 1) for part in mapping.split(",") if "=" in part)
+    return {
+        "mapping": mapping,
+        "utc_offset_hours": float(request.form.get("utc_offset") or ICS_UTC_OFFSET_HOURS),
+        "on_duplicate": "update" if request.form.get("on_duplicate") == "update" else "skip",
+    }
+
+# ========== KHÔI PHỤC TỪ BACKUP JSON ==========
+# Đọc file backup (định dạng của /backup/json) theo từng tuần: chỉ giữ trong bộ nhớ 1 tuần đang đọc.
+# policy: "replace" dữ liệu trở thành đúng như backup (xoá sự kiện không có trong backup),
+# "merge_id" gộp theo id (id trùng -> cập nhật), "merge_content" gộp theo nội dung (cùng ngày, giờ, tiêu đề,
+# chủ trì, địa điểm -> bỏ qua; dùng khi gộp file của chi nhánh khác có id riêng).
+# Mọi thay đổi được áp dụng trong 1 lần apply_batch + 1 lần save_data.
+def iter_backup_sessions(stream, read_bytes=RESTORE_READ_BYTES):
+    reader = stream if isinstance(stream, io.TextIOBase) else io.TextIOWrapper(stream, encoding="utf-8-sig")
+    decoder = json.JSONDecoder()
+    state = {"buf": "", "pos": 0, "eof": False}
+
+    def more(size):
+        chunk = reader.read(size)
+        state["buf"] = state["buf"][state["pos"]:] + chunk
+        state["pos"] = 0
+        state["eof"] = not chunk
+
+    def peek():
+        while True:
+            buf, pos = state["buf"], state["pos"]
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            state["pos"] = pos
+            if pos < len(buf):
+                return buf[pos]
+            if state["eof"]:
+                raise ValueError("File backup bị cắt ngang")
+            more(read_bytes)
+
+    def expect(char):
+        if peek() != char:
+            raise ValueError(f"File backup không hợp lệ: cần '{char}' ở gần ký tự {state['pos']}")
+        state["pos"] += 1
+
+    def value():
+        # Đọc thêm (gấp đôi mỗi lần) cho tới khi giải mã được trọn 1 giá trị JSON
+        size = read_bytes
+        peek()
+        while True:
+            try:
+                result, end = decoder.raw_decode(state["buf"], state["pos"])
+                if end < len(state["buf"]) or state["eof"]:
+                    state["pos"] = end
+                    return result
+            except ValueError:
+                if state["eof"]:
+                    raise ValueError("File backup không hợp lệ (JSON lỗi)")
+            more(size)
+            size *= 2
+
+    def items():
+        expect("[")
+        if peek() == "]":
+            state["pos"] += 1
+            return
+        while True:
+            yield value()
+            if peek() == "]":
+                state["pos"] += 1
+                return
+            expect(",")
+
+    if peek() == "[":
+        yield from items()
+        return
+    expect("{")
+    found = False
+    while peek() != "}":
+        key = value()
+        expect(":")
+        if key == "sessions":
+            found = True
+            yield from items()
+        else:
+            value()
+        if peek() == ",":
+            state["pos"] += 1
+    if not found:
+        raise ValueError("File backup không có danh sách sessions")
+
+RESTORE_FIELDS = ("date", "session_buoi", "start_time", "end_time", "title", "category", "chair", "attendees", "location")
+
+def restore_payload(ev):
+    payload = {f: ev.get(f, "") for f in RESTORE_FIELDS}
+    if ev.get("id"):
+        payload["id"] = str(ev["id"])
+    return payload
+
+def restore_signature(ev):
+    return (ev.get("date"), ev.get("start_time"), ev.get("end_time"),
+            fold_name(ev.get("title")), fold_name(ev.get("chair")), fold_name(ev.get("location")))
+
+@writes_data
+def restore_backup(stream, policy="merge_id"):
+    if policy not in RESTORE_POLICIES:
+        raise ValueError(f"Chính sách khôi phục không hợp lệ: {policy}")
+    started = time.perf_counter()
+    data = load_data()
+    existing = {e["id"]: e for s in data["sessions"] for e in s["events"]}
+    by_content = {restore_signature(e) for e in existing.values()} if policy == "merge_content" else set()
+    stats = {"policy": policy, "weeks_read": 0, "read": 0, "created": 0, "updated": 0, "deleted": 0,
+             "unchanged": 0, "duplicates": 0, "invalid": 0, "errors": []}
+    ops, seen = [], set()
+
+    def error(where, message):
+        stats["invalid"] += 1
+        if len(stats["errors"]) < IMPORT_MAX_ERRORS:
+            stats["errors"].append({"event": where, "error": message})
+
+    for sess in iter_backup_sessions(stream):
+        stats["weeks_read"] += 1
+        if not isinstance(sess, dict) or not isinstance(sess.get("events", []), list):
+            error(None, "Tuần phải là object có danh sách events")
+            continue
+        for ev in sess.get("events", []):
+            stats["read"] += 1
+            if not isinstance(ev, dict):
+                error(None, "Sự kiện phải là object")
+                continue
+            payload = restore_payload(ev)
+            event_id = payload.get("id")
+            if policy == "merge_content":
+                sig = restore_signature(payload)
+                if sig in by_content:
+                    stats["duplicates"] += 1
+                    continue
+                by_content.add(sig)
+                if event_id in existing or event_id in seen:
+                    payload.pop("id")  # Trùng id nhưng khác nội dung -> sự kiện mới
+                seen.add(payload.get("id"))
+                ops.append({"op": "create", "event": payload})
+                continue
+            if event_id in seen:
+                error(event_id, "Trùng id trong file backup")
+                continue
+            seen.add(event_id)
+            current = existing.get(event_id)
+            if current is None:
+                ops.append({"op": "create", "event": payload})
+            elif all(str(current.get(f, "")) == str(payload[f]) for f in RESTORE_FIELDS):
+                stats["unchanged"] += 1
+            else:
+                ops.append({"op": "update", "id": event_id, "event": payload})
+    if policy == "replace":
+        ops.extend({"op": "delete", "id": event_id} for event_id in existing if event_id not in seen)
+
+    results, _ = apply_batch(data, ops, skip_invalid=True)
+    weeks = set()
+    for op, r in zip(ops, results):
+        if r["ok"]:
+            stats[{"create": "created", "update": "updated", "delete": "deleted"}[op["op"]]] += 1
+            weeks.add(r["session_id"])
+        else:
+            error(op.get("id") or op["event"].get("id"), r["error"])
+    if weeks:
+        save_data(data)
+    stats["weeks"] = sorted(weeks)
+    stats["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+    print(f"Khôi phục ({policy}): +{stats['created']} ~{stats['updated']} -{stats['deleted']}, "
+          f"{stats['unchanged']} không đổi, {stats['duplicates']} trùng, {stats['invalid']} lỗi")
+    return stats
+
+@app.cli.command("restore")
+@click.argument("backup", type=click.File("rb"))
+@click.option("--policy", type=click.Choice(RESTORE_POLICIES), default="merge_id", show_default=True)
+@writes_data
+def restore_command(backup, policy):
+    """Khôi phục / gộp dữ liệu từ file backup JSON (tải từ /backup/json)."""
+    try:
+        stats = restore_backup(backup, policy)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise click.ClickException(str(e))
+    for err in stats["errors"]:
+        print(f"  Lỗi: {err['event'] or '-'}: {err['error']}")
+    print(f"{stats['weeks_read']} tuần, {stats['read']} sự kiện trong backup; {len(stats['weeks'])} tuần thay đổi "
+          f"({stats['elapsed_seconds']}s)")
+
 # ========== SAO CHÉP TUẦN ==========
-def copy_week_to_another(data, source_session_id, target_date: dt.date):
+# Sao chép 1 tuần nguồn sang nhiều tuần đích trong 1 lần ghi.
+# policy: "skip" bỏ qua sự kiện trùng, "merge" cập nhật sự kiện trùng, "overwrite" xoá tuần đích trước khi chép.
+def event_dup_key(ev):
+    return (ev["date"], ev["start_time"], ev["end_time"], ev["title"].strip().lower())
+
+def event_conflict_kinds(a, b):
+    if not overlap(a, b):
+        return []
+    kinds = ["time"]
+    if event_name_ids(a)["room_id"] is not None and a["room_id"] == event_name_ids(b)["room_id"]:
+        kinds.append("location")
+    if event_attendee_mask(a) & event_attendee_mask(b):
+        kinds.append("attendees")
+    return kinds
+
+def parse_target_dates(values=(), range_from=None, range_to=None, step_weeks=1):
+    dates = []
+    try:
+        for value in values:
+            for part in re.split(r"[,;\s]+", value or ""):
+                if part:
+                    dates.append(dt.date.fromisoformat(part))
+        if range_from and range_to:
+            current = monday_of_week(dt.date.fromisoformat(range_from))
+            last = dt.date.fromisoformat(range_to)
+            if last < current:
+                raise ValueError("Ngày kết thúc khoảng phải sau ngày bắt đầu.")
+            while current <= last:
+                dates.append(current)
+                current += dt.timedelta(weeks=max(1, step_weeks))
+    except ValueError as e:
+        raise ValueError(f"Ngày đích không hợp lệ: {e}")
+    seen, unique = set(), []
+    for d in dates:
+        if session_id_from_date(d) not in seen:
+            seen.add(session_id_from_date(d))
+            unique.append(d)
+    if not unique:
+        raise ValueError("Chưa chọn tuần đích.")
+    if len(unique) > COPY_MAX_TARGETS:
+        raise ValueError(f"Tối đa {COPY_MAX_TARGETS} tuần đích mỗi lần sao chép.")
+    return unique
+
+def plan_copy_week(data, source_session, target_dates, policy):
+    operations, op_weeks, weeks = [], [], []
+    for target_date in target_dates:
+        sid = session_id_from_date(target_date)
+        week = {"session_id": sid, "week_start": monday_of_week(target_date).isoformat(),
+                "exists": False, "added": 0, "updated": 0, "skipped": 0, "removed": 0, "invalid": 0, "conflicts": []}
+        weeks.append(week)
+        if sid == source_session["id"]:
+            week["note"] = "Trùng tuần nguồn, bỏ qua."
+            continue
+        target = find_session_by_id(data, sid)
+        existing = list(target["events"]) if target else []
+        week["exists"] = target is not None
+
+        if policy == "overwrite":
+            for ev in existing:
+                operations.append({"op": "delete", "id": ev["id"], "session_id": sid})
+                op_weeks.append(week)
+            week["removed"] = len(existing)
+            existing = []
+        existing_by_key = {event_dup_key(ev): ev for ev in existing}
+
+        target_week_start = monday_of_week(target_date)
+        planned = []
+        for event in source_session["events"]:
+            event_date = dt.date.fromisoformat(event["date"])
+            day_diff = (event_date - monday_of_week(event_date)).days
+            adjusted_date = target_week_start + dt.timedelta(days=day_diff)
+
+            payload = {
+                "id": str(uuid.uuid4()),  # Tạo ID mới cho sự kiện sao chép
+                "date": adjusted_date.isoformat(),
+                "session_buoi": event["session_buoi"],  # Đảm bảo sử dụng 'session_buoi' từ event
+                "start_time": event["start_time"],
+                "end_time": event["end_time"],
+                "title": event["title"],
+                "category": event.get("category", ""),
+                "chair": event["chair"],
+                "attendees": event.get("attendees", ""),
+                "location": event.get("location", "")
+            }
+            dup = existing_by_key.get(event_dup_key(payload))
+            if dup and policy == "skip":
+                week["skipped"] += 1
+                continue
+            if dup:
+                fields = {k: payload[k] for k in ("session_buoi", "category", "chair", "attendees", "location")}
+                operations.append({"op": "update", "id": dup["id"], "session_id": sid, "event": fields})
+                week["updated"] += 1
+            else:
+                operations.append({"op": "create", "event": payload})
+                week["added"] += 1
+                planned.append(payload)
+            op_weeks.append(week)
+
+        # Xem trước xung đột giữa sự kiện sẽ thêm và sự kiện đang có của tuần đích
+        for ev in planned:
+            for other in existing:
+                kinds = event_conflict_kinds(ev, other)
+                if kinds:
+                    week["conflicts"].append({
+                        "date": ev["date"], "start_time": ev["start_time"], "end_time": ev["end_time"],
+                        "title": ev["title"], "with_id": other["id"], "with_title": other["title"],
+                        "with_time": f"{other['start_time']}-{other['end_time']}", "kinds": kinds
+                    })
+    return operations, op_weeks, weeks
+
+def copy_week_to_many(data, source_session_id, target_dates, policy="skip", dry_run=False):
     source_session = find_session_by_id(data, source_session_id)
     if not source_session:
         raise ValueError("Không tìm thấy tuần nguồn.")
-    
-    target_session = get_or_create_session(data, target_date)
-    target_week_start = dt.date.fromisoformat(target_session["week_start"])
-
-    for event in source_session["events"]:
-        event_date = dt.date.fromisoformat(event["date"])
-        day_diff = (event_date - monday_of_week(event_date)).days
-        adjusted_date = target_week_start + dt.timedelta(days=day_diff)
-        
-        payload = {
-            "id": str(uuid.uuid4()),  # Tạo ID mới cho sự kiện sao chép
-            "date": adjusted_date.isoformat(),
-            "session_buoi": event["session_buoi"],  # Đảm bảo sử dụng 'session_buoi' từ event
-            "start_time": event["start_time"],
-            "end_time": event["end_time"],
-            "title": event["title"],
-            "category": event.get("category", ""),
-            "chair": event["chair"],
-            "attendees": event.get("attendees", ""),
-            "location": event.get("location", "")
-        }
+    if policy not in COPY_POLICIES:
+        raise ValueError(f"Chính sách sao chép không hợp lệ: {policy}")
+
+    operations, op_weeks, weeks = plan_copy_week(data, source_session, target_dates, policy)
+    report = {"source_session_id": source_session_id, "policy": policy, "dry_run": dry_run, "weeks": weeks}
+    if not dry_run:
+        results, _ = apply_batch(data, operations, skip_invalid=True)
+        for week, r in zip(op_weeks, results):
+            if not r["ok"]:
+                week["invalid"] += 1
+        for target_date in target_dates:
+            if not find_session_by_id(data, session_id_from_date(target_date)):
+                data["sessions"].append(new_session_for(target_date))  # Tuần đích luôn tồn tại kể cả khi tuần nguồn trống
+        save_data(data)
+    report["totals"] = {k: sum(w[k] for w in weeks) for k in ("added", "updated", "skipped", "removed", "invalid")}
+    report["totals"]["conflicts"] = sum(len(w["conflicts"]) for w in weeks)
+    return report
+
+def copy_week_to_another(data, source_session_id, target_date: dt.date, policy="skip"):
+    copy_week_to_many(data, source_session_id, [target_date], policy=policy)
+    return session_id_from_date(target_date)
+
+# ========== XẾP LỊCH TỰ ĐỘNG ==========
+# Mỗi người/phòng có 1 bitmask cho mỗi ngày (1 bit = 1 ô SOLVER_SLOT_MINUTES phút tính từ SOLVER_DAY_START).
+# Xếp tham lam theo độ ưu tiên, thử "đẩy" các yêu cầu ưu tiên thấp hơn, cuối cùng chọn phương án ít xung đột nhất.
+def solver_slot(hhmm: str) -> int:
+    return (hhmm_to_minutes(hhmm) - hhmm_to_minutes(SOLVER_DAY_START)) // SOLVER_SLOT_MINUTES
+
+def solver_time(slot: int) -> str:
+    m = hhmm_to_minutes(SOLVER_DAY_START) + slot * SOLVER_SLOT_MINUTES
+    return f"{m // 60:02d}:{m % 60:02d}"
+
+def slot_mask(start: int, n: int) -> int:
+    return ((1 << n) - 1) << start if n > 0 else 0
+
+def event_slot_mask(ev) -> int:
+    start = max(0, solver_slot(ev["start_time"]))
+    end_min = hhmm_to_minutes(ev["end_time"]) - hhmm_to_minutes(SOLVER_DAY_START)
+    end = max(start, -(-end_min // SOLVER_SLOT_MINUTES))  # làm tròn lên
+    return slot_mask(start, end - start)
+
+def feasible_starts(free: int, n: int) -> int:
+    # Bit i bật nếu n ô liên tiếp từ i đều trống
+    x = free
+    for k in range(1, n):
+        x &= free >> k
+    return x
+
+class WeekOccupancy:
+    def __init__(self, n_days):
+        self.n_days = n_days
+        self.masks = {}
+        self.owners = []  # (ngày, mask, keys, nhãn) để giải thích xung đột
+
+    def get(self, key, day) -> int:
+        arr = self.masks.get(key)
+        return arr[day] if arr else 0
+
+    def occupy(self, keys, day, mask, label):
+        for key in keys:
+            self.masks.setdefault(key, [0] * self.n_days)[day] |= mask
+        self.owners.append((day, mask, frozenset(keys), label))
+
+    def release(self, keys, day, mask, label):
+        for key in keys:
+            self.masks[key][day] &= ~mask
+        self.owners = [o for o in self.owners if o[3] is not label]
+
+    def explain(self, keys, day, mask):
+        found = []
+        for o_day, o_mask, o_keys, label in self.owners:
+            if o_day == day and o_mask & mask:
+                shared = sorted(name_registry.name(k) for k in o_keys & keys)
+                if shared:
+                    found.append({"with": label["title"], "with_time": label["time"], "shared": shared})
+        return found
+
+def normalize_solver_request(raw, index, week_dates):
+    if not isinstance(raw, dict):
+        raise ValueError(f"Yêu cầu #{index} phải là object")
+    title = str(raw.get("title") or "").strip()
+    if not title:
+        raise ValueError(f"Yêu cầu #{index}: thiếu title")
+    try:
+        duration = int(raw.get("duration") or 0)
+    except (TypeError, ValueError):
+        duration = 0
+    if duration <= 0:
+        raise ValueError(f"Yêu cầu #{index}: duration (phút) phải > 0")
+
+    tenant_rooms = current_tenant().rooms
+    allowed_rooms = {name_registry.lookup(r, "room") for r in tenant_rooms}
+    rooms = []
+    for r in raw.get("rooms") or tenant_rooms:
+        room_id = name_registry.lookup(r, "room")
+        if room_id not in allowed_rooms:
+            raise ValueError(f"Yêu cầu #{index}: phòng không hợp lệ: {r}")
+        rooms.append(room_id)
+
+    days = set()
+    for d in raw.get("days") or []:
+        if isinstance(d, int) and 0 <= d < len(week_dates):
+            days.add(d)
+        elif isinstance(d, str) and d in week_dates:
+            days.add(week_dates.index(d))
+        else:
+            raise ValueError(f"Yêu cầu #{index}: ngày không thuộc tuần: {d}")
+    buoi = set(raw.get("buoi") or [])
+    if buoi - set(SOLVER_WINDOWS):
+        raise ValueError(f"Yêu cầu #{index}: buổi không hợp lệ: {', '.join(buoi - set(SOLVER_WINDOWS))}")
+
+    chair = str(raw.get("chair") or "").strip()
+    attendees = split_people(raw.get("attendees"))
+    people = {name_registry.resolve(p, "person") for p in attendees + ([chair] if chair else [])}
+    return {
+        "index": index, "key": raw.get("key"), "title": title, "category": raw.get("category", ""),
+        "chair": chair, "attendees": attendees, "people": people, "rooms": rooms,
+        "n": -(-duration // SOLVER_SLOT_MINUTES), "duration": duration,
+        "pref_days": days, "pref_buoi": buoi, "priority": int(raw.get("priority") or 0),
+    }
+
+def solve_week(session, raw_requests):
+    started = time.perf_counter()
+    week_start = dt.date.fromisoformat(session["week_start"])
+    week_dates = [(week_start + dt.timedelta(days=i)).isoformat() for i in range(WEEK_DAYS)]
+    reqs = [normalize_solver_request(r, i, week_dates) for i, r in enumerate(raw_requests)]
+
+    base = WeekOccupancy(WEEK_DAYS)   # chỉ sự kiện đã có
+    full = WeekOccupancy(WEEK_DAYS)   # sự kiện đã có + kết quả xếp
+    for ev in session["events"]:
+        if ev["date"] not in week_dates:
+            continue
+        keys = event_people_ids(ev)
+        if ev["room_id"] is not None:
+            keys.add(ev["room_id"])
+        label = {"title": ev["title"], "time": f"{ev['date']} {ev['start_time']}-{ev['end_time']}"}
+        for occ in (base, full):
+            occ.occupy(keys, week_dates.index(ev["date"]), event_slot_mask(ev), label)
+
+    windows = {b: (solver_slot(a), solver_slot(z)) for b, (a, z) in SOLVER_WINDOWS.items()}
+
+    def combos(r):
+        # (phạt, ngày, buổi): ưu tiên ngày/buổi mong muốn, sau đó sớm nhất
+        out = []
+        for day in range(WEEK_DAYS):
+            for b, (w0, w1) in windows.items():
+                if w1 - w0 < r["n"]:
+                    continue
+                penalty = (2 if r["pref_days"] and day not in r["pref_days"] else 0) + \
+                          (1 if r["pref_buoi"] and b not in r["pref_buoi"] else 0)
+                out.append((penalty, day, b, slot_mask(w0, w1 - w0)))
+        out.sort(key=lambda c: (c[0], c[1]))
+        return out
+
+    def keys_for(r, room):
+        return r["people"] | {room}
+
+    def people_busy(occ, r, day):
+        busy = 0
+        for key in r["people"]:
+            busy |= occ.get(key, day)
+        return busy
+
+    def first_feasible(occ, r):
+        for penalty, day, b, window in combos(r):
+            people = people_busy(occ, r, day)
+            for room in r["rooms"]:
+                x = feasible_starts(window & ~(people | occ.get(room, day)), r["n"])
+                if x:
+                    start = (x & -x).bit_length() - 1
+                    return {"day": day, "buoi": b, "start": start, "room": room, "penalty": penalty}
+        return None
+
+    placements = {}
+
+    def place(r, opt, conflicts=None):
+        mask = slot_mask(opt["start"], r["n"])
+        label = {"title": r["title"], "time": f"{week_dates[opt['day']]} {solver_time(opt['start'])}-{solver_time(opt['start'] + r['n'])}"}
+        full.occupy(keys_for(r, opt["room"]), opt["day"], mask, label)
+        placements[r["index"]] = {**opt, "mask": mask, "label": label, "conflicts": conflicts or []}
+
+    def unplace(r):
+        p = placements.pop(r["index"])
+        full.release(keys_for(r, p["room"]), p["day"], p["mask"], p["label"])
+        return p
+
+    order = sorted(reqs, key=lambda r: (-r["priority"], -len(r["people"]), -r["n"], len(r["rooms"])))
+    pending = []
+    for r in order:
+        opt = first_feasible(full, r)
+        if opt:
+            place(r, opt)
+        else:
+            pending.append(r)
+
+    # Sửa: đẩy các yêu cầu ưu tiên thấp hơn đang chặn, nếu xếp lại được chúng ở chỗ khác
+    by_index = {r["index"]: r for r in reqs}
+    still = []
+    for r in pending:
+        done = False
+        for penalty, day, b, window in combos(r):
+            people = people_busy(base, r, day)
+            for room in r["rooms"]:
+                x = feasible_starts(window & ~(people | base.get(room, day)), r["n"])
+                while x and not done:
+                    start = (x & -x).bit_length() - 1
+                    x &= x - 1
+                    mask = slot_mask(start, r["n"])
+                    keys = keys_for(r, room)
+                    blockers = [by_index[i] for i, p in placements.items()
+                                if p["day"] == day and p["mask"] & mask and keys_for(by_index[i], p["room"]) & keys]
+                    if not blockers or any(o["priority"] >= r["priority"] for o in blockers) or len(blockers) > 2:
+                        continue
+                    saved = [(o, unplace(o)) for o in blockers]
+                    place(r, {"day": day, "buoi": b, "start": start, "room": room, "penalty": penalty})
+                    moved = []
+                    for o in blockers:
+                        opt = first_feasible(full, o)
+                        if not opt:
+                            break
+                        place(o, opt)
+                        moved.append(o)
+                    if len(moved) == len(blockers):
+                        done = True
+                    else:
+                        for o in moved + [r]:
+                            unplace(o)
+                        for o, p in saved:
+                            place(o, p, p["conflicts"])
+                if done:
+                    break
+            if done:
+                break
+        if not done:
+            still.append(r)
+
+    # Không có chỗ trống: chọn phương án ít xung đột nhất và giải thích
+    unplaced = {}
+    for r in still:
+        best = None
+        for penalty, day, b, window in combos(r):
+            w0 = (window & -window).bit_length() - 1
+            w1 = window.bit_length()
+            for room in r["rooms"]:
+                keys = keys_for(r, room)
+                for start in range(w0, w1 - r["n"] + 1):
+                    mask = slot_mask(start, r["n"])
+                    cost = sum(1 for key in keys if full.get(key, day) & mask)
+                    cand = (cost, penalty, day, start)
+                    if best is None or cand < best[0]:
+                        best = (cand, {"day": day, "buoi": b, "start": start, "room": room, "penalty": penalty})
+        if best is None:
+            unplaced[r["index"]] = "Thời lượng vượt quá độ dài buổi làm việc."
+            continue
+        opt = best[1]
+        conflicts = full.explain(keys_for(r, opt["room"]), opt["day"], slot_mask(opt["start"], r["n"]))
+        place(r, opt, conflicts)
+
+    assignments = []
+    for r in reqs:
+        item = {"index": r["index"], "key": r["key"], "title": r["title"], "priority": r["priority"]}
+        p = placements.get(r["index"])
+        if p is None:
+            item.update(status="unplaced", reason=unplaced.get(r["index"], ""))
+        else:
+            item.update(
+                status="conflict" if p["conflicts"] else "placed",
+                date=week_dates[p["day"]], buoi=p["buoi"], room=name_registry.name(p["room"]),
+                start_time=solver_time(p["start"]), end_time=solver_time(p["start"] + r["n"]),
+                preference_met=p["penalty"] == 0, conflicts=p["conflicts"],
+            )
+        assignments.append(item)
+    stats = {s: sum(1 for a in assignments if a["status"] == s) for s in ("placed", "conflict", "unplaced")}
+    stats["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return {"session_id": session["id"], "assignments": assignments, "stats": stats}, reqs
+
+def solver_operations(result, reqs, include_conflicts=False):
+    by_index = {r["index"]: r for r in reqs}
+    operations = []
+    for a in result["assignments"]:
+        if a["status"] == "placed" or (include_conflicts and a["status"] == "conflict"):
+            r = by_index[a["index"]]
+            operations.append({"op": "create", "event": {
+                "date": a["date"], "session_buoi": a["buoi"], "start_time": a["start_time"], "end_time": a["end_time"],
+                "title": r["title"], "category": r["category"], "chair": r["chair"],
+                "attendees": ", ".join(r["attendees"]), "location": a["room"],
+            }})
+    return operations
+
+# ========== PROFILING THEO YÊU CẦU ==========
+# Bật cho 1 request: header "X-Profile: cpu,mem" hoặc query "?_profile=cpu,mem"
+# (kèm header "X-Admin-Token" hoặc query "admin_token").
+_tracemalloc_lock = threading.Lock()
+_cpu_profile_lock = threading.Lock()  # cProfile chỉ cho 1 profiler chạy trong tiến trình (nhiều luồng gthread)
+
+def is_admin_request() -> bool:
+    if not ADMIN_TOKEN:
+        return False
+    token = request.headers.get("X-Admin-Token") or request.args.get("admin_token", "")
+    return hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
+
+def requested_profile_modes():
+    raw = request.headers.get("X-Profile") or request.args.get("_profile", "")
+    modes = set()
+    for part in raw.lower().split(","):
+        part = part.strip()
+        if part in ("1", "all", "true"):
+            modes.update(("cpu", "mem"))
+        elif part in ("cpu", "mem"):
+            modes.add(part)
+    return modes
+
+def profile_session_id() -> str:
+    view_args = request.view_args or {}
+    if view_args.get("session_id"):
+        return view_args["session_id"]
+    qdate = request.args.get("date") or request.form.get("date") or request.form.get("target_date")
+    try:
+        return session_id_from_date(dt.date.fromisoformat(qdate) if qdate else dt.date.today())
+    except ValueError:
+        return "unknown"
+
+def profile_request_line(response, elapsed_ms) -> str:
+    # Không ghi admin_token (nếu truyền qua query string) vào file profile
+    args = [(k, v) for k, v in request.args.items(multi=True) if k != "admin_token"]
+    path = request.path + ("?" + urlencode(args) if args else "")
+    return f"{request.method} {path} -> {response.status_code} trong {elapsed_ms:.1f} ms\n"
+
+def safe_filename_part(text: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "-", text or "").strip("-") or "x"
+
+def prune_profiles():
+    try:
+        names = sorted(os.listdir(PROFILE_DIR))
+    except FileNotFoundError:
+        return
+    # Mỗi lần chụp có chung tiền tố "<timestamp>_<route>_<session>"
+    prefixes = sorted({n.split(".", 1)[0] for n in names})
+    for prefix in prefixes[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else []:
+        for n in names:
+            if n.split(".", 1)[0] == prefix:
+                os.remove(os.path.join(PROFILE_DIR, n))
+
+@app.before_request
+def start_request_profile():
+    modes = requested_profile_modes()
+    if not modes or not is_admin_request():
+        return
+    if "cpu" in modes:
+        if not _cpu_profile_lock.acquire(blocking=False):
+            return "Đang có request khác được profile CPU, vui lòng thử lại sau.", 409
+        g.profile_cpu_locked = True
+    g.profile_modes = modes
+    g.profile_started = time.perf_counter()
+    if "mem" in modes and _tracemalloc_lock.acquire(blocking=False):
+        # tracemalloc là toàn cục cho tiến trình: chỉ 1 request được chụp bộ nhớ tại 1 thời điểm
+        g.profile_mem_locked = True
+        tracemalloc.start(25)
+    if "cpu" in modes:
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+@app.after_request
+def finish_request_profile(response):
+    modes = getattr(g, "profile_modes", None)
+    if not modes:
+        return response
+    profiler = getattr(g, "profiler", None)
+    if profiler is not None:
+        profiler.disable()
+    elapsed_ms = (time.perf_counter() - g.profile_started) * 1000
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = dt.datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    prefix = "_".join([stamp, safe_filename_part(request.endpoint or "unknown"),
+                       safe_filename_part(profile_session_id())])
+    saved = []
+
+    if profiler is not None:
+        prof_path = os.path.join(PROFILE_DIR, prefix + ".prof")
+        profiler.dump_stats(prof_path)
+        with open(os.path.join(PROFILE_DIR, prefix + ".cpu.txt"), "w", encoding="utf-8") as f:
+            f.write(profile_request_line(response, elapsed_ms) + "\n")
+            pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(40)
+        saved += [prefix + ".prof", prefix + ".cpu.txt"]
+
+    if getattr(g, "profile_mem_locked", False):
         try:
-            upsert_event(target_session, payload)
-        except ValueError:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            _tracemalloc_lock.release()
+        with open(os.path.join(PROFILE_DIR, prefix + ".mem.txt"), "w", encoding="utf-8") as f:
+            f.write(profile_request_line(response, elapsed_ms))
+            f.write(f"Bộ nhớ hiện tại: {current / 1024:.1f} KiB, đỉnh: {peak / 1024:.1f} KiB\n\n")
+            for stat in snapshot.statistics("lineno")[:PROFILE_TOP_ALLOCS]:
+                f.write(f"{stat}\n")
+        saved.append(prefix + ".mem.txt")
+    elif "mem" in modes:
+        print("Bỏ qua profile bộ nhớ: đang có request khác dùng tracemalloc")
+
+    prune_profiles()
+    print(f"Đã lưu profile {prefix}: {', '.join(saved)}")
+    response.headers["X-Profile-Capture"] = prefix
+    return response
+
+@app.teardown_request
+def release_request_profile(exc):
+    # Luôn trả khoá profiler, kể cả khi request lỗi trước after_request
+    if g.pop("profile_cpu_locked", False):
+        g.profiler.disable()
+        _cpu_profile_lock.release()
+
+@app.route("/admin/profiles")
+def list_profiles():
+    if not is_admin_request():
+        abort(403)
+    captures = {}
+    if os.path.isdir(PROFILE_DIR):
+        for name in os.listdir(PROFILE_DIR):
+            prefix = name.split(".", 1)[0]
+            path = os.path.join(PROFILE_DIR, name)
+            cap = captures.setdefault(prefix, {"id": prefix, "files": [], "size": 0})
+            cap["files"].append(name)
+            cap["size"] += os.path.getsize(path)
+    for cap in captures.values():
+        stamp, _, rest = cap["id"].partition("_")
+        route, _, sid = rest.rpartition("_")
+        cap.update(route=route, session_id=sid, captured_at=stamp)
+        cap["files"].sort()
+    recent = sorted(captures.values(), key=lambda c: c["id"], reverse=True)
+    limit = request.args.get("limit", type=int) or 20
+    return jsonify(recent[:limit])
+
+@app.route("/admin/profiles/<name>")
+def download_profile(name):
+    if not is_admin_request():
+        abort(403)
+    path = os.path.join(PROFILE_DIR, os.path.basename(name))
+    if not os.path.isfile(path):
+        return "Không tìm thấy profile", 404
+    return send_file(path, as_attachment=name.endswith(".prof"), download_name=os.path.basename(name))
+
+# ========== HTTP CACHE: ETAG, NÉN, STATIC ==========
+_static_fingerprints = {}
+
+def make_etag(*parts) -> str:
+    raw = "|".join(str(p) for p in (APP_BUILD,) + parts)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20]
+
+def sessions_signature(sessions) -> str:
+    return ",".join(f"{s['id']}:{s.get('version', 0)}" for s in sessions)
+
+def not_modified(etag: str):
+    # Trả về 304 nếu client đã có bản này (kể cả bản đã nén gzip/br)
+    if not request.if_none_match:
+        return None
+    for candidate in (etag, f"{etag}-gzip", f"{etag}-br"):
+        if request.if_none_match.contains_weak(candidate):
+            resp = app.response_class(status=304)
+            resp.set_etag(candidate)
+            resp.headers["Cache-Control"] = "no-cache"
+            return resp
+    return None
+
+def with_etag(rv, etag: str):
+    response = make_response(rv)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+def static_fingerprint(filename: str) -> str:
+    path = os.path.join(app.static_folder, filename)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return ""
+    cached = _static_fingerprints.get(filename)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:10]
+    _static_fingerprints[filename] = (mtime, digest)
+    return digest
+
+def static_url(filename: str) -> str:
+    fp = static_fingerprint(filename)
+    return url_for("static", filename=filename, v=fp) if fp else url_for("static", filename=filename)
+
+app.jinja_env.globals["static_url"] = static_url
+
+@app.after_request
+def cache_static_assets(response):
+    if request.endpoint != "static" or response.status_code != 200:
+        return response
+    filename = (request.view_args or {}).get("filename", "")
+    if request.args.get("v") and request.args.get("v") == static_fingerprint(filename):
+        # URL đã gắn dấu vân tay -> nội dung không bao giờ đổi
+        response.headers["Cache-Control"] = f"public, max-age={STATIC_MAX_AGE}, immutable"
+    else:
+        response.headers["Cache-Control"] = "public, max-age=300"
+    return response
+
+@app.after_request
+def compress_response(response):
+    if (response.status_code != 200 or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESS_MIMETYPES
+            or (response.is_streamed and not response.direct_passthrough)):
+        return response
+    encodings = ["br", "gzip"] if brotli is not None else ["gzip"]
+    encoding = request.accept_encodings.best_match(encodings)
+    if not encoding:
+        return response
+    # send_file (ICS, backup JSON) trả về dạng passthrough -> đọc ra để nén
+    response.direct_passthrough = False
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+    if encoding == "br":
+        body = brotli.compress(body)
+    else:
+        body = gzip.compress(body, compresslevel=6)
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
+
+# ========== THÔNG BÁO THAY ĐỔI (SSE) ==========
+# Mỗi thay đổi (upsert/delete/clear) được gom lại trong request, ghi vào log dùng chung
+# sau khi save_data thành công. Mỗi worker có 1 luồng đọc log và phát tới các stream SSE.
+_pending = threading.local()
+
+def pending_changes():
+    if not hasattr(_pending, "changes"):
+        _pending.changes = []
+    return _pending.changes
+
+def cell_conflict_flags(session, cells):
+    # Cờ cảnh báo của các ô (ngày, buổi) bị ảnh hưởng, dạng gọn: id -> [giờ, thành phần, địa điểm]
+    events = [dict(e) for e in session["events"] if (e["date"], e["session_buoi"]) in cells]
+    compute_conflicts(events)
+    compute_attendees_location_conflicts(events)
+    return {e["id"]: [int(bool(e.get("conflict"))), int(bool(e.get("attendees_conflict"))),
+                      int(bool(e.get("location_conflict")))] for e in events}
+
+def record_change(op, session, event=None, cells=()):
+    change = {"op": op, "session_id": session["id"], "version": session.get("version", 0)}
+    if op == "upsert":
+        change["event"] = dict(event)
+    elif op == "delete":
+        change["event_id"] = event["id"]
+    if cells:
+        # Cờ cảnh báo tính lúc flush: 1 lô nhiều thao tác cùng ô chỉ tính 1 lần
+        change["_cells"] = (session, set(cells))
+    pending_changes().append(change)
+
+def resolve_change_flags(changes):
+    # Mỗi ô (tuần, ngày, buổi) chỉ gắn cờ ở thay đổi cuối cùng chạm tới nó (trạng thái sau cùng)
+    done = set()
+    for change in reversed(changes):
+        if "_cells" not in change:
             continue
-    
+        session, cells = change.pop("_cells")
+        fresh = {c for c in cells if (session["id"],) + c not in done}
+        done.update((session["id"],) + c for c in fresh)
+        if fresh:
+            change["flags"] = cell_conflict_flags(session, fresh)
+
+def flush_changes():
+    changes = pending_changes()
+    if not changes:
+        return
+    _pending.changes = []
+    resolve_change_flags(changes)
+    try:
+        change_broker.publish(changes)
+    except OSError as e:
+        print(f"Lỗi khi ghi log thay đổi: {e}")
+    try:
+        sync_log.append(changes)
+    except OSError as e:
+        print(f"Lỗi khi ghi log đồng bộ: {e}")
+
+@app.before_request
+def reset_pending_changes():
+    _pending.changes = []
+
+class ChangeBroker:
+    RESYNC = {"op": "resync"}
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.subscribers = {}
+        self.recent = deque(maxlen=1000)
+        self.pid = None
+        self.stopped = False
+
+    def publish(self, changes):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        payload = "".join(json.dumps(c, ensure_ascii=False) + "\n" for c in changes).encode("utf-8")
+        while True:
+            f = open(self.path, "ab")
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                if os.fstat(f.fileno()).st_ino == os.stat(self.path).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            # Tiến trình khác vừa xoay vòng file trong lúc chờ khoá -> mở lại file mới, không ghi vào .1
+            f.close()
+        with f:
+            try:
+                f.write(payload)
+                f.flush()
+                if f.tell() > BROKER_MAX_BYTES:
+                    os.replace(self.path, self.path + ".1")
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def ensure_started(self):
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            # Sau fork (gunicorn) luồng đọc không còn -> khởi động lại trong tiến trình này
+            self.pid = os.getpid()
+            self.subscribers = {}
+            self.recent.clear()
+            threading.Thread(target=self._run, name="change-broker", daemon=True).start()
+
+    def subscribe(self, session_id):
+        self.ensure_started()
+        q = queue.Queue(maxsize=500)
+        with self.lock:
+            self.subscribers[q] = session_id
+        return q
+
+    def unsubscribe(self, q):
+        with self.lock:
+            self.subscribers.pop(q, None)
+
+    def replay(self, session_id, since_version):
+        # Trả về các thay đổi bị lỡ (version > since_version), hoặc None nếu bộ đệm không đủ
+        with self.lock:
+            missed = [c for c in self.recent if c["session_id"] == session_id and c["version"] > since_version]
+        if not missed or missed[0]["version"] != since_version + 1:
+            return None
+        return missed
+
+    def _dispatch(self, change):
+        with self.lock:
+            self.recent.append(change)
+            targets = [q for q, sid in self.subscribers.items() if sid == change["session_id"]]
+        for q in targets:
+            try:
+                q.put_nowait(change)
+            except queue.Full:
+                # Client đọc quá chậm -> yêu cầu tải lại toàn bộ
+                self.unsubscribe(q)
+                q.queue.clear()
+                q.put_nowait(self.RESYNC)
+
+    def _drain(self, f, buf):
+        buf += f.read()
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                self._dispatch(json.loads(line))
+            except ValueError:
+                print(f"Bỏ qua dòng log thay đổi lỗi: {line[:80]!r}")
+        return buf
+
+    def _run(self):
+        # Giữ file log đang mở: khi publish() đổi tên nó thành .1 vẫn đọc nốt được phần cuối qua handle cũ
+        f, buf = None, b""
+        try:
+            f = open(self.path, "rb")
+            f.seek(0, os.SEEK_END)  # Chỉ phát các thay đổi mới
+        except FileNotFoundError:
+            pass
+        while not self.stopped:
+            time.sleep(BROKER_POLL_SECONDS)
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                st = None
+            if f is not None:
+                if st is not None and st.st_ino == os.fstat(f.fileno()).st_ino and st.st_size < f.tell():
+                    f.seek(0)
+                    buf = b""
+                buf = self._drain(f, buf)
+                if st is None or st.st_ino == os.fstat(f.fileno()).st_ino:
+                    continue
+                f.close()  # Đã xoay vòng: phần còn lại của file cũ đã đọc xong ở trên
+            if st is None:
+                f = None
+                continue
+            try:
+                f, buf = open(self.path, "rb"), b""
+            except FileNotFoundError:
+                f = None
+                continue
+            buf = self._drain(f, buf)
+
+change_broker = LocalProxy(lambda: current_tenant().change_broker)
+
+def sse_message(change) -> str:
+    body = json.dumps(change, ensure_ascii=False, separators=(",", ":"))
+    if change.get("op") == "resync":
+        return f"event: resync\ndata: {body}\n\n"
+    return f"id: {change['version']}\nevent: change\ndata: {body}\n\n"
+
+@app.route("/stream/<session_id>")
+def stream_session(session_id):
+    data = load_data_readonly()
+    sess = find_session_by_id(data, session_id)
+    if not sess:
+        return "Không tìm thấy session", 404
+    current = sess.get("version", 0)
+    # Khi EventSource tự kết nối lại, Last-Event-ID mới hơn tham số "since" ban đầu
+    since = request.headers.get("Last-Event-ID", type=int)
+    if since is None:
+        since = request.args.get("since", type=int)
+    broker = change_broker._get_current_object()
+
+    def generate():
+        last_sent = current if since is None else since
+        pool = admission_pools["sse"]
+        # Đăng ký trong generator: response không bao giờ được đọc thì cũng không để lại subscriber
+        q = broker.subscribe(session_id)
+        streaming = pool.enter()
+        started = time.perf_counter()
+        try:
+            yield f"retry: {3000 if streaming else SSE_POLL_SECONDS * 1000}\n\n"
+            if since is not None and since != current:
+                missed = broker.replay(session_id, since) if since < current else None
+                if missed is None:
+                    yield sse_message({**ChangeBroker.RESYNC, "session_id": session_id, "version": current})
+                    return
+                for change in missed:
+                    yield sse_message(change)
+                    last_sent = change["version"]
+            if not streaming:
+                return  # Hết chỗ giữ stream: chỉ gửi phần đã lỡ, EventSource kết nối lại sau SSE_POLL_SECONDS
+            deadline = time.monotonic() + SSE_MAX_SECONDS
+            while time.monotonic() < deadline:
+                try:
+                    change = q.get(timeout=max(0.1, min(SSE_KEEPALIVE_SECONDS, deadline - time.monotonic())))
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                if change is ChangeBroker.RESYNC:
+                    yield sse_message({**change, "session_id": session_id, "version": last_sent})
+                    return
+                if change["version"] <= last_sent:
+                    continue
+                if change["version"] != last_sent + 1:
+                    # Lỡ thay đổi (xoay vòng log, nhập dữ liệu không phát sự kiện...) -> tải lại toàn bộ
+                    yield sse_message({**ChangeBroker.RESYNC, "session_id": session_id, "version": change["version"]})
+                    return
+                yield sse_message(change)
+                last_sent = change["version"]
+        finally:
+            broker.unsubscribe(q)
+            if streaming:
+                pool.leave(time.perf_counter() - started)
+
+    return Response(generate(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# ========== ĐỒNG BỘ THEO PHIÊN BẢN TOÀN CỤC (/api/sync) ==========
+# Mỗi thay đổi được đánh số seq tăng dần (dùng chung mọi tuần, mọi worker: cấp số dưới khoá file) và ghi vào
+# log JSONL riêng. Client giữ seq cuối cùng đã áp dụng và chỉ tải phần thay đổi sau đó.
+# Log giữ tối đa SYNC_LOG_MAX_ENTRIES dòng; client tụt lại quá xa nhận reset=true và tải lại toàn bộ.
+class SyncLog:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.seqs, self.offsets = [], []
+        self.indexed, self.inode = 0, None
+
+    def _refresh(self):
+        # Đánh chỉ mục (seq, vị trí byte) phần mới ghi thêm; file bị thay (nén log) -> đánh lại từ đầu
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self.seqs, self.offsets, self.indexed, self.inode = [], [], 0, None
+            return
+        if st.st_ino != self.inode or st.st_size < self.indexed:
+            self.seqs, self.offsets, self.indexed, self.inode = [], [], 0, st.st_ino
+        with open(self.path, "rb") as f:
+            if self.seqs:
+                # inode có thể được dùng lại sau khi nén log: dòng cuối đã đánh chỉ mục phải còn đúng chỗ
+                marker = b'{"seq": %d,' % self.seqs[-1]
+                f.seek(self.offsets[-1])
+                if f.read(len(marker)) != marker:
+                    self.seqs, self.offsets, self.indexed = [], [], 0
+            if st.st_size == self.indexed:
+                return
+            f.seek(self.indexed)
+            chunk = f.read(st.st_size - self.indexed)
+        pos = 0
+        while True:
+            end = chunk.find(b"\n", pos)
+            if end < 0:
+                break
+            line = chunk[pos:end]
+            if line.startswith(b'{"seq": '):
+                self.seqs.append(int(line[8:line.index(b",")]))
+                self.offsets.append(self.indexed + pos)
+            pos = end + 1
+        self.indexed += pos
+
+    @contextlib.contextmanager
+    def _locked(self, exclusive):
+        # Ghi giữ khoá file LOCK_EX, đọc giữ LOCK_SH suốt lúc đọc: nén log (os.replace) không chen vào giữa
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self.lock, open(self.path + ".lock", "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def append(self, changes):
+        with self._locked(exclusive=True):
+            self._refresh()
+            seq = self.seqs[-1] if self.seqs else 0
+            lines = []
+            for c in changes:
+                seq += 1
+                entry = {"seq": seq, "op": c["op"], "session_id": c["session_id"]}
+                if c["op"] == "upsert":
+                    entry["event"] = c["event"]
+                elif c["op"] == "delete":
+                    entry["id"] = c["event_id"]
+                lines.append(json.dumps(entry, ensure_ascii=False) + "\n")
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+            self._refresh()
+            if len(self.seqs) > SYNC_LOG_MAX_ENTRIES:
+                self._compact()
+
+    def _compact(self):
+        keep_from = self.offsets[len(self.offsets) - SYNC_LOG_MAX_ENTRIES // 2]
+        with open(self.path, "rb") as f:
+            f.seek(keep_from)
+            tail = f.read()
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(tail)
+        os.replace(tmp, self.path)
+        self._refresh()
+
+    def latest(self) -> int:
+        with self._locked(exclusive=False):
+            self._refresh()
+            return self.seqs[-1] if self.seqs else 0
+
+    def read(self, since, limit):
+        # -> (seq mới nhất, các dòng có seq > since, reset)
+        with self._locked(exclusive=False):
+            self._refresh()
+            if not self.seqs:
+                return 0, [], since > 0
+            latest = self.seqs[-1]
+            if since > latest or since < self.seqs[0] - 1:
+                return latest, [], True
+            i = bisect.bisect_right(self.seqs, since)
+            start = self.offsets[i] if i < len(self.offsets) else self.indexed
+            end = self.offsets[i + limit] if i + limit < len(self.offsets) else self.indexed
+            with open(self.path, "rb") as f:
+                f.seek(start)
+                lines = f.read(end - start).splitlines()
+        return latest, [json.loads(line) for line in lines if line], False
+
+sync_log = LocalProxy(lambda: current_tenant().sync_log)
+
+def coalesce_sync_entries(entries):
+    # Mỗi sự kiện chỉ giữ thay đổi cuối cùng; "clear" giữ nguyên. Client áp dụng theo thứ tự seq.
+    last = {}
+    for entry in entries:
+        key = ("clear", entry["seq"]) if entry["op"] == "clear" else entry.get("id") or entry["event"]["id"]
+        last.pop(key, None)
+        last[key] = entry
+    return sorted(last.values(), key=lambda e: e["seq"])
+
+# ========== CHỈ MỤC SỰ KIỆN THEO NGÀY ==========
+# Danh sách khoá (ngày, phút bắt đầu, tuần, id) đã sắp xếp + chỉ mục phụ theo chủ trì, phòng
+# và người (chủ trì hoặc tham dự).
+# Đồng bộ tăng dần theo version từng tuần: chỉ tuần đã đổi (kể cả do worker khác ghi) mới được đánh lại.
+class EventIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.keys = []
+        self.by_chair = {}
+        self.by_room = {}
+        self.by_person = {}
+        self.events = {}
+        self.session_events = {}
+        self.session_versions = {}
+        self.epoch = None  # epoch danh mục tên lúc đánh chỉ mục (gộp alias -> ID đổi -> đánh lại toàn bộ)
+        self.built = False
+        self.data_key = None
+
+    @staticmethod
+    def key_of(session_id, ev):
+        try:
+            start = hhmm_to_minutes(ev["start_time"])
+        except (KeyError, ValueError):
+            start = 0
+        return (ev["date"], start, session_id, ev["id"])
+
+    def sync(self, data):
+        with self.lock:
+            name_registry.ensure_loaded()
+            if self.epoch != name_registry.epoch:
+                self.keys, self.by_chair, self.by_room, self.by_person = [], {}, {}, {}
+                self.events, self.session_events, self.session_versions = {}, {}, {}
+                self.epoch = name_registry.epoch
+            seen = set()
+            for s in data["sessions"]:
+                seen.add(s["id"])
+                signature = (s.get("version", 0), session_event_count(s))
+                if self.session_versions.get(s["id"]) != signature:
+                    self._drop_session(s["id"])
+                    for ev in s["events"]:
+                        self._add(s["id"], ev)
+                    self.session_versions[s["id"]] = signature
+            for sid in [sid for sid in self.session_versions if sid not in seen]:
+                self._drop_session(sid)
+            self.built = True
+        return self
+
+    def _add(self, session_id, ev):
+        ev = dict(event_name_ids(ev))
+        key = self.key_of(session_id, ev)
+        if key in self.events:
+            return
+        self.events[key] = ev
+        self.session_events.setdefault(session_id, []).append(key)
+        bisect.insort(self.keys, key)
+        if ev.get("chair_id") is not None:
+            bisect.insort(self.by_chair.setdefault(ev["chair_id"], []), key)
+        if ev.get("room_id") is not None:
+            bisect.insort(self.by_room.setdefault(ev["room_id"], []), key)
+        for person in event_people_ids(ev):
+            bisect.insort(self.by_person.setdefault(person, []), key)
+
+    def _remove_key(self, arr, key):
+        i = bisect.bisect_left(arr, key)
+        if i < len(arr) and arr[i] == key:
+            del arr[i]
+
+    def _drop_session(self, session_id):
+        for key in self.session_events.pop(session_id, []):
+            ev = self.events.pop(key)
+            self._remove_key(self.keys, key)
+            if ev.get("chair_id") is not None:
+                self._remove_key(self.by_chair[ev["chair_id"]], key)
+            if ev.get("room_id") is not None:
+                self._remove_key(self.by_room[ev["room_id"]], key)
+            for person in event_people_ids(ev):
+                self._remove_key(self.by_person[person], key)
+        self.session_versions.pop(session_id, None)
+
+    def scan(self, arr, date_from, date_to, after=None):
+        # Quét nhị phân trên [date_from, date_to], bắt đầu sau khoá "after" (phân trang)
+        lo = bisect.bisect_left(arr, (date_from,))
+        if after is not None:
+            lo = max(lo, bisect.bisect_right(arr, after))
+        hi = bisect.bisect_right(arr, (date_to, float("inf")))
+        for i in range(lo, hi):
+            yield arr[i]
+
+    def query(self, date_from, date_to, chair=None, attendee=None, room=None, category=None, after=None, limit=100):
+        with self.lock:
+            if chair is not None:
+                arr = self.by_chair.get(chair, [])
+            elif room is not None:
+                arr = self.by_room.get(room, [])
+            elif attendee is not None:
+                arr = self.by_person.get(attendee, [])
+            else:
+                arr = self.keys
+            out = []
+            for key in self.scan(arr, date_from, date_to, after):
+                ev = self.events[key]
+                if room is not None and ev.get("room_id") != room:
+                    continue
+                if attendee is not None and attendee not in ev["attendee_ids"] and ev.get("chair_id") != attendee:
+                    continue
+                if category is not None and fold_name(ev.get("category")) != category:
+                    continue
+                out.append((key, ev))
+                if len(out) > limit:
+                    break
+            return out
+
+    def person_page(self, person, start_key, backward=False, limit=20):
+        # Tiến: các khoá sau start_key; lùi: các khoá trước start_key. Trả về (rows, còn nữa không)
+        with self.lock:
+            arr = self.by_person.get(person, [])
+            if backward:
+                hi = bisect.bisect_left(arr, start_key)
+                keys = arr[max(0, hi - limit):hi]
+                more = hi > limit
+            else:
+                lo = bisect.bisect_right(arr, start_key)
+                keys = arr[lo:lo + limit]
+                more = lo + limit < len(arr)
+            return [(key, self.events[key]) for key in keys], more
+
+    def person_range(self, person, date_from, date_to):
+        with self.lock:
+            return [(key, self.events[key]) for key in self.scan(self.by_person.get(person, []), date_from, date_to)]
+
+event_index = LocalProxy(lambda: current_tenant().event_index)
+
+def get_event_index(data=None):
+    # Không truyền data: đồng bộ theo file dữ liệu (không parse JSON nếu file không đổi)
+    if data is None:
+        return synced_index(current_tenant().event_index)
+    return event_index.sync(data)
+
+@on_commit
+def sync_event_index(data):
+    resync_after_commit(current_tenant().event_index, data)
+
+def encode_cursor(key) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key), ensure_ascii=False).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str):
+    try:
+        return tuple(json.loads(base64.urlsafe_b64decode(cursor.encode("ascii"))))
+    except (ValueError, TypeError):
+        raise ValueError("Cursor không hợp lệ")
+
+# ========== GỢI Ý TÊN CUỘC HỌP (TYPEAHEAD) ==========
+# Trie tiền tố trên tên họp đã bỏ dấu (fold_name), dựng từ toàn bộ lịch sử. Mỗi tên giữ bộ đếm chủ trì,
+# thành phần, địa điểm, loại, thời lượng -> gợi ý kèm giá trị hay dùng nhất để điền sẵn form.
+# Xếp hạng: số lần dùng × 0.5^(số ngày từ lần gần nhất / TITLE_HALF_LIFE_DAYS).
+# Cập nhật theo tuần (version đổi thì trừ đóng góp cũ, cộng đóng góp mới) -> không dựng lại cả trie.
+TITLE_FIELDS = ("titles", "chairs", "attendees", "locations", "categories", "durations", "dates")
+
+def title_contributions(session):
+    out = {}
+    for ev in session["events"]:
+        key = fold_name(ev.get("title"))
+        if not key:
+            continue
+        c = out.get(key)
+        if c is None:
+            c = out[key] = {f: Counter() for f in TITLE_FIELDS}
+        c["titles"][ev["title"].strip()] += 1
+        c["chairs"][ev.get("chair") or ""] += 1
+        c["attendees"][tuple(split_people(ev.get("attendees")))] += 1
+        c["locations"][ev.get("location") or ""] += 1
+        c["categories"][ev.get("category") or ""] += 1
+        try:
+            minutes = hhmm_to_minutes(ev["end_time"]) - hhmm_to_minutes(ev["start_time"])
+        except (KeyError, ValueError, AttributeError):
+            minutes = 0
+        if minutes > 0:
+            c["durations"][minutes] += 1
+        c["dates"][ev["date"]] += 1
+    return out
+
+class TitleIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.root = {}  # nút trie: {"": tập key trong cây con, ký tự: nút con}
+        self.stats = {}  # key -> bộ đếm (TITLE_FIELDS) + "count", "last"
+        self.weeks = {}  # session_id -> (version, đóng góp của tuần)
+        self.built = False
+        self.data_key = None
+
+    def sync(self, data):
+        with self.lock:
+            seen = set()
+            for s in data["sessions"]:
+                seen.add(s["id"])
+                version = s.get("version", 0)
+                old = self.weeks.get(s["id"])
+                if old is None or old[0] != version:
+                    new = title_contributions(s)
+                    self._apply(old[1] if old else {}, new)
+                    self.weeks[s["id"]] = (version, new)
+            for sid in [sid for sid in self.weeks if sid not in seen]:
+                self._apply(self.weeks.pop(sid)[1], {})
+            self.built = True
+        return self
+
+    def _apply(self, old, new):
+        for key, c in old.items():
+            st = self.stats[key]
+            for f in TITLE_FIELDS:
+                st[f].subtract(c[f])
+                st[f] = +st[f]  # Bỏ phần tử <= 0
+            st["count"] = sum(st["dates"].values())
+            if not st["count"]:
+                del self.stats[key]
+                self._trie_remove(key)
+            elif st["last"] in c["dates"]:
+                st["last"] = max(st["dates"])
+        for key, c in new.items():
+            st = self.stats.get(key)
+            if st is None:
+                st = self.stats[key] = {**{f: Counter() for f in TITLE_FIELDS}, "count": 0, "last": ""}
+                self._trie_add(key)
+            for f in TITLE_FIELDS:
+                st[f].update(c[f])
+            st["count"] = sum(st["dates"].values())
+            st["last"] = max(st["dates"])
+
+    def _trie_add(self, key):
+        node = self.root
+        node.setdefault("", set()).add(key)
+        for ch in key[:TITLE_TRIE_DEPTH]:
+            node = node.setdefault(ch, {})
+            node.setdefault("", set()).add(key)
+
+    def _trie_remove(self, key):
+        path = [self.root]
+        for ch in key[:TITLE_TRIE_DEPTH]:
+            path.append(path[-1][ch])
+        for i in range(len(path) - 1, -1, -1):
+            path[i][""].discard(key)
+            if i and not path[i][""]:
+                del path[i - 1][key[i - 1]]
+
+    def suggest(self, prefix, limit=TITLE_SUGGEST_LIMIT, today=None):
+        prefix = fold_name(prefix)
+        if not prefix:
+            return []
+        today = today or dt.date.today()
+        with self.lock:
+            node = self.root
+            for ch in prefix[:TITLE_TRIE_DEPTH]:
+                node = node.get(ch)
+                if node is None:
+                    return []
+            keys = node[""]
+            if len(prefix) > TITLE_TRIE_DEPTH:
+                keys = [k for k in keys if k.startswith(prefix)]
+
+            def score(key):
+                st = self.stats[key]
+                age = max((today - dt.date.fromisoformat(st["last"])).days, 0)
+                return st["count"] * 0.5 ** (age / TITLE_HALF_LIFE_DAYS)
+
+            ranked = heapq.nlargest(limit, keys, key=lambda k: (score(k), k))
+            return [self._suggestion(k, score(k)) for k in ranked]
+
+    def _suggestion(self, key, score):
+        st = self.stats[key]
+        top = lambda f, default: st[f].most_common(1)[0][0] if st[f] else default
+        return {"title": top("titles", key), "count": st["count"], "last_date": st["last"], "score": round(score, 3),
+                "chair": top("chairs", ""), "attendees": list(top("attendees", ())), "location": top("locations", ""),
+                "category": top("categories", ""), "duration_minutes": top("durations", None)}
+
+    def status(self):
+        with self.lock:
+            return {"titles": len(self.stats), "weeks": len(self.weeks), "built": self.built}
+
+title_index = LocalProxy(lambda: current_tenant().title_index)
+
+def get_title_index():
+    return synced_index(current_tenant().title_index)
+
+@on_commit
+def refresh_title_index(data):
+    resync_after_commit(current_tenant().title_index, data)
+
+
+# ========== SNAPSHOT NHỊ PHÂN DÙNG CHUNG (MMAP) ==========
+# Sau mỗi lần ghi, data được ghi thêm ra file snapshot của chi nhánh: bản ghi độ dài cố định cho tuần/sự kiện
+# + bảng chuỗi (UTF-8, không lặp). Các worker mmap file ở chế độ chỉ đọc (dùng chung page cache của OS)
+# và chỉ giải mã sự kiện của tuần được truy cập. JSON vẫn là nguồn gốc: snapshot chỉ được dùng khi
+# khớp (mtime, size) của file dữ liệu lúc ghi.
+SNAPSHOT_MAGIC = b"MSNP"
+SNAPSHOT_FORMAT = 2
+SNAPSHOT_HEADER = struct.Struct("<4sHHIIIIQQQQqqI")
+SNAPSHOT_SESSION = struct.Struct("<IiiIIII")  # id, week_start, week_end (ordinal), version + 1 (0 = không có), event đầu, số event, extra
+SNAPSHOT_EVENT = struct.Struct("<10IiiIIIB")  # 10 chuỗi, chair_id, room_id, attendee (off, n), extra, có ID
+SNAPSHOT_EVENT_FIELDS = ("id", "date", "session_buoi", "start_time", "end_time",
+                         "title", "category", "chair", "attendees", "location")
+SNAPSHOT_SESSION_KEYS = {"id", "week_start", "week_end", "version", "events"}
+SNAPSHOT_EVENT_KEYS = set(SNAPSHOT_EVENT_FIELDS) | {"chair_id", "room_id", "attendee_ids"}
+SNAPSHOT_STRING_CACHE = 4096  # Số chuỗi đã giải mã giữ lại mỗi tiến trình
+
+def write_snapshot(data, json_stat):
+    strings, table = {"": 0}, [""]
+
+    def sid(value):
+        value = "" if value is None else str(value)
+        i = strings.get(value)
+        if i is None:
+            i = strings[value] = len(table)
+            table.append(value)
+        return i
+
+    def extra(obj, known):
+        rest = {k: v for k, v in obj.items() if k not in known}
+        return sid(json.dumps(rest, ensure_ascii=False)) if rest else 0
+
+    session_recs, event_recs, attendees = [], [], []
+    for s in data["sessions"]:
+        first = len(event_recs)
+        for ev in s["events"]:
+            has_ids = "attendee_ids" in ev
+            ids = ev.get("attendee_ids") or []
+            event_recs.append(SNAPSHOT_EVENT.pack(
+                *(sid(ev.get(f)) for f in SNAPSHOT_EVENT_FIELDS),
+                -1 if ev.get("chair_id") is None else ev["chair_id"],
+                -1 if ev.get("room_id") is None else ev["room_id"],
+                len(attendees), len(ids), extra(ev, SNAPSHOT_EVENT_KEYS), int(has_ids)))
+            attendees.extend(ids)
+        session_recs.append(SNAPSHOT_SESSION.pack(
+            sid(s["id"]), dt.date.fromisoformat(s["week_start"]).toordinal(),
+            dt.date.fromisoformat(s["week_end"]).toordinal(), s["version"] + 1 if "version" in s else 0,
+            first, len(s["events"]), extra(s, SNAPSHOT_SESSION_KEYS)))
+
+    epoch_idx = sid(data.get("registry_epoch"))  # Phải vào bảng chuỗi trước khi mã hoá bảng
+    blobs = [t.encode("utf-8") for t in table]
+    offsets, pos = [], 0
+    for b in blobs:
+        offsets.append(pos)
+        pos += len(b)
+    offsets.append(pos)
+
+    off_sessions = SNAPSHOT_HEADER.size
+    off_events = off_sessions + SNAPSHOT_SESSION.size * len(session_recs)
+    off_att = off_events + SNAPSHOT_EVENT.size * len(event_recs)
+    off_strings = off_att + 4 * len(attendees)
+    header = SNAPSHOT_HEADER.pack(
+        SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, 0, len(session_recs), len(event_recs), len(table), len(attendees),
+        off_sessions, off_events, off_att, off_strings, json_stat.st_mtime_ns, json_stat.st_size, epoch_idx)
+
+    snapshot_path = current_tenant().snapshot_path
+    os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+    tmp = f"{snapshot_path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.writelines(session_recs)
+        f.writelines(event_recs)
+        f.write(struct.pack(f"<{len(attendees)}i", *attendees))
+        f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+        f.writelines(blobs)
+    os.replace(tmp, snapshot_path)
+
+class Snapshot:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, fmt, _, self.n_sessions, self.n_events, self.n_strings, self.n_att, self.off_sessions,
+         self.off_events, self.off_att, self.off_strings, self.json_mtime_ns, self.json_size,
+         epoch_idx) = SNAPSHOT_HEADER.unpack_from(self.buf, 0)
+        if magic != SNAPSHOT_MAGIC or fmt != SNAPSHOT_FORMAT:
+            raise ValueError("Snapshot không đúng định dạng")
+        self.off_blob = self.off_strings + 8 * (self.n_strings + 1)
+        # Chuỗi đọc thẳng từ mmap khi cần (không chép cả bảng vào từng worker); cache giới hạn theo LRU
+        self.string = functools.lru_cache(maxsize=SNAPSHOT_STRING_CACHE)(self._string)
+        self.registry_epoch = self.string(epoch_idx) or None
+
+    def _string(self, i):
+        if not 0 <= i < self.n_strings:
+            raise IndexError(i)
+        a, b = struct.unpack_from("<QQ", self.buf, self.off_strings + 8 * i)
+        return self.buf[self.off_blob + a:self.off_blob + b].decode("utf-8")
+
+    def sessions(self):
+        out = []
+        for i in range(self.n_sessions):
+            sid_, ws, we, version, first, n, extra = SNAPSHOT_SESSION.unpack_from(
+                self.buf, self.off_sessions + i * SNAPSHOT_SESSION.size)
+            s = SnapshotSession(self, first, n)
+            s.update({"id": self.string(sid_), "week_start": dt.date.fromordinal(ws).isoformat(),
+                      "week_end": dt.date.fromordinal(we).isoformat()})
+            if version:
+                s["version"] = version - 1
+            if extra:
+                s.update(json.loads(self.string(extra)))
+            out.append(s)
+        return out
+
+    def events(self, first, n):
+        name_registry.ensure_loaded()
+        with_ids = self.registry_epoch == name_registry.epoch  # Danh mục đã đổi -> để event_name_ids tính lại
+        string = self.string
+        out = []
+        for i in range(first, first + n):
+            rec = SNAPSHOT_EVENT.unpack_from(self.buf, self.off_events + i * SNAPSHOT_EVENT.size)
+            ev = dict(zip(SNAPSHOT_EVENT_FIELDS, map(string, rec[:10])))
+            chair_id, room_id, att_off, att_n, extra, has_ids = rec[10:]
+            if extra:
+                ev.update(json.loads(self.string(extra)))
+            if has_ids and with_ids:
+                ev["chair_id"] = None if chair_id < 0 else chair_id
+                ev["attendee_ids"] = list(struct.unpack_from(f"<{att_n}i", self.buf, self.off_att + 4 * att_off))
+                ev["room_id"] = None if room_id < 0 else room_id
+            out.append(ev)
+        return out
+
+class SnapshotSession(dict):
+    # Tuần đọc từ snapshot: "events" chỉ được giải mã khi truy cập lần đầu
+    def __init__(self, snapshot, first, count):
+        super().__init__()
+        self._snapshot, self._first, self._count = snapshot, first, count
+
+    def __missing__(self, key):
+        if key != "events":
+            raise KeyError(key)
+        events = self["events"] = self._snapshot.events(self._first, self._count)
+        return events
+
+def session_event_count(session) -> int:
+    # Đếm sự kiện không cần giải mã tuần đọc từ snapshot
+    if isinstance(session, SnapshotSession) and "events" not in session:
+        return session._count
+    return len(session["events"])
+
+_snapshot_lock = threading.Lock()
+
+def current_snapshot():
+    # Mở lại mmap khi file snapshot được thay (os.replace -> inode mới); None nếu không khớp JSON
+    tenant = current_tenant()
+    try:
+        st = os.stat(tenant.snapshot_path)
+        data_st = os.stat(tenant.data_path)
+    except OSError:
+        return None
+    key = (st.st_ino, st.st_mtime_ns, st.st_size)
+    state = tenant.snapshot_state
+    with _snapshot_lock:
+        if state["key"] != key:
+            try:
+                state["snapshot"] = Snapshot(tenant.snapshot_path)
+            except (OSError, ValueError, IndexError, struct.error) as e:
+                print(f"Không đọc được snapshot: {e}")
+                state["snapshot"] = None
+            state["key"] = key
+        snap = state["snapshot"]
+    if snap is None or (snap.json_mtime_ns, snap.json_size) != (data_st.st_mtime_ns, data_st.st_size):
+        return None
+    return snap
+
+def load_data_readonly():
+    # Dữ liệu chỉ để đọc: từ snapshot nếu còn khớp, ngược lại đọc JSON và ghi lại snapshot
+    snap = current_snapshot()
+    if snap is not None:
+        return {"sessions": snap.sessions(), "registry_epoch": snap.registry_epoch, "read_only": True}
+    ensure_data_file()
+    json_stat = os.stat(current_tenant().data_path)
+    data = load_data()
+    try:
+        write_snapshot(data, json_stat)
+    except (OSError, ValueError) as e:
+        print(f"Lỗi khi ghi snapshot: {e}")
+    return data
+
+@on_commit
+def refresh_snapshot(data):
+    write_snapshot(data, os.stat(current_tenant().data_path))
+
+# ========== XUẤT BẢN TRANG TUẦN TĨNH ==========
+# Sau mỗi lần ghi, các tuần đổi version được dựng lại thành file HTML (giống /preview) + ICS trong PUBLISH_DIR
+# (chi nhánh: PUBLISH_DIR/t/<mã>/), kèm index.html liệt kê các tuần. Ghi file tạm rồi os.replace nên người xem
+# không bao giờ thấy file dở dang. Trỏ nginx/Caddy/static host vào PUBLISH_DIR để lượt xem không qua Python.
+def preview_context(sess):
+    dates, schedule = build_schedule(sess)
+    return {"company": current_tenant().company, "chair_colors": current_tenant().chair_colors, "session": sess,
+            "dates": dates, "schedule": schedule, "weekdays": WEEKDAY_LABELS[:WEEK_DAYS]}
+
+def publish_dir():
+    slug = current_tenant().slug
+    return os.path.join(PUBLISH_DIR, "t", slug) if slug else PUBLISH_DIR
+
+def write_atomic(path, payload: bytes):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(payload)
+    os.replace(tmp, path)
+
+def publish_weeks(data, force=False):
+    # Chỉ dựng lại tuần có version khác lần xuất bản trước (hoặc code mới deploy -> dựng lại toàn bộ)
+    base = publish_dir()
+    weeks_dir = os.path.join(base, "weeks")
+    os.makedirs(weeks_dir, exist_ok=True)
+    manifest_path = os.path.join(base, "manifest.json")
+    with open(os.path.join(base, ".lock"), "a") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            try:
+                with open(manifest_path, "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+            except (FileNotFoundError, ValueError):
+                manifest = {}
+            if manifest.get("build") != APP_BUILD:
+                manifest, force = {"build": APP_BUILD, "weeks": {}}, True
+            published = manifest["weeks"]
+            sessions = {s["id"]: s for s in data["sessions"]}
+            changed = [s for sid, s in sessions.items() if force or published.get(sid, {}).get("version") != s.get("version", 0)]
+            for s in changed:
+                write_atomic(os.path.join(weeks_dir, f"{s['id']}.html"),
+                             compiled_template(TEMPLATE_PREVIEW).render(**preview_context(s)).encode("utf-8"))
+                ics, _ = export_session_to_ics(s)
+                write_atomic(os.path.join(weeks_dir, f"{s['id']}.ics"), ics.getvalue())
+                published[s["id"]] = {"version": s.get("version", 0), "week_start": s["week_start"],
+                                      "week_end": s["week_end"], "events": len(s["events"])}
+            removed = [sid for sid in published if sid not in sessions]
+            for sid in removed:
+                for ext in ("html", "ics"):
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(os.path.join(weeks_dir, f"{sid}.{ext}"))
+                del published[sid]
+            if changed or removed or not os.path.exists(os.path.join(base, "index.html")):
+                weeks = sorted(({"id": sid, **w} for sid, w in published.items()), key=lambda w: w["week_start"], reverse=True)
+                write_atomic(os.path.join(base, "index.html"), compiled_template(TEMPLATE_PUBLISHED_INDEX).render(
+                    company=current_tenant().company, weeks=weeks, current=session_id_from_date(dt.date.today()),
+                    generated=dt.datetime.now().strftime("%H:%M %d/%m/%Y")).encode("utf-8"))
+                write_atomic(manifest_path, json.dumps(manifest, ensure_ascii=False).encode("utf-8"))
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return {"dir": base, "published": len(changed), "removed": len(removed), "weeks": len(published)}
+
+class WeekPublisher:
+    # Luồng nền gom các lần ghi liên tiếp (PUBLISH_DEBOUNCE_SECONDS) rồi xuất bản 1 lần cho mỗi chi nhánh
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.dirty = set()
+        self.pid = None
+        self.last = {}
+
+    def request(self, slug):
+        with self.lock:
+            self.dirty.add(slug)
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                threading.Thread(target=self._run, name="week-publisher", daemon=True).start()
+        self.wake.set()
+
+    def _run(self):
+        while True:
+            self.wake.wait()
+            time.sleep(PUBLISH_DEBOUNCE_SECONDS)
+            self.wake.clear()
+            with self.lock:
+                slugs, self.dirty = self.dirty, set()
+            for slug in slugs:
+                started = time.perf_counter()
+                try:
+                    with use_tenant(slug):
+                        result = publish_weeks(load_data_readonly())
+                    result["seconds"] = round(time.perf_counter() - started, 3)
+                    self.last[slug] = result
+                except Exception as e:
+                    print(f"Lỗi khi xuất bản trang tuần ({slug or 'mặc định'}): {e}")
+
+week_publisher = WeekPublisher()
+
+@on_commit
+def publish_changed_weeks(data):
+    if PUBLISH_DIR:
+        week_publisher.request(current_tenant().slug)
+
+@app.cli.command("publish")
+@click.option("--all", "force", is_flag=True, help="Dựng lại mọi tuần (mặc định: chỉ tuần đã đổi)")
+def publish_command(force):
+    """Xuất bản trang HTML + ICS tĩnh của các tuần vào PUBLISH_DIR."""
+    if not PUBLISH_DIR:
+        raise click.ClickException("PUBLISH_DIR đang tắt")
+    started = time.perf_counter()
+    result = publish_weeks(load_data(), force=force)
+    print(f"{result['dir']}: dựng {result['published']} tuần, xoá {result['removed']}, "
+          f"tổng {result['weeks']} tuần ({time.perf_counter() - started:.2f}s)")
+
+# ========== XEM THEO KHOẢNG NGÀY ==========
+# Trang /range chỉ liệt kê các tuần; nội dung từng tuần được tải khi cuộn tới (/range/week/<id>).
+def week_start_from_session_id(session_id: str) -> dt.date:
+    m = re.fullmatch(r"(\d{4})-W(\d{2})", session_id or "")
+    if not m:
+        raise ValueError(f"Mã tuần không hợp lệ: {session_id}")
+    return dt.date.fromisocalendar(int(m.group(1)), int(m.group(2)), 1)
+
+def parse_range_args(args):
+    today = dt.date.today()
+    try:
+        if args.get("quarter"):
+            m = re.fullmatch(r"(\d{4})-Q([1-4])", args["quarter"])
+            if not m:
+                raise ValueError(args["quarter"])
+            start = dt.date(int(m.group(1)), 3 * int(m.group(2)) - 2, 1)
+            end = (dt.date(start.year + (start.month + 3 > 12), (start.month + 2) % 12 + 1, 1) - dt.timedelta(days=1))
+        elif args.get("from") or args.get("to"):
+            start = dt.date.fromisoformat(args.get("from") or today.isoformat())
+            end = dt.date.fromisoformat(args.get("to") or (start + dt.timedelta(days=30)).isoformat())
+        else:
+            month = dt.date.fromisoformat((args.get("month") or today.strftime("%Y-%m")) + "-01")
+            start = month
+            end = dt.date(month.year + (month.month == 12), month.month % 12 + 1, 1) - dt.timedelta(days=1)
+    except ValueError as e:
+        raise ValueError(f"Khoảng ngày không hợp lệ: {e}")
+    if end < start:
+        raise ValueError("Ngày kết thúc phải sau ngày bắt đầu.")
+    if (end - start).days > RANGE_MAX_DAYS:
+        raise ValueError(f"Khoảng ngày tối đa {RANGE_MAX_DAYS} ngày.")
+    return start, end
+
+def range_weeks(data, start: dt.date, end: dt.date):
+    sessions = {s["id"]: s for s in data["sessions"]}
+    weeks = []
+    monday = monday_of_week(start)
+    while monday <= end:
+        sid = session_id_from_date(monday)
+        sess = sessions.get(sid)
+        weeks.append({
+            "session_id": sid,
+            "week_start": monday.isoformat(),
+            "week_end": saturday_of_week(monday).isoformat(),
+            "version": sess.get("version", 0) if sess else 0,
+            "event_count": sum(1 for e in sess["events"] if start.isoformat() <= e["date"] <= end.isoformat()) if sess else 0,
+        })
+        monday += dt.timedelta(weeks=1)
+    return weeks
+
+def range_week_schedule(data, session_id, start: dt.date, end: dt.date):
+    week_start = week_start_from_session_id(session_id)
+    sess = find_session_by_id(data, session_id) or new_session_for(week_start)
+    dates, schedule = build_schedule(sess, with_conflicts=True)
+    visible = [d for d in dates if start <= d <= end]
+    return sess, dates, schedule, visible
+
+# ========== XUẤT TOÀN BỘ LỊCH SỬ (CSV / JSONL) ==========
+# Đọc chỉ mục theo từng lô EXPORT_CHUNK_ROWS (như phân trang /api/events) và sinh từng dòng:
+# bộ nhớ của response không phụ thuộc số sự kiện.
+def event_filters_from_args(args):
+    # Trả về None nếu tên người/phòng chưa từng xuất hiện (kết quả chắc chắn rỗng)
+    filters = {}
+    for param, kind in (("chair", "person"), ("attendee", "person"), ("room", "room")):
+        if args.get(param):
+            filters[param] = name_registry.lookup(args[param], kind)
+            if filters[param] is None:
+                return None
+    if args.get("category"):
+        filters["category"] = fold_name(args["category"])
+    return filters
+
+def iter_export_events(index, date_from, date_to, filters):
+    after = None
+    while True:
+        rows = index.query(date_from, date_to, after=after, limit=EXPORT_CHUNK_ROWS, **filters)
+        for key, ev in rows[:EXPORT_CHUNK_ROWS]:
+            yield {**ev, "session_id": key[2]}
+        if len(rows) <= EXPORT_CHUNK_ROWS:
+            return
+        after = rows[EXPORT_CHUNK_ROWS - 1][0]
+
+def iter_export_lines(events, fmt, fields):
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(fields)
+        for ev in events:
+            writer.writerow([ev.get(f, "") for f in fields])
+            if buf.tell() >= EXPORT_FLUSH_BYTES:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue()
+    else:
+        chunk = []
+        size = 0
+        for ev in events:
+            line = json.dumps({f: ev.get(f) for f in fields}, ensure_ascii=False) + "\n"
+            chunk.append(line)
+            size += len(line)
+            if size >= EXPORT_FLUSH_BYTES:
+                yield "".join(chunk)
+                chunk, size = [], 0
+        yield "".join(chunk)
+
+def gzip_stream(chunks):
+    comp = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: định dạng gzip
+    for text in chunks:
+        out = comp.compress(text.encode("utf-8"))
+        if out:
+            yield out
+    yield comp.flush()
+
+# ========== THỐNG KÊ SỬ DỤNG (PHÒNG / CHỦ TRÌ / THÀNH PHẦN) ==========
+# Mỗi tuần được chuyển thành các cột (ngày, giờ bắt đầu/kết thúc, chủ trì, phòng, ...) và tổng hợp
+# dạng vector (numpy nếu có). Kết quả theo tuần được giữ sẵn và chỉ tính lại tuần có version đổi;
+# báo cáo tháng/năm chỉ cộng các bản tổng hợp này. Mỗi tuần tách theo tháng để tuần giáp tháng không bị tính lệch.
+WEEKDAY_LABELS = ["Thứ 2", "Thứ 3", "Thứ 4", "Thứ 5", "Thứ 6", "Thứ 7", "CN"]
+
+def week_columns(events):
+    cols = {"day": [], "start": [], "end": [], "chair": [], "room": [], "category": [],
+            "time_conflict": [], "attendees_conflict": [], "location_conflict": [],
+            "att_event": [], "att_id": []}
+    for i, ev in enumerate(events):
+        try:
+            day = dt.date.fromisoformat(ev["date"]).weekday()
+            start, end = hhmm_to_minutes(ev["start_time"]), hhmm_to_minutes(ev["end_time"])
+        except (KeyError, ValueError):
+            continue
+        n = len(cols["day"])
+        cols["day"].append(day)
+        cols["start"].append(start)
+        cols["end"].append(max(end, start))
+        cols["chair"].append(-1 if ev.get("chair_id") is None else ev["chair_id"])
+        cols["room"].append(-1 if ev.get("room_id") is None else ev["room_id"])
+        cols["category"].append(ev.get("category") or "")
+        cols["time_conflict"].append(int(bool(ev.get("conflict"))))
+        cols["attendees_conflict"].append(int(bool(ev.get("attendees_conflict"))))
+        cols["location_conflict"].append(int(bool(ev.get("location_conflict"))))
+        for person in ev.get("attendee_ids") or []:
+            cols["att_event"].append(n)
+            cols["att_id"].append(person)
+    if np is not None:
+        for name, values in cols.items():
+            if name != "category":
+                cols[name] = np.asarray(values, dtype=np.int64)
+    return cols
+
+def sum_by(ids, weights):
+    # {id: tổng weights}; id âm = không có (chủ trì/phòng trống)
+    if np is not None:
+        keep = ids >= 0
+        if not keep.any():
+            return {}
+        sums = np.bincount(ids[keep], weights=weights[keep])
+        present = np.bincount(ids[keep])
+        return {int(i): float(sums[i]) for i in np.nonzero(present)[0]}
+    out = {}
+    for i, w in zip(ids, weights):
+        if i >= 0:
+            out[i] = out.get(i, 0) + w
+    return out
+
+def rollup_columns(cols):
+    n = len(cols["day"])
+    if np is not None:
+        hours = (cols["end"] - cols["start"]) / 60.0
+        heat = np.zeros((7, 24), dtype=np.int64)
+        for h in range(24):
+            active = (cols["start"] < (h + 1) * 60) & (cols["end"] > h * 60)
+            heat[:, h] = np.bincount(cols["day"][active], minlength=7)
+        any_conflict = cols["time_conflict"] | cols["attendees_conflict"] | cols["location_conflict"]
+        att_hours = hours[cols["att_event"]] if len(cols["att_event"]) else np.zeros(0)
+        heatmap = heat.tolist()
+        conflicts = {"time": int(cols["time_conflict"].sum()), "attendees": int(cols["attendees_conflict"].sum()),
+                     "location": int(cols["location_conflict"].sum()), "any": int(any_conflict.sum())}
+        total = float(hours.sum())
+    else:
+        hours = [(e - s) / 60.0 for s, e in zip(cols["start"], cols["end"])]
+        heatmap = [[0] * 24 for _ in range(7)]
+        for d, s, e in zip(cols["day"], cols["start"], cols["end"]):
+            for h in range(s // 60, min(24, (e + 59) // 60)):
+                heatmap[d][h] += 1
+        att_hours = [hours[i] for i in cols["att_event"]]
+        flags = list(zip(cols["time_conflict"], cols["attendees_conflict"], cols["location_conflict"]))
+        conflicts = {"time": sum(f[0] for f in flags), "attendees": sum(f[1] for f in flags),
+                     "location": sum(f[2] for f in flags), "any": sum(1 for f in flags if any(f))}
+        total = sum(hours)
+    categories = {}
+    for c in cols["category"]:
+        categories[c] = categories.get(c, 0) + 1
+    return {
+        "events": n,
+        "hours": total,
+        "room_hours": sum_by(cols["room"], hours),
+        "chair_hours": sum_by(cols["chair"], hours),
+        "attendee_hours": sum_by(cols["att_id"], att_hours),
+        "categories": categories,
+        "heatmap": heatmap,
+        "conflicts": conflicts,
+    }
+
+def rollup_session(session):
+    events = [dict(event_name_ids(e)) for e in session["events"]]
+    compute_conflicts(events)
+    compute_attendees_location_conflicts(events)
+    # Gộp theo ngày (để cắt đúng biên from/to) và theo tháng (gộp từ các ngày, dùng cho tuần nằm trọn trong khoảng)
+    by_day = {}
+    for ev in events:
+        by_day.setdefault(str(ev.get("date", "")), []).append(ev)
+    days = {day: rollup_columns(week_columns(evs)) for day, evs in by_day.items()}
+    by_month = {}
+    for day, part in days.items():
+        by_month.setdefault(day[:7], []).append(part)
+    return {"days": days, "months": {month: merge_rollups(parts) for month, parts in by_month.items()}}
+
+def merge_rollups(parts):
+    out = {"events": 0, "hours": 0.0, "room_hours": {}, "chair_hours": {}, "attendee_hours": {},
+           "categories": {}, "heatmap": [[0] * 24 for _ in range(7)],
+           "conflicts": {"time": 0, "attendees": 0, "location": 0, "any": 0}}
+    for part in parts:
+        out["events"] += part["events"]
+        out["hours"] += part["hours"]
+        for field in ("room_hours", "chair_hours", "attendee_hours", "categories"):
+            for k, v in part[field].items():
+                out[field][k] = out[field].get(k, 0) + v
+        for k, v in part["conflicts"].items():
+            out["conflicts"][k] += v
+        for d in range(7):
+            row = out["heatmap"][d]
+            for h, v in enumerate(part["heatmap"][d]):
+                row[h] += v
+    return out
+
+class AnalyticsRollups:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.weeks = {}  # session_id -> (week_start, {"days": {ngày: rollup}, "months": {tháng: rollup}})
+        self.signatures = {}
+        self.epoch = None  # gộp alias -> ID người/phòng đổi -> tính lại toàn bộ
+        self.built = False
+        self.data_key = None
+
+    def sync(self, data):
+        with self.lock:
+            name_registry.ensure_loaded()
+            if self.epoch != name_registry.epoch:
+                self.weeks, self.signatures = {}, {}
+                self.epoch = name_registry.epoch
+            seen = set()
+            for s in data["sessions"]:
+                seen.add(s["id"])
+                signature = (s.get("version", 0), session_event_count(s))
+                if self.signatures.get(s["id"]) != signature:
+                    self.weeks[s["id"]] = (s["week_start"], rollup_session(s))
+                    self.signatures[s["id"]] = signature
+            for sid in [sid for sid in self.weeks if sid not in seen]:
+                del self.weeks[sid]
+                self.signatures.pop(sid, None)
+            self.built = True
+        return self
+
+    def report(self, date_from, date_to, group="week"):
+        # Chỉ tính sự kiện có ngày trong [date_from, date_to]: tuần nằm trọn trong khoảng dùng rollup tháng,
+        # tuần ở biên dùng rollup từng ngày
+        lo, hi = date_from.isoformat(), date_to.isoformat()
+        periods = {}
+        with self.lock:
+            for sid, (week_start, parts) in self.weeks.items():
+                week_end = (dt.date.fromisoformat(week_start) + dt.timedelta(days=6)).isoformat()
+                if week_end < lo or week_start > hi:
+                    continue
+                if lo <= week_start and week_end <= hi:
+                    items = parts["months"].items()
+                else:
+                    items = ((day, part) for day, part in parts["days"].items() if lo <= day <= hi)
+                for day, part in items:
+                    if not part["events"]:
+                        continue
+                    key = sid if group == "week" else day[:7] if group == "month" else day[:4]
+                    periods.setdefault(key, []).append(part)
+        return {key: merge_rollups(parts) for key, parts in sorted(periods.items())}
+
+analytics_rollups = LocalProxy(lambda: current_tenant().analytics_rollups)
+
+@on_commit
+def refresh_analytics_rollups(data):
+    resync_after_commit(current_tenant().analytics_rollups, data)
+
+def named_hours(by_id, top=ANALYTICS_TOP):
+    rows = sorted(by_id.items(), key=lambda kv: (-kv[1], kv[0]))[:top]
+    return [{"id": k, "name": name_registry.name(k), "hours": round(v, 2)} for k, v in rows]
+
+def analytics_report(date_from, date_to, group):
+    started = time.perf_counter()
+    per_period = synced_index(current_tenant().analytics_rollups).report(date_from, date_to, group)
+    totals = merge_rollups(per_period.values())
+    periods = [{
+        "period": key,
+        "events": r["events"],
+        "hours": round(r["hours"], 2),
+        "conflicts": r["conflicts"],
+        "conflict_rate": round(r["conflicts"]["any"] / r["events"], 3) if r["events"] else 0.0,
+        "categories": r["categories"],
+    } for key, r in per_period.items()]
+    return {
+        "from": date_from.isoformat(),
+        "to": date_to.isoformat(),
+        "group": group,
+        "periods": periods,
+        "totals": {
+            "events": totals["events"],
+            "hours": round(totals["hours"], 2),
+            "conflicts": totals["conflicts"],
+            "conflict_rate": round(totals["conflicts"]["any"] / totals["events"], 3) if totals["events"] else 0.0,
+            "categories": dict(sorted(totals["categories"].items(), key=lambda kv: -kv[1])),
+            "rooms": named_hours(totals["room_hours"]),
+            "chairs": named_hours(totals["chair_hours"]),
+            "attendees": named_hours(totals["attendee_hours"]),
+            "heatmap": totals["heatmap"],
+        },
+        "vectorized": np is not None,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+def parse_analytics_args(args):
+    today = dt.date.today()
+    date_from = dt.date.fromisoformat(args["from"]) if args.get("from") else today.replace(month=1, day=1)
+    date_to = dt.date.fromisoformat(args["to"]) if args.get("to") else today.replace(month=12, day=31)
+    if date_to < date_from:
+        raise ValueError("Ngày kết thúc phải sau ngày bắt đầu.")
+    group = args.get("group") or "week"
+    if group not in ("week", "month", "year"):
+        raise ValueError("group phải là week, month hoặc year.")
+    return date_from, date_to, group
+
+# ========== LỊCH CÁ NHÂN (/me/<tên>) ==========
+# Đọc từ chỉ mục người -> sự kiện (chủ trì hoặc tham dự); phân trang bằng cursor tiến/lùi theo thời gian.
+def personal_conflicts(events):
+    # Mọi cặp chồng giờ trong cùng ngày (không chỉ 2 cuộc liền kề): id -> [id các cuộc bị trùng]
+    clashes = {}
+    by_date = {}
+    for ev in events:
+        by_date.setdefault(ev["date"], []).append(ev)
+    for arr in by_date.values():
+        arr.sort(key=lambda e: hhmm_to_minutes(e["start_time"]))
+        for i, ev in enumerate(arr):
+            end = hhmm_to_minutes(ev["end_time"])
+            for other in arr[i + 1:]:
+                if hhmm_to_minutes(other["start_time"]) >= end:
+                    break
+                clashes.setdefault(ev["id"], []).append(other["id"])
+                clashes.setdefault(other["id"], []).append(ev["id"])
+    return clashes
+
+def personal_agenda(person, args):
+    index = get_event_index()
+    limit = min(max(args.get("limit", type=int) or AGENDA_PAGE_DEFAULT, 1), EVENTS_PAGE_MAX)
+    if args.get("before"):
+        rows, more_before = index.person_page(person, decode_cursor(args["before"]), backward=True, limit=limit)
+        more_after = True
+    else:
+        if args.get("after"):
+            start = decode_cursor(args["after"])
+        else:
+            start = ((dt.date.fromisoformat(args["from"]) if args.get("from") else dt.date.today()).isoformat(),)
+        rows, more_after = index.person_page(person, start, limit=limit)
+        more_before = bool(index.person_page(person, rows[0][0] if rows else start, backward=True, limit=1)[0])
+
+    # Cờ trùng lịch tính trên toàn bộ các ngày có trong trang (kể cả cuộc họp nằm ở trang kề bên)
+    dates = sorted({key[0] for key, _ in rows})
+    same_days = [ev for key, ev in index.person_range(person, dates[0], dates[-1])] if dates else []
+    clashes = personal_conflicts([dict(ev) for ev in same_days])
+    titles = {ev["id"]: f"{ev['start_time']}–{ev['end_time']} {ev['title']}" for ev in same_days}
+    events = []
+    for key, ev in rows:
+        events.append({**ev, "session_id": key[2], "role": "chair" if ev.get("chair_id") == person else "attendee",
+                       "conflicts_with": [{"id": i, "label": titles.get(i, "")} for i in clashes.get(ev["id"], [])]})
+    return {
+        "person": {"id": person, "name": name_registry.name(person)},
+        "events": events,
+        "count": len(events),
+        "conflicts": sum(1 for ev in events if ev["conflicts_with"]),
+        "prev_cursor": encode_cursor(rows[0][0]) if rows and more_before else None,
+        "next_cursor": encode_cursor(rows[-1][0]) if rows and more_after else None,
+    }
+
+# ========== KIỂM TRA TRÙNG LỊCH TOÀN BỘ LỊCH SỬ ==========
+# Quét ngay trong process hiện tại (đo trên 300 tuần: quét ~0.2s, process pool "spawn" chỉ thêm chi phí khởi động).
+# Kết quả được lưu theo (version, số sự kiện) của tuần vào file cache của chi nhánh: lần chạy sau chỉ quét lại
+# các tuần đã đổi.
+# Khác với cảnh báo trên lịch (theo ô ngày/buổi), ở đây mọi cặp chồng giờ trong cùng ngày đều được tính.
+def audit_rows(session):
+    rows = []
+    for ev in session["events"]:
+        try:
+            start, end = hhmm_to_minutes(ev["start_time"]), hhmm_to_minutes(ev["end_time"])
+        except (KeyError, ValueError):
+            continue
+        event_name_ids(ev)
+        rows.append((ev["id"], ev["date"], start, end, ev.get("room_id"), sorted(event_people_ids(ev))))
+    return rows
+
+def audit_week(job):
+    # Quét 1 tuần từ các dòng audit_rows đã chuẩn hoá (chạy trong tiến trình, dưới heavy_route)
+    session_id, rows = job
+    found = {"time": [], "room": [], "attendee": []}
+    by_date = {}
+    for row in rows:
+        by_date.setdefault(row[1], []).append(row)
+    for date, arr in sorted(by_date.items()):
+        arr.sort(key=lambda r: r[2])
+        for i, a in enumerate(arr):
+            for b in arr[i + 1:]:
+                if b[2] >= a[3]:
+                    break
+                if b[2] >= b[3]:
+                    continue
+                pair = {"date": date, "events": [a[0], b[0]]}
+                found["time"].append(pair)
+                if a[4] is not None and a[4] == b[4]:
+                    found["room"].append({**pair, "room_id": a[4]})
+                shared = sorted(set(a[5]) & set(b[5]))
+                if shared:
+                    found["attendee"].append({**pair, "people_ids": shared})
+    return session_id, found
+
+def load_audit_cache():
+    try:
+        with open(current_tenant().audit_cache_path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    if cache.get("epoch") != name_registry.epoch:
+        cache = {"epoch": name_registry.epoch, "weeks": {}}  # ID người/phòng đã đổi -> quét lại hết
+    return cache
+
+def save_audit_cache(cache):
+    audit_cache_path = current_tenant().audit_cache_path
+    os.makedirs(os.path.dirname(audit_cache_path), exist_ok=True)
+    tmp = f"{audit_cache_path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, separators=(",", ":"), check_circular=False)
+    os.replace(tmp, audit_cache_path)
+
+def run_conflict_audit(data, date_from=None, date_to=None):
+    started = time.perf_counter()
+    name_registry.ensure_loaded()
+    cache = load_audit_cache()
+    signatures = {s["id"]: [s.get("version", 0), session_event_count(s)] for s in data["sessions"]}
+    jobs = [(s["id"], audit_rows(s)) for s in data["sessions"]
+            if cache["weeks"].get(s["id"], {}).get("signature") != signatures[s["id"]]]
+
+    results = [audit_week(job) for job in jobs]
+
+    for sid, found in results:
+        cache["weeks"][sid] = {"signature": signatures[sid], "found": found}
+    stale = [sid for sid in cache["weeks"] if sid not in signatures]
+    for sid in stale:
+        del cache["weeks"][sid]
+    if results or stale:
+        try:
+            save_audit_cache(cache)
+        except OSError as e:
+            print(f"Lỗi khi ghi cache kiểm tra trùng lịch: {e}")
+
+    weeks = []
+    totals = {"time": 0, "room": 0, "attendee": 0}
+    for s in sorted(data["sessions"], key=lambda s: s["week_start"]):
+        if (date_from and s["week_start"] < (date_from - dt.timedelta(days=6)).isoformat()) or \
+                (date_to and s["week_start"] > date_to.isoformat()):
+            continue
+        found = cache["weeks"][s["id"]]["found"]
+        counts = {kind: len(items) for kind, items in found.items()}
+        for kind, n in counts.items():
+            totals[kind] += n
+        if not any(counts.values()):
+            continue
+        weeks.append({
+            "session_id": s["id"],
+            "week_start": s["week_start"],
+            "events": len(s["events"]),
+            "counts": counts,
+            "time": found["time"],
+            "room": [{**c, "room": name_registry.name(c["room_id"])} for c in found["room"]],
+            "attendee": [{**c, "people": [name_registry.name(i) for i in c["people_ids"]]} for c in found["attendee"]],
+        })
+    return {
+        "weeks": weeks,
+        "totals": totals,
+        "scanned": len(signatures),
+        "recomputed": len(jobs),
+        "cached": len(signatures) - len(jobs),
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+    }
+
+@app.cli.command("audit-conflicts")
+@click.option("--from", "date_from", default=None, help="Từ ngày (YYYY-MM-DD)")
+@click.option("--to", "date_to", default=None, help="Đến ngày (YYYY-MM-DD)")
+@click.option("--output", type=click.Path(dir_okay=False), default=None, help="Ghi báo cáo JSON ra file")
+def audit_conflicts_command(date_from, date_to, output):
+    """Quét trùng giờ / phòng / người tham dự trên toàn bộ các tuần."""
+    report = run_conflict_audit(
+        load_data_readonly(),
+        dt.date.fromisoformat(date_from) if date_from else None,
+        dt.date.fromisoformat(date_to) if date_to else None)
+    for w in report["weeks"]:
+        c = w["counts"]
+        print(f"{w['session_id']} ({w['week_start']}): {c['time']} trùng giờ, {c['room']} trùng phòng, {c['attendee']} trùng người")
+    t = report["totals"]
+    print(f"Tổng: {t['time']} trùng giờ, {t['room']} trùng phòng, {t['attendee']} trùng người — "
+          f"{report['scanned']} tuần, quét lại {report['recomputed']}, {report['elapsed_seconds']}s")
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+# ========== NHẮC LỊCH HỌP ==========
+# Heap (giờ nhắc, khoá) các cuộc họp sắp tới; khoá = id@ngàyTgiờ nên đổi giờ họp sẽ tạo lời nhắc mới.
+# Chỉ 1 tiến trình (giữ khoá file) gửi nhắc. Khoá đã gửi được ghi ra file TRƯỚC khi gửi
+# -> khởi động lại không gửi trùng (lỗi giữa chừng thì bỏ lỡ, không gửi 2 lần).
+def reminder_recipients(ev):
+    people, seen = [], set()
+    for name in [ev.get("chair")] + split_people(ev.get("attendees")):
+        if name and fold_name(name) not in seen:
+            seen.add(fold_name(name))
+            people.append(name.strip())
+    return people
+
+def reminder_text(events):
+    lines = [f"- {ev['date']} {ev['start_time']}–{ev['end_time']}: {ev['title']}"
+             + (f" ({ev['location']})" if ev.get("location") else "") for ev in events]
+    return "Nhắc lịch họp sắp diễn ra:\n" + "\n".join(lines)
+
+class LogReminderSink:
+    def send(self, batches):
+        log_path = current_tenant().reminder_log_path
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        with open(log_path, "a", encoding="utf-8") as f:
+            for b in batches:
+                f.write(json.dumps({"at": dt.datetime.now().isoformat(timespec="seconds"), **b}, ensure_ascii=False) + "\n")
+
+class SmtpReminderSink:
+    def __init__(self):
+        self.book = {}
+        if REMINDER_ADDRESS_BOOK:
+            with open(REMINDER_ADDRESS_BOOK, "r", encoding="utf-8") as f:
+                self.book = {fold_name(k): v for k, v in json.load(f).items()}
+
+    def address(self, name):
+        return self.book.get(fold_name(name)) or f"{fold_name(name)}@{REMINDER_MAIL_DOMAIN}"
+
+    def send(self, batches):
+        import smtplib
+        from email.message import EmailMessage
+        with smtplib.SMTP(REMINDER_SMTP_HOST, REMINDER_SMTP_PORT, timeout=10) as smtp:
+            for b in batches:
+                msg = EmailMessage()
+                msg["From"] = REMINDER_MAIL_FROM
+                msg["To"] = self.address(b["recipient"])
+                first = b["events"][0]
+                msg["Subject"] = f"[{current_tenant().company}] Nhắc họp {first['start_time']} {first['title']}" + (
+                    f" (+{len(b['events']) - 1} cuộc họp khác)" if len(b["events"]) > 1 else "")
+                msg.set_content(f"Chào {b['recipient']},\n\n{b['text']}\n")
+                smtp.send_message(msg)
+
+class WebhookReminderSink:
+    def send(self, batches):
+        import urllib.request
+        for b in batches:
+            payload = {"tenant": current_tenant().slug, **b}
+            req = urllib.request.Request(REMINDER_WEBHOOK_URL, data=json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"}, method="POST")
+            with urllib.request.urlopen(req, timeout=10) as resp:
+                resp.read()
+
+# Thêm kênh gửi mới: đăng ký lớp có hàm send(batches) vào đây rồi đặt REMINDER_SINK=<tên>
+REMINDER_SINKS = {"log": LogReminderSink, "smtp": SmtpReminderSink, "webhook": WebhookReminderSink}
+
+def schedule_now() -> dt.datetime:
+    # Giờ hiện tại theo múi giờ lịch (naive, so sánh được với ngày/giờ lưu trong sự kiện)
+    return dt.datetime.now(SCHEDULE_TZ).replace(tzinfo=None)
+
+def event_start_timestamp(ev) -> float:
+    start = dt.datetime.combine(dt.date.fromisoformat(ev["date"]), dt.time.fromisoformat(ev["start_time"]))
+    return start.replace(tzinfo=SCHEDULE_TZ).timestamp()
+
+class ReminderScheduler:
+    def __init__(self, slug, state_path, data_path):
+        self.slug = slug
+        self.state_path = state_path
+        self.data_path = data_path
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.heap = []
+        self.pending = {}
+        self.session_keys = {}
+        self.session_versions = {}
+        self.sent = {}
+        self.sink = None
+        self.pid = None
+        self.leader = False
+        self.lock_file = None
+        self.data_key = None
+        self.delivered = 0
+
+    @staticmethod
+    def key_of(ev):
+        return f"{ev['id']}@{ev['date']}T{ev['start_time']}"
+
+    def load_state(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                self.sent = json.load(f).get("sent", {})
+        except FileNotFoundError:
+            self.sent = {}
+
+    def save_state(self):
+        # Bỏ các khoá của cuộc họp đã qua hơn 1 ngày để file không lớn dần
+        horizon = (schedule_now() - dt.timedelta(days=1)).isoformat(timespec="minutes")
+        self.sent = {k: start for k, start in self.sent.items() if start >= horizon}
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"sent": self.sent}, f, ensure_ascii=False)
+        os.replace(tmp, self.state_path)
+
+    def sync(self, data):
+        # Chỉ đánh lại các tuần đã đổi version; tuần đã qua bỏ qua luôn (không đọc sự kiện)
+        now = time.time()
+        today = schedule_now().date().isoformat()
+        with self.lock:
+            seen = set()
+            for s in data["sessions"]:
+                if s.get("week_end", today) < today:
+                    continue
+                seen.add(s["id"])
+                version = s.get("version", 0)
+                if self.session_versions.get(s["id"]) == version:
+                    continue
+                self._drop_session(s["id"])
+                for ev in s["events"]:
+                    self._add(s["id"], ev, now)
+                self.session_versions[s["id"]] = version
+            for sid in [sid for sid in self.session_versions if sid not in seen]:
+                self._drop_session(sid)
+            if len(self.heap) > 2 * len(self.pending) + 64:
+                self.heap = [(fire, key) for fire, key in self.heap if key in self.pending]
+                heapq.heapify(self.heap)
+        return self
+
+    def _add(self, session_id, ev, now):
+        try:
+            start = event_start_timestamp(ev)
+        except (KeyError, TypeError, ValueError):
+            return
+        key = self.key_of(ev)
+        if start <= now or key in self.sent:
+            return
+        fire = start - REMINDER_LEAD_MINUTES * 60
+        self.pending[key] = (fire, session_id, {f: ev.get(f, "") for f in EXPORT_FIELDS if f != "session_id"})
+        self.session_keys.setdefault(session_id, set()).add(key)
+        heapq.heappush(self.heap, (fire, key))
+
+    def _drop_session(self, session_id):
+        # Phần tử trong heap được bỏ lười: khi lấy ra mà không còn trong pending thì bỏ qua
+        for key in self.session_keys.pop(session_id, ()):
+            self.pending.pop(key, None)
+        self.session_versions.pop(session_id, None)
+
+    def next_fire(self):
+        with self.lock:
+            while self.heap and self.heap[0][1] not in self.pending:
+                heapq.heappop(self.heap)
+            return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now):
+        due = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now + REMINDER_BATCH_SECONDS:
+                fire, key = heapq.heappop(self.heap)
+                entry = self.pending.pop(key, None)
+                if entry is None or entry[0] != fire:
+                    continue
+                self.session_keys.get(entry[1], set()).discard(key)
+                due.append((key, entry[1], entry[2]))
+        return due
+
+    def deliver(self, due):
+        now = schedule_now()
+        by_person = {}
+        for key, session_id, ev in due:
+            if ev["date"] + "T" + ev["start_time"] < now.isoformat(timespec="minutes"):
+                continue  # Cuộc họp đã bắt đầu (VD: server tắt quá lâu) -> không nhắc nữa
+            self.sent[key] = ev["date"] + "T" + ev["start_time"]
+            for person in reminder_recipients(ev):
+                by_person.setdefault(person, []).append(dict(ev, session_id=session_id))
+        if not by_person:
+            return 0
+        self.save_state()
+        batches = []
+        for person, events in by_person.items():
+            events.sort(key=lambda e: (e["date"], e["start_time"]))
+            batches.append({"recipient": person, "events": events, "text": reminder_text(events)})
+        try:
+            self.sink.send(batches)
+            self.delivered += len(batches)
+            print(f"Đã gửi {len(batches)} thông báo nhắc lịch ({len(due)} cuộc họp) qua {REMINDER_SINK}")
+        except Exception as e:
+            print(f"Lỗi khi gửi nhắc lịch qua {REMINDER_SINK}: {e}")
+        return len(batches)
+
+    def try_lead(self):
+        if self.leader:
+            return True
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        self.lock_file = self.lock_file or open(self.state_path + ".lock", "a")
+        if fcntl:
+            try:
+                fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return False
+        # Vừa nhận vai gửi nhắc: đọc lại khoá đã gửi (có thể do tiến trình trước ghi) rồi dựng heap
+        self.leader = True
+        self.load_state()
+        with self.lock:
+            self.heap, self.pending, self.session_keys, self.session_versions = [], {}, {}, {}
+        return True
+
+    def run_once(self):
+        # Chỉ nạp chi nhánh khi dữ liệu đổi hoặc có lời nhắc đến hạn (không giữ chi nhánh khỏi bị giải phóng)
+        try:
+            st = os.stat(self.data_path)
+            data_key = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            data_key = None
+        if data_key != self.data_key:
+            self.data_key = data_key
+            with use_tenant(self.slug):
+                self.sync(load_data_readonly())
+        due = self.pop_due(time.time())
+        if not due:
+            return 0
+        with use_tenant(self.slug):
+            return self.deliver(due)
+
+    def ensure_started(self):
+        if REMINDER_SINK == "off":
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.leader, self.lock_file, self.data_key = False, None, None
+            self.sink = REMINDER_SINKS[REMINDER_SINK]()
+            threading.Thread(target=self._run, name="reminders", daemon=True).start()
+
+    def _run(self):
+        while True:
+            if not self.try_lead():
+                time.sleep(REMINDER_POLL_SECONDS)
+                continue
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Lỗi bộ nhắc lịch: {e}")
+            fire = self.next_fire()
+            wait = REMINDER_POLL_SECONDS if fire is None else min(REMINDER_POLL_SECONDS, fire - time.time())
+            self.wake.wait(max(wait, 0.05))
+            self.wake.clear()
+
+    def status(self):
+        fire = self.next_fire()
+        return {"tenant": self.slug, "sink": REMINDER_SINK, "lead_minutes": REMINDER_LEAD_MINUTES, "running": self.pid == os.getpid(),
+                "leader": self.leader, "pending": len(self.pending), "sent_keys": len(self.sent),
+                "delivered": self.delivered,
+                "next_fire": dt.datetime.fromtimestamp(fire).isoformat(timespec="seconds") if fire else None}
+
+# Bộ nhắc của mỗi chi nhánh không bị giải phóng cùng cache chi nhánh (heap chỉ chứa cuộc họp sắp tới)
+reminder_schedulers = {}
+_reminders_started_pid = None
+
+def reminders_for(slug):
+    scheduler = reminder_schedulers.get(slug)
+    if scheduler is None:
+        paths = tenant_paths(slug)
+        scheduler = reminder_schedulers.setdefault(
+            slug, ReminderScheduler(slug, paths["reminder_state"], paths["data"]))
+    return scheduler
+
+reminder_scheduler = LocalProxy(lambda: reminders_for(current_tenant().slug))
+
+@on_commit
+def refresh_reminders(data):
+    # Tiến trình đang gửi nhắc thấy thay đổi ngay; tiến trình khác thấy qua file dữ liệu sau ≤ REMINDER_POLL_SECONDS
+    if reminder_scheduler.leader and reminder_scheduler.pid == os.getpid():
+        reminder_scheduler.sync(data)
+        reminder_scheduler.wake.set()
+
+@app.before_request
+def start_reminders():
+    # Lần đầu trong mỗi tiến trình: bật bộ nhắc cho mọi chi nhánh (kể cả chi nhánh chưa có request nào)
+    global _reminders_started_pid
+    if _reminders_started_pid != os.getpid():
+        _reminders_started_pid = os.getpid()
+        for slug in tenant_slugs():
+            reminders_for(slug).ensure_started()
+    reminder_scheduler.ensure_started()
+
+@app.cli.command("reminders")
+@click.option("--once", is_flag=True, help="Gửi các lời nhắc đã đến hạn rồi thoát")
+def reminders_command(once):
+    """Chạy bộ nhắc lịch họp ở tiền cảnh (thay cho luồng nền trong web worker)."""
+    if REMINDER_SINK == "off":
+        raise click.ClickException("REMINDER_SINK=off")
+    reminder_scheduler.sink = REMINDER_SINKS[REMINDER_SINK]()
+    reminder_scheduler.pid = os.getpid()
+    while not reminder_scheduler.try_lead():
+        if once:
+            raise click.ClickException("Tiến trình khác đang gửi nhắc lịch")
+        time.sleep(REMINDER_POLL_SECONDS)
+    sent = reminder_scheduler.run_once()
+    status = reminder_scheduler.status()
+    print(f"{status['pending']} lời nhắc đang chờ, lần kế tiếp: {status['next_fire'] or '-'}")
+    if once:
+        print(f"Đã gửi {sent} thông báo")
+        return
+    reminder_scheduler._run()
+
+# ========== DÒNG LỆNH (flask --app app <lệnh>) ==========
+# Thao tác hàng loạt không qua HTTP. Việc theo từng file (đọc/ghi Excel, ICS) chạy trong process pool;
+# ghi vào data theo lô CLI_BATCH_SIZE sự kiện.
+def run_file_jobs(fn, jobs, workers):
+    # Trả kết quả theo đúng thứ tự jobs
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            yield from pool.map(fn, jobs)
+    else:
+        for job in jobs:
+            yield fn(job)
+
+def week_date_from_filename(path):
+    name = os.path.basename(path)
+    m = re.search(r"(\d{4})-W(\d{2})", name)
+    if m:
+        return week_start_from_session_id(m.group(0))
+    m = re.search(r"(\d{4})-(\d{2})-(\d{2})", name)
+    if m:
+        return dt.date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+    m = re.search(r"(\d{2})[.-](\d{2})[.-](\d{4})", name)
+    if m:
+        return dt.date(int(m.group(3)), int(m.group(2)), int(m.group(1)))
+    return None
+
+def cli_parse_excel(job):
+    # Chạy trong process con: chỉ đọc file, trả về thao tác để process chính ghi theo lô
+    from openpyxl import load_workbook
+    path, forced_date = job
+    started = time.perf_counter()
+    try:
+        ws = load_workbook(path, read_only=False).active
+        target = forced_date or excel_week_date(ws) or week_date_from_filename(path)
+        if target is None:
+            raise ValueError("Không xác định được tuần (dùng --date hoặc đặt tên file theo YYYY-MM-DD / YYYY-Www)")
+        operations = excel_import_operations(ws, target)
+        error = None
+    except Exception as e:
+        target, operations, error = None, [], str(e)
+    return {"file": path, "week": session_id_from_date(target) if target else None,
+            "operations": operations, "error": error, "seconds": time.perf_counter() - started}
+
+def cli_export_session(job):
+    kind, session, out_dir = job
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # export_session_to_excel in log chi tiết
+        output, fname = export_session_to_excel(session) if kind == "excel" else export_session_to_ics(session)
+    path = os.path.join(out_dir, fname)
+    with open(path, "wb") as f:
+        f.write(output.getvalue())
+    return {"file": path, "events": len(session["events"]), "seconds": time.perf_counter() - started}
+
+def sessions_in_range(data, date_from, date_to):
+    out = []
+    for s in sorted(data["sessions"], key=lambda s: s["week_start"]):
+        if date_from and s["week_end"] < date_from.isoformat():
+            continue
+        if date_to and s["week_start"] > date_to.isoformat():
+            continue
+        out.append(s)
+    return out
+
+def commit_cli_batch(data, operations):
+    started = time.perf_counter()
+    results, _ = apply_batch(data, operations, skip_invalid=True)
     save_data(data)
-    return target_session["id"]
+    ok = sum(1 for r in results if r["ok"])
+    for op, r in zip(operations, results):
+        if not r["ok"]:
+            print(f"  Bỏ qua: {r['error']} - {op['event'].get('title')} {op['event'].get('date')}")
+    print(f"Ghi lô {ok}/{len(operations)} sự kiện ({time.perf_counter() - started:.2f}s)")
+    return ok
+
+def cli_date(value):
+    return dt.date.fromisoformat(value) if value else None
+
+@app.cli.command("import-excel")
+@click.argument("directory", type=click.Path(exists=True, file_okay=False))
+@click.option("--date", "week_date", default=None, help="Ngày thuộc tuần cần import (mặc định: đọc từ file)")
+@click.option("--workers", type=int, default=None, help="Số process (mặc định = số lõi CPU)")
+@click.option("--batch-size", type=int, default=CLI_BATCH_SIZE, show_default=True)
+@writes_data
+def import_excel_command(directory, week_date, workers, batch_size):
+    """Import mọi file .xlsx trong thư mục (mỗi file là 1 tuần)."""
+    files = sorted(os.path.join(directory, f) for f in os.listdir(directory)
+                   if f.lower().endswith(".xlsx") and not f.startswith("~$"))
+    started = time.perf_counter()
+    data = load_data()
+    pending, imported, failed = [], 0, 0
+    for r in run_file_jobs(cli_parse_excel, [(f, cli_date(week_date)) for f in files], workers or os.cpu_count() or 1):
+        if r["error"]:
+            failed += 1
+            print(f"{os.path.basename(r['file'])}: LỖI {r['error']} ({r['seconds']:.2f}s)")
+            continue
+        print(f"{os.path.basename(r['file'])}: {r['week']}, {len(r['operations'])} sự kiện ({r['seconds']:.2f}s)")
+        pending.extend(r["operations"])
+        if len(pending) >= batch_size:
+            imported += commit_cli_batch(data, pending)
+            pending = []
+    if pending:
+        imported += commit_cli_batch(data, pending)
+    print(f"Xong: {len(files)} file ({failed} lỗi), {imported} sự kiện, {time.perf_counter() - started:.2f}s")
+
+def export_command(kind, date_from, date_to, out_dir, workers):
+    os.makedirs(out_dir, exist_ok=True)
+    sessions = [s for s in sessions_in_range(load_data(), cli_date(date_from), cli_date(date_to)) if s["events"]]
+    started = time.perf_counter()
+    jobs = [(kind, s, out_dir) for s in sessions]
+    for r in run_file_jobs(cli_export_session, jobs, workers or os.cpu_count() or 1):
+        print(f"{r['file']}: {r['events']} sự kiện ({r['seconds']:.2f}s)")
+    print(f"Xong: {len(sessions)} tuần, {time.perf_counter() - started:.2f}s")
+
+@app.cli.command("export-excel")
+@click.option("--from", "date_from", default=None, help="Từ ngày (YYYY-MM-DD)")
+@click.option("--to", "date_to", default=None, help="Đến ngày (YYYY-MM-DD)")
+@click.option("--out", "out_dir", default="exports", show_default=True, type=click.Path(file_okay=False))
+@click.option("--workers", type=int, default=None)
+def export_excel_command(date_from, date_to, out_dir, workers):
+    """Xuất mỗi tuần trong khoảng ra 1 file .xlsx."""
+    export_command("excel", date_from, date_to, out_dir, workers)
+
+@app.cli.command("export-ics")
+@click.option("--from", "date_from", default=None, help="Từ ngày (YYYY-MM-DD)")
+@click.option("--to", "date_to", default=None, help="Đến ngày (YYYY-MM-DD)")
+@click.option("--out", "out_dir", default="exports", show_default=True, type=click.Path(file_okay=False))
+@click.option("--workers", type=int, default=None)
+def export_ics_command(date_from, date_to, out_dir, workers):
+    """Xuất mỗi tuần trong khoảng ra 1 file .ics."""
+    export_command("ics", date_from, date_to, out_dir, workers)
+
+@app.cli.command("compact")
+@writes_data
+def compact_command():
+    """Sắp xếp tuần/sự kiện, bỏ tuần trống và sự kiện trùng id."""
+    data_path = current_tenant().data_path
+    before = os.path.getsize(data_path) if os.path.exists(data_path) else 0
+    data = load_data()
+    seen, dropped_events, dropped_weeks = set(), 0, 0
+    sessions = []
+    for s in sorted(data["sessions"], key=lambda s: s["week_start"]):
+        events = []
+        for ev in s["events"]:
+            if ev["id"] in seen:
+                dropped_events += 1
+                continue
+            seen.add(ev["id"])
+            events.append(ev)
+        if len(events) != len(s["events"]):
+            s["events"] = events
+            bump_session_version(s)
+        if not s["events"]:
+            dropped_weeks += 1
+            continue
+        s["events"].sort(key=lambda e: (e["date"], hhmm_to_minutes(e["start_time"]), e["title"]))
+        sessions.append(s)
+    data["sessions"] = sessions
+    save_data(data)
+    print(f"Bỏ {dropped_weeks} tuần trống, {dropped_events} sự kiện trùng id; "
+          f"{before} -> {os.path.getsize(data_path)} bytes")
+
+@app.cli.command("reindex")
+@writes_data
+def reindex_command():
+    """Tính lại ID người/phòng cho mọi sự kiện và xoá cache kiểm tra trùng lịch."""
+    started = time.perf_counter()
+    data = load_data()
+    changed = 0
+    for s in data["sessions"]:
+        touched = False
+        for ev in s["events"]:
+            before = (ev.get("chair_id"), ev.get("attendee_ids"), ev.get("room_id"))
+            attach_name_ids(ev)
+            if before != (ev["chair_id"], ev["attendee_ids"], ev["room_id"]):
+                changed += 1
+                touched = True
+        if touched:
+            bump_session_version(s)  # Để chỉ mục/thống kê ở các worker đang chạy đánh lại tuần này
+    save_data(data)
+    if os.path.exists(current_tenant().audit_cache_path):
+        os.remove(current_tenant().audit_cache_path)
+    print(f"Đã đánh lại {changed} sự kiện trong {len(data['sessions'])} tuần ({time.perf_counter() - started:.2f}s)")
+
+@app.cli.command("verify")
+def verify_command():
+    """Kiểm tra tính hợp lệ của dữ liệu; mã thoát 1 nếu có lỗi."""
+    data = load_data()
+    problems, seen = [], {}
+    for s in data["sessions"]:
+        try:
+            start = dt.date.fromisoformat(s["week_start"])
+            if s["id"] != session_id_from_date(start) or start != monday_of_week(start) \
+                    or s.get("week_end") != saturday_of_week(start).isoformat():
+                problems.append(f"{s['id']}: week_start/week_end không khớp mã tuần")
+        except (KeyError, ValueError) as e:
+            problems.append(f"{s.get('id')}: tuần không hợp lệ ({e})")
+        for ev in s["events"]:
+            where = f"{s.get('id')}/{ev.get('id')}"
+            if ev.get("id") in seen:
+                problems.append(f"{where}: trùng id với tuần {seen[ev['id']]}")
+            seen[ev.get("id")] = s.get("id")
+            try:
+                build_event(dict(ev))
+                if session_id_from_date(dt.date.fromisoformat(ev["date"])) != s.get("id"):
+                    problems.append(f"{where}: ngày {ev['date']} không thuộc tuần")
+            except (KeyError, ValueError) as e:
+                problems.append(f"{where}: {e}")
+                continue
+            if "attendee_ids" in ev and ev.get("chair_id") != name_registry.lookup(ev.get("chair"), "person") \
+                    and fold_name(ev.get("chair")):
+                problems.append(f"{where}: chair_id lệch danh mục (chạy reindex)")
+    for p in problems[:VERIFY_MAX_REPORT]:
+        print(p)
+    print(f"{len(data['sessions'])} tuần, {len(seen)} sự kiện, {len(problems)} lỗi")
+    if problems:
+        raise SystemExit(1)
+
+# ========== KHỞI ĐỘNG NHANH ==========
+# Template inline được biên dịch 1 lần rồi giữ lại; warm_up() nạp sẵn dữ liệu, chỉ mục, snapshot
+# và template trước khi nhận request (gunicorn preload_app: làm 1 lần ở master, các worker fork ra dùng chung).
+_template_cache = {}
+
+def compiled_template(source):
+    tpl = _template_cache.get(source)
+    if tpl is None:
+        tpl = _template_cache[source] = app.jinja_env.from_string(source)
+    return tpl
+
+def render_page(source, **context):
+    return render_template(compiled_template(source), **context)
+
+def process_started_at():
+    # Linux: tính từ /proc (độ chính xác ~10ms); nơi khác: lúc bắt đầu import module
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - (uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError, AttributeError):
+        return MODULE_IMPORT_STARTED
+
+STARTUP = {"process_started": process_started_at(), "module_import_started": MODULE_IMPORT_STARTED}
+
+def startup_report():
+    origin = STARTUP["process_started"]
+    report = {"pid": os.getpid(), "preloaded": STARTUP.get("warmed_pid") not in (None, os.getpid())}
+    for key, label in (("module_import_started", "import_start_s"), ("imported", "imported_s"),
+                       ("warmed", "warmed_s"), ("first_byte", "first_byte_s")):
+        if key in STARTUP:
+            report[label] = round(STARTUP[key] - origin, 3)
+    if "first_request" in STARTUP:
+        report["first_request"] = STARTUP["first_request"]
+    return report
+
+def warm_up():
+    started = time.time()
+    ensure_data_file()
+    name_registry.ensure_loaded()
+    data = load_data()
+    get_event_index()
+    sess = find_session_by_id(data, session_id_from_date(dt.date.today()))
+    if sess:
+        build_schedule(sess, with_conflicts=True)
+    try:
+        write_snapshot(data, os.stat(current_tenant().data_path))
+    except (OSError, ValueError) as e:
+        print(f"Lỗi khi ghi snapshot: {e}")
+    get_title_index()
+    for name, source in list(globals().items()):
+        if name.startswith("TEMPLATE_"):
+            compiled_template(source)
+    STARTUP["warmed"] = time.time()
+    STARTUP["warmed_pid"] = os.getpid()
+    print(f"Warm-up xong trong {STARTUP['warmed'] - started:.3f}s "
+          f"({sum(len(s['events']) for s in data['sessions'])} sự kiện, {len(_template_cache)} template)")
+
+def reset_locks_after_fork():
+    # Khoá có thể đang bị 1 luồng khác giữ đúng lúc fork -> tạo mới trong tiến trình con
+    global _schedule_cache_lock, _snapshot_lock, _tracemalloc_lock, _cpu_profile_lock, _data_lock
+    _schedule_cache_lock = threading.Lock()
+    _data_lock = threading.RLock()
+    _snapshot_lock = threading.Lock()
+    _tracemalloc_lock = threading.Lock()
+    _cpu_profile_lock = threading.Lock()
+    tenants.lock = threading.Lock()
+    for tenant in tenants.loaded.values():
+        for holder in (tenant.name_registry, tenant.event_index, tenant.analytics_rollups, tenant.change_broker,
+                       tenant.sync_log, tenant.title_index):
+            holder.lock = threading.Lock()
+    for scheduler in reminder_schedulers.values():
+        scheduler.lock = threading.Lock()
+    week_publisher.lock = threading.Lock()
+    fragment_cache.lock = threading.Lock()
+    admission_pools.update(build_admission_pools())
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset_locks_after_fork)
+
+@app.before_request
+def mark_first_request():
+    if "first_byte" not in STARTUP:
+        g.request_started_at = time.time()
+
+@app.after_request
+def record_first_byte(response):
+    if "first_byte" not in STARTUP and "request_started_at" in g:
+        STARTUP["first_byte"] = time.time()
+        STARTUP["first_request"] = {"path": request.path, "seconds": round(STARTUP["first_byte"] - g.request_started_at, 3)}
+        report = startup_report()
+        steps = [f"{label} {report[key]}s" for key, label in (("imported_s", "import xong"), ("warmed_s", "warm-up xong"),
+                                                              ("first_byte_s", "byte đầu tiên")) if key in report]
+        print(f"Khởi động (pid {report['pid']}, tính từ lúc tiến trình bắt đầu): " + ", ".join(steps))
+    return response
+
+@app.route("/admin/reminders")
+def admin_reminders():
+    if not is_admin_request():
+        abort(403)
+    return jsonify(reminder_scheduler.status())
+
+@app.route("/admin/tenants")
+def admin_tenants():
+    if not is_admin_request():
+        abort(403)
+    return jsonify(tenants.status())
+
+@app.route("/admin/fragments")
+def admin_fragments():
+    if not is_admin_request():
+        abort(403)
+    return jsonify(fragment_cache.status())
+
+@app.route("/admin/startup")
+def admin_startup():
+    if not is_admin_request():
+        abort(403)
+    return jsonify(startup_report())
+
+# ========== KIỂM SOÁT TẢI (XUẤT / NHẬP NẶNG) ==========
+# Xuất Excel/ICS, import, khôi phục, sao chép tuần chạy trong nhóm "heavy": tối đa HEAVY_CONCURRENCY request
+# cùng lúc, HEAVY_QUEUE request chờ; đầy thì trả 503 + Retry-After ngay. Stream SSE có nhóm "sse" riêng
+# (SSE_MAX_STREAMS, quá thì chuyển sang polling). Như vậy trong mỗi worker luôn còn ít nhất
+# INTERACTIVE_RESERVED luồng cho các trang thường (xem lịch, thêm/sửa sự kiện).
+class AdmissionPool:
+    def __init__(self, name, workers=None, queue=0, timeout=0):
+        self.name, self.workers, self.queue, self.timeout = name, workers, queue, timeout
+        self.lock = threading.Lock()
+        self.slots = threading.Semaphore(workers) if workers is not None else None  # None = không giới hạn
+        self.active = self.waiting = self.max_active = self.max_waiting = 0
+        self.admitted = self.rejected = self.timed_out = 0
+        self.waits = deque(maxlen=500)
+        self.runs = deque(maxlen=100)
+
+    def enter(self, waited=None):
+        # True nếu được chạy; waited: thời gian đã chờ trước khi tới app (từ header X-Request-Start) nếu có
+        started = time.perf_counter()
+        if self.slots is not None and not self.slots.acquire(blocking=False):
+            with self.lock:
+                if self.waiting >= self.queue:
+                    self.rejected += 1
+                    return False
+                self.waiting += 1
+                self.max_waiting = max(self.max_waiting, self.waiting)
+            ok = self.slots.acquire(timeout=self.timeout)
+            with self.lock:
+                self.waiting -= 1
+                if not ok:
+                    self.timed_out += 1
+                    return False
+        with self.lock:
+            self.active += 1
+            self.admitted += 1
+            self.max_active = max(self.max_active, self.active)
+            wait = time.perf_counter() - started
+            if waited is not None or self.slots is not None:
+                self.waits.append(wait + (waited or 0))
+        return True
+
+    def leave(self, run_seconds):
+        with self.lock:
+            self.active -= 1
+            self.runs.append(run_seconds)
+        if self.slots is not None:
+            self.slots.release()
+
+    def retry_after(self) -> int:
+        # Ước lượng: thời gian chạy trung bình x số lượt đang chờ / số slot
+        with self.lock:
+            avg = sum(self.runs) / len(self.runs) if self.runs else 5
+            return min(max(int(avg * (self.waiting + 1) / (self.workers or 1)) + 1, 1), 60)
+
+    def status(self):
+        with self.lock:
+            waits = sorted(self.waits)
+            return {
+                "workers": self.workers, "queue_limit": self.queue, "active": self.active, "waiting": self.waiting,
+                "max_active": self.max_active, "max_waiting": self.max_waiting, "admitted": self.admitted,
+                "rejected": self.rejected, "timed_out": self.timed_out,
+                "wait_ms": {"avg": round(1000 * sum(waits) / len(waits), 1) if waits else None,
+                            "p95": round(1000 * waits[int(len(waits) * 0.95)], 1) if waits else None,
+                            "max": round(1000 * waits[-1], 1) if waits else None},
+                "run_ms_avg": round(1000 * sum(self.runs) / len(self.runs), 1) if self.runs else None,
+            }
+
+def build_admission_pools():
+    # Ngân sách luồng mỗi worker: dành riêng + stream SSE + nặng đang chạy + nặng xếp hàng
+    free = WORKER_THREADS - INTERACTIVE_RESERVED - HEAVY_CONCURRENCY
+    sse_streams = min(SSE_MAX_STREAMS, max(free, 0)) if WORKER_THREADS > 1 else SSE_MAX_STREAMS
+    heavy_queue = min(HEAVY_QUEUE, max(free - sse_streams, 0))
+    if WORKER_THREADS > 1 and (heavy_queue < HEAVY_QUEUE or sse_streams < SSE_MAX_STREAMS or free < 0):
+        print(f"Cảnh báo: {WORKER_THREADS} luồng/worker không đủ cho {INTERACTIVE_RESERVED} luồng dành riêng, "
+              f"{SSE_MAX_STREAMS} stream SSE và {HEAVY_CONCURRENCY}+{HEAVY_QUEUE} luồng nặng; "
+              f"giảm còn {sse_streams} stream, hàng chờ {heavy_queue}")
+    return {"heavy": AdmissionPool("heavy", HEAVY_CONCURRENCY, heavy_queue, HEAVY_QUEUE_TIMEOUT),
+            "sse": AdmissionPool("sse", sse_streams),
+            "interactive": AdmissionPool("interactive")}
+
+admission_pools = build_admission_pools()
+
+def request_queue_seconds():
+    # Thời gian request nằm ở proxy/gunicorn trước khi tới app (header X-Request-Start: "t=<µs>" hoặc ms)
+    raw = request.headers.get("X-Request-Start", "").removeprefix("t=")
+    try:
+        value = float(raw)
+    except ValueError:
+        return None
+    started = value / 1e6 if value > 1e14 else value / 1e3 if value > 1e11 else value
+    return max(time.time() - started, 0.0)
+
+def heavy_route(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        pool = admission_pools["heavy"]
+        if not pool.enter(request_queue_seconds()):
+            retry = pool.retry_after()
+            print(f"Từ chối {request.path}: đang có {pool.active} request nặng chạy, {pool.waiting} đang chờ")
+            resp = make_response(f"Hệ thống đang bận xuất/nhập dữ liệu, vui lòng thử lại sau {retry} giây.", 503)
+            resp.headers["Retry-After"] = str(retry)
+            return resp
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            pool.leave(time.perf_counter() - started)
+    return wrapper
+
+@app.before_request
+def enter_interactive_pool():
+    # Request nặng và stream SSE đã có nhóm riêng; stream giữ luồng cả phút, không tính vào thời gian trang thường
+    if request.endpoint in HEAVY_ENDPOINTS or request.endpoint in ("static", "stream_session"):
+        return
+    admission_pools["interactive"].enter(request_queue_seconds())
+    g.interactive_started = time.perf_counter()
+
+@app.teardown_request
+def leave_interactive_pool(exc):
+    if "interactive_started" in g:
+        admission_pools["interactive"].leave(time.perf_counter() - g.pop("interactive_started"))
+
+@app.route("/admin/pools")
+def admin_pools():
+    if not is_admin_request():
+        abort(403)
+    return jsonify({"pid": os.getpid(), "threads": WORKER_THREADS, "interactive_reserved": INTERACTIVE_RESERVED,
+                    "pools": {name: pool.status() for name, pool in admission_pools.items()}})
 
 # ========== ROUTES ==========
+@app.route("/range")
+def range_view():
+    try:
+        start, end = parse_range_args(request.args)
+    except ValueError as e:
+        return str(e), 400
+    data = load_data_readonly()
+    weeks = range_weeks(data, start, end)
+    etag = make_etag("range", start, end, ",".join(f"{w['session_id']}:{w['version']}" for w in weeks))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    span = end - start
+    return with_etag(render_page(
+        TEMPLATE_RANGE,
+        company=current_tenant().company,
+        start=start,
+        end=end,
+        weeks=weeks,
+        prev_start=start - span - dt.timedelta(days=1),
+        next_start=end + dt.timedelta(days=1),
+        span_days=span.days
+    ), etag)
+
+@app.route("/range/week/<session_id>")
+def range_week(session_id):
+    try:
+        start, end = parse_range_args(request.args)
+        week_start_from_session_id(session_id)
+    except ValueError as e:
+        return str(e), 400
+    # Snapshot chỉ đọc (khớp stat file dữ liệu) + so ETag trước khi dựng lịch tuần
+    data = load_data_readonly()
+    sess = find_session_by_id(data, session_id)
+    etag = make_etag("range-week", session_id, sess.get("version", 0) if sess else 0, start, end, name_registry.epoch)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    sess, dates, schedule, visible = range_week_schedule(data, session_id, start, end)
+    weekdays = ['Thứ 2', 'Thứ 3', 'Thứ 4', 'Thứ 5', 'Thứ 6', 'Thứ 7']
+    return with_etag(render_page(
+        TEMPLATE_RANGE_WEEK,
+        chair_colors=current_tenant().chair_colors,
+        session=sess,
+        dates=dates,
+        visible=visible,
+        schedule=schedule,
+        weekdays=weekdays
+    ), etag)
+
+@app.route("/api/range")
+def api_range():
+    try:
+        start, end = parse_range_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    data = load_data_readonly()
+    weeks = range_weeks(data, start, end)
+    if request.args.get("events") == "1":
+        for w in weeks:
+            _, _, schedule, visible = range_week_schedule(data, w["session_id"], start, end)
+            w["schedule"] = {d.isoformat(): schedule[d.isoformat()] for d in visible}
+    return jsonify({"from": start.isoformat(), "to": end.isoformat(), "weeks": weeks})
+
+@app.route("/api/analytics")
+def api_analytics():
+    try:
+        date_from, date_to, group = parse_analytics_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(analytics_report(date_from, date_to, group))
+
+@app.route("/analytics")
+def analytics_view():
+    try:
+        date_from, date_to, group = parse_analytics_args(request.args)
+    except ValueError as e:
+        return str(e), 400
+    return render_page(
+        TEMPLATE_ANALYTICS,
+        company=current_tenant().company,
+        report=analytics_report(date_from, date_to, group),
+        hours=ANALYTICS_HOURS,
+        weekday_labels=WEEKDAY_LABELS
+    )
+
+@app.route("/me")
+def agenda_lookup():
+    name = (request.args.get("name") or "").strip()
+    if not name:
+        return redirect(url_for("home"))
+    return redirect(url_for("agenda_view", role=name))
+
+@app.route("/me/<role>")
+def agenda_view(role):
+    want_json = request.args.get("format") == "json" or request.accept_mimetypes.best == "application/json"
+    person = name_registry.lookup(role, "person")
+    if person is None:
+        if want_json:
+            return jsonify({"error": "Không tìm thấy người này"}), 404
+        return "Không tìm thấy người này", 404
+    try:
+        agenda = personal_agenda(person, request.args)
+    except ValueError as e:
+        if want_json:
+            return jsonify({"error": str(e)}), 400
+        return str(e), 400
+    if want_json:
+        return jsonify(agenda)
+    return render_page(
+        TEMPLATE_AGENDA,
+        company=current_tenant().company,
+        role=role,
+        agenda=agenda,
+        chair_colors=current_tenant().chair_colors,
+        weekday_labels=WEEKDAY_LABELS,
+        parse_date=dt.date.fromisoformat
+    )
+
+@app.route("/api/audit/conflicts")
+@heavy_route
+def api_audit_conflicts():
+    if not is_admin_request():
+        abort(403)
+    try:
+        date_from = dt.date.fromisoformat(request.args["from"]) if request.args.get("from") else None
+        date_to = dt.date.fromisoformat(request.args["to"]) if request.args.get("to") else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(run_conflict_audit(load_data_readonly(), date_from, date_to))
+
+@app.route("/api/events")
+def api_events():
+    args = request.args
+    try:
+        date_from = dt.date.fromisoformat(args.get("from") or "0001-01-01").isoformat()
+        date_to = dt.date.fromisoformat(args.get("to") or "9999-12-31").isoformat()
+        after = decode_cursor(args["cursor"]) if args.get("cursor") else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    limit = min(max(args.get("limit", type=int) or EVENTS_PAGE_DEFAULT, 1), EVENTS_PAGE_MAX)
+
+    filters = event_filters_from_args(args)
+    if filters is None:
+        return jsonify({"events": [], "count": 0, "next_cursor": None})  # Tên chưa từng xuất hiện
+
+    rows = get_event_index().query(date_from, date_to, after=after, limit=limit, **filters)
+    next_cursor = encode_cursor(rows[limit - 1][0]) if len(rows) > limit else None
+    events = [{**ev, "session_id": key[2]} for key, ev in rows[:limit]]
+    return jsonify({"events": events, "count": len(events), "next_cursor": next_cursor})
+
+@app.route("/api/sync")
+def api_sync():
+    # Không có since: trả về phiên bản hiện tại (client gọi trước khi tải toàn bộ lần đầu)
+    since = request.args.get("since", type=int)
+    if since is None:
+        return jsonify({"version": sync_log.latest()})
+    limit = min(max(request.args.get("limit", type=int) or SYNC_PAGE_MAX, 1), SYNC_PAGE_MAX)
+    latest, entries, reset = sync_log.read(since, limit)
+    if reset:
+        return jsonify({"since": since, "version": latest, "reset": True, "more": False, "changes": []})
+    version = entries[-1]["seq"] if entries else since
+    return jsonify({"since": since, "version": version, "reset": False, "more": version < latest,
+                    "changes": coalesce_sync_entries(entries)})
+
+@app.route("/offline")
+def offline_view():
+    return render_page(TEMPLATE_OFFLINE, company=current_tenant().company, chair_colors=current_tenant().chair_colors)
+
+@app.route("/offline.js")
+def offline_js():
+    etag = make_etag("offline-js", OFFLINE_WEEKS_BACK, OFFLINE_WEEKS_AHEAD)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    js = compiled_template(OFFLINE_JS).render(weeks_back=OFFLINE_WEEKS_BACK, weeks_ahead=OFFLINE_WEEKS_AHEAD)
+    return with_etag(Response(js, mimetype="application/javascript"), etag)
+
+@app.route("/sw.js")
+def service_worker():
+    # Phục vụ từ gốc (không phải /static) để service worker quản lý được toàn bộ trang của chi nhánh
+    resp = Response(compiled_template(SERVICE_WORKER_JS).render(root=request.script_root, build=APP_BUILD),
+                    mimetype="application/javascript")
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+@app.route("/api/events:batch", methods=["POST"])
+@writes_data
+def batch_events():
+    body = request.get_json(silent=True)
+    operations = body.get("operations") if isinstance(body, dict) else body
+    if not isinstance(operations, list) or not operations:
+        return jsonify({"error": "Cần danh sách operations"}), 400
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        return jsonify({"error": f"Tối đa {BATCH_MAX_OPERATIONS} thao tác mỗi lần"}), 413
+
+    data = load_data()
+    results, versions = apply_batch(data, operations)
+    if versions is None:
+        return jsonify({"committed": False, "results": results}), 422
+    save_data(data)
+    return jsonify({"committed": True, "results": results, "versions": versions})
+
+@app.route("/api/registry")
+def registry_list():
+    kind = request.args.get("kind")
+    entries = [e for e in name_registry.entries() if not kind or e["kind"] == kind]
+    return jsonify(entries)
+
+@app.route("/api/titles")
+def title_suggestions():
+    started = time.perf_counter()
+    limit = min(max(request.args.get("limit", type=int) or TITLE_SUGGEST_LIMIT, 1), TITLE_SUGGEST_MAX)
+    suggestions = get_title_index().suggest(request.args.get("q", ""), limit)
+    return jsonify({"query": request.args.get("q", ""), "suggestions": suggestions,
+                    "took_ms": round((time.perf_counter() - started) * 1000, 2)})
+
+@app.route("/api/registry/alias", methods=["POST"])
+def registry_add_alias():
+    if not is_admin_request():
+        abort(403)
+    body = request.get_json(silent=True) or request.form
+    alias, name, kind = body.get("alias"), body.get("name"), body.get("kind") or "person"
+    if not alias or not name or kind not in ("person", "room"):
+        return jsonify({"error": "Cần alias, name và kind (person/room)"}), 400
+    name_id = name_registry.add_alias(alias, name, kind)
+    return jsonify({"id": name_id, "name": name_registry.name(name_id), "kind": kind, "alias": alias})
+
+@app.route("/api/solver/week", methods=["POST"])
+@writes_data
+def solver_week():
+    body = request.get_json(silent=True) or {}
+    raw_requests = body.get("requests")
+    if not isinstance(raw_requests, list) or not raw_requests:
+        return jsonify({"error": "Cần danh sách requests"}), 400
+    if len(raw_requests) > SOLVER_MAX_REQUESTS:
+        return jsonify({"error": f"Tối đa {SOLVER_MAX_REQUESTS} yêu cầu mỗi lần"}), 413
+    try:
+        week_date = dt.date.fromisoformat(body.get("week") or dt.date.today().isoformat())
+    except ValueError:
+        return jsonify({"error": "Tuần không hợp lệ"}), 400
+
+    data = load_data()
+    sess = find_session_by_id(data, session_id_from_date(week_date)) or new_session_for(week_date)
+    try:
+        result, reqs = solve_week(sess, raw_requests)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    result["committed"] = False
+    if body.get("commit"):
+        operations = solver_operations(result, reqs, include_conflicts=bool(body.get("allow_conflicts")))
+        if operations:
+            results, versions = apply_batch(data, operations)
+            if versions is None:
+                return jsonify({**result, "errors": [r for r in results if not r["ok"]]}), 422
+            save_data(data)
+            ids = iter(r["id"] for r in results)
+            for a in result["assignments"]:
+                if a["status"] == "placed" or (body.get("allow_conflicts") and a["status"] == "conflict"):
+                    a["event_id"] = next(ids)
+            result["versions"] = versions
+        result["committed"] = True
+    return jsonify(result)
+
 @app.route("/")
 def home():
-    data = load_data()
+    data = load_data_readonly()
     qdate = request.args.get("date")
     today = dt.date.today() if not qdate else dt.date.fromisoformat(qdate)
-    sess = get_or_create_session(data, today)
+    sess = find_session_by_id(data, session_id_from_date(today))
+    if sess is None:
+        with data_lock():  # Tuần chưa có -> đọc lại bản đầy đủ trong khoá rồi tạo và ghi
+            data = load_data()
+            sess = get_or_create_session(data, today)
 
     sessions_sorted = sorted(data["sessions"], key=lambda s: s["week_start"], reverse=True)
 
     q = request.args.get("q", "").strip().lower()
+    # Gộp alias đổi ID người/phòng -> cảnh báo trùng lịch có thể đổi dù version tuần giữ nguyên
+    etag = make_etag("home", current_tenant().slug, sess["id"], sess.get("version", 0),
+                     sessions_signature(sessions_sorted), today, q, name_registry.epoch)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
     events = list(sess["events"])
     if q:
-        events = [e for e in events if q in json.dumps(e, ensure_ascii=False).lower()]
+        events = [e for e in events if event_matches_name(e, q) or q in json.dumps(e, ensure_ascii=False).lower()]
 
     # Cảnh báo xung đột
     compute_conflicts(events)
     compute_attendees_location_conflicts(events)
 
     # >>> NEW: dữ liệu cho tab "Lịch"
-    dates, schedule = build_schedule(sess)
+    dates, schedule = build_schedule(sess, with_conflicts=True)
     weekdays = ['Thứ 2', 'Thứ 3', 'Thứ 4', 'Thứ 5', 'Thứ 6', 'Thứ 7']
+    events = sorted(events, key=lambda x: (x["date"], x["session_buoi"], x["start_time"]))
+    cells, table_rows = render_week_fragments(sess, dates, schedule, events)
 
-    return render_template_string(
+    return with_etag(render_page(
         TEMPLATE_INDEX,
-        company=COMPANY_NAME,
-        chair_colors=CHAIR_COLORS,
-        categories=CATEGORIES,
-        rooms=ROOMS,
+        company=current_tenant().company,
+        chair_colors=current_tenant().chair_colors,
+        categories=current_tenant().categories,
+        rooms=current_tenant().rooms,
         session=sess,
         sessions=sessions_sorted,
-        events=sorted(events, key=lambda x: (x["date"], x["session_buoi"], x["start_time"])),
+        events=events,
         week_start=dt.date.fromisoformat(sess["week_start"]),
         week_end=dt.date.fromisoformat(sess["week_end"]),
         today=today,
@@ -632,34 +5028,35 @@ def home():
         import_error=None,
         # >>> NEW:
         dates=dates,
-        schedule=schedule,
+        cells=cells,
+        table_rows=table_rows,
         weekdays=weekdays
-    )
+    ), etag)
 
 
 @app.route("/preview/<session_id>")
 def preview(session_id):
-    data = load_data()
+    data = load_data_readonly()
     sess = find_session_by_id(data, session_id)
     if not sess:
         return "Không tìm thấy session", 404
-    dates, schedule = build_schedule(sess)
-    weekdays = ['Thứ 2', 'Thứ 3', 'Thứ 4', 'Thứ 5', 'Thứ 6', 'Thứ 7']
-    return render_template_string(
-        TEMPLATE_PREVIEW,
-        company=COMPANY_NAME,
-        chair_colors=CHAIR_COLORS,
-        session=sess,
-        dates=dates,
-        schedule=schedule,
-        weekdays=weekdays
-    )
+    etag = make_etag("preview", current_tenant().slug, sess["id"], sess.get("version", 0), name_registry.epoch)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    return with_etag(render_page(TEMPLATE_PREVIEW, **preview_context(sess)), etag)
 
 @app.route("/sessions")
 def list_sessions():
-    data = load_data()
+    data = load_data_readonly()
     sessions_sorted = sorted(data["sessions"], key=lambda s: s["week_start"], reverse=True)
-    return jsonify(sessions_sorted)
+    etag = make_etag("sessions", sessions_signature(sessions_sorted))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    # Cần toàn bộ sự kiện: json.load cả file nhanh hơn giải mã từng sự kiện từ snapshot
+    full = sorted(load_data()["sessions"], key=lambda s: s["week_start"], reverse=True)
+    return with_etag(jsonify(full), etag)
 
 @app.route("/switch-session", methods=["POST"])
 def switch_session():
@@ -669,6 +5066,7 @@ def switch_session():
     return redirect(url_for("home", date=date_str))
 
 @app.route("/event", methods=["POST"])
+@writes_data
 def add_or_update_event():
     data = load_data()
     date_str = request.form["date"]
@@ -695,6 +5093,7 @@ def add_or_update_event():
         return f"Lỗi: {e}", 400
 
 @app.route("/event/<session_id>/<event_id>/delete", methods=["POST"])
+@writes_data
 def remove_event(session_id, event_id):
     data = load_data()
     sess = find_session_by_id(data, session_id)
@@ -705,16 +5104,20 @@ def remove_event(session_id, event_id):
     return redirect(url_for("home", date=sess["week_start"]))
 
 @app.route("/event/<session_id>/clear", methods=["POST"])
+@writes_data
 def clear_session(session_id):
     data = load_data()
     sess = find_session_by_id(data, session_id)
     if not sess:
         return "Không tìm thấy session", 404
     sess["events"] = []
+    bump_session_version(sess)
+    record_change("clear", sess)
     save_data(data)
     return redirect(url_for("home", date=sess["week_start"]))
 
 @app.route("/export/<session_id>/excel", methods=["POST"])
+@heavy_route
 def export_excel(session_id):
     data = load_data()
     sess = find_session_by_id(data, session_id)
@@ -733,6 +5136,7 @@ def export_excel(session_id):
         return f"Lỗi khi xuất file: {str(e)}", 500
 
 @app.route("/export/<session_id>/ics", methods=["POST"])
+@heavy_route
 def export_ics(session_id):
     data = load_data()
     sess = find_session_by_id(data, session_id)
@@ -747,9 +5151,59 @@ def export_ics(session_id):
 @app.route("/backup/json", methods=["GET"])
 def backup_json():
     ensure_data_file()
-    return send_file(DATA_PATH, as_attachment=True, download_name="meeting_schedule_backup.json")
+    return send_file(current_tenant().data_path, as_attachment=True, download_name="meeting_schedule_backup.json")
+
+@app.route("/restore", methods=["POST"])
+@heavy_route
+@writes_data
+def restore_data():
+    file = request.files.get("file")
+    if not file or not file.filename:
+        return jsonify({"error": "Vui lòng chọn file backup JSON."}), 400
+    policy = request.form.get("policy", "merge_id")
+    if policy == "replace" and request.form.get("confirm") != "1":
+        return jsonify({"error": "Thay thế toàn bộ dữ liệu cần xác nhận (confirm=1)."}), 400
+    try:
+        stats = restore_backup(file.stream, policy)
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(stats)
+
+@app.route("/export/events.<fmt>", methods=["GET"])
+def export_events(fmt):
+    # ?from=&to= (ISO), ?fields=date,title,..., lọc chair/attendee/room/category như /api/events
+    if fmt not in ("csv", "jsonl"):
+        abort(404)
+    args = request.args
+    try:
+        date_from = dt.date.fromisoformat(args.get("from") or "0001-01-01").isoformat()
+        date_to = dt.date.fromisoformat(args.get("to") or "9999-12-31").isoformat()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    fields = [f.strip() for f in args.get("fields", "").split(",") if f.strip()] or EXPORT_FIELDS
+    unknown = [f for f in fields if f not in EXPORT_FIELDS]
+    if unknown:
+        return jsonify({"error": f"Trường không hỗ trợ: {', '.join(unknown)}"}), 400
+
+    filters = event_filters_from_args(args)
+    events = iter_export_events(get_event_index(), date_from, date_to, filters) if filters is not None else iter(())
+    body = iter_export_lines(events, fmt, fields)
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    filename = f"meeting_events.{fmt}"
+    headers = {}
+    if args.get("gzip") == "1":
+        # Tải về file .gz (cho công cụ không tự giải nén)
+        body, mimetype, filename = gzip_stream(body), "application/gzip", filename + ".gz"
+    elif request.accept_encodings.best_match(["gzip"]):
+        body = gzip_stream(body)
+        headers["Content-Encoding"] = "gzip"
+    headers["Content-Disposition"] = f"attachment; filename={filename}"
+    headers["Vary"] = "Accept-Encoding"
+    return Response(body, mimetype=mimetype, headers=headers)
 
 @app.route("/import", methods=["POST"])
+@heavy_route
+@writes_data
 def import_data():
     data = load_data()
     import_error = None
@@ -759,8 +5213,17 @@ def import_data():
         file = request.files['file']
         if file.filename == '':
             import_error = "Vui lòng chọn một file để tải lên."
+        elif os.path.splitext(file.filename.lower())[1] in IMPORT_FORMATS:
+            try:
+                stats = import_stream(file.stream, IMPORT_FORMATS[os.path.splitext(file.filename.lower())[1]],
+                                      **import_options_from_request())
+            except (ValueError, UnicodeDecodeError, csv.Error) as e:
+                stats = {"imported": 0, "errors": [{"error": str(e)}]}
+            if stats["imported"]:
+                return redirect(url_for("home", date=week_start_from_session_id(stats["weeks"][0]).isoformat()))
+            import_error = "Không import được sự kiện nào. " + "; ".join(e["error"] for e in stats["errors"][:3])
         elif not file.filename.endswith('.xlsx'):
-            import_error = "Chỉ chấp nhận file Excel (.xlsx)."
+            import_error = "Chỉ chấp nhận file Excel (.xlsx), ICS, CSV hoặc JSONL."
         else:
             target_date = dt.date.fromisoformat(request.form.get("target_date", dt.date.today().isoformat()))
             session_id = import_from_excel(file, target_date)
@@ -776,16 +5239,18 @@ def import_data():
         events = [e for e in events if q in json.dumps(e, ensure_ascii=False).lower()]
     compute_conflicts(events)
     compute_attendees_location_conflicts(events)
+    events = sorted(events, key=lambda x: (x["date"], x["session_buoi"], x["start_time"]))
 
-    return render_template_string(
+    return render_page(
         TEMPLATE_INDEX,
-        company=COMPANY_NAME,
-        chair_colors=CHAIR_COLORS,
-        categories=CATEGORIES,
-        rooms=ROOMS,
+        company=current_tenant().company,
+        chair_colors=current_tenant().chair_colors,
+        categories=current_tenant().categories,
+        rooms=current_tenant().rooms,
         session=sess,
         sessions=sessions_sorted,
-        events=sorted(events, key=lambda x: (x["date"], x["session_buoi"], x["start_time"])),
+        events=events,
+        table_rows=render_week_fragments(sess, [], {}, events)[1],
         week_start=dt.date.fromisoformat(sess["week_start"]),
         week_end=dt.date.fromisoformat(sess["week_end"]),
         today=today,
@@ -794,16 +5259,58 @@ def import_data():
     )
 
 
+@app.route("/api/import", methods=["POST"])
+@heavy_route
+@writes_data
+def api_import():
+    file = request.files.get("file")
+    if not file or not file.filename:
+        return jsonify({"error": "Vui lòng chọn một file để tải lên."}), 400
+    fmt = request.form.get("format") or IMPORT_FORMATS.get(os.path.splitext(file.filename.lower())[1])
+    if fmt not in IMPORT_FORMATS.values():
+        return jsonify({"error": "Chỉ hỗ trợ ICS, CSV hoặc JSONL."}), 400
+    try:
+        stats = import_stream(file.stream, fmt, **import_options_from_request())
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(stats)
+
 @app.route("/copy-week", methods=["POST"])
+@heavy_route
+@writes_data
 def copy_week():
     data = load_data()
-    source_session_id = request.form.get("source_session_id")
-    target_date = dt.date.fromisoformat(request.form.get("target_date", dt.date.today().isoformat()))
-    
+    params = request.get_json(silent=True) if request.is_json else None
+    wants_json = params is not None or request.args.get("format") == "json"
+    if params is None:
+        params = {
+            "source_session_id": request.form.get("source_session_id"),
+            "target_dates": request.form.getlist("target_date") + request.form.getlist("target_dates"),
+            "range_to": request.form.get("range_to"),
+            "step_weeks": request.form.get("step_weeks"),
+            "policy": request.form.get("policy"),
+            "dry_run": request.form.get("dry_run"),
+        }
+    target_values = params.get("target_dates") or params.get("target_date") or []
+    if isinstance(target_values, str):
+        target_values = [target_values]
+    range_from = params.get("range_from") or (target_values[0] if params.get("range_to") and target_values else None)
+    policy = params.get("policy") or "skip"
+    dry_run = str(params.get("dry_run") or "").lower() in ("1", "true", "yes")
+
     try:
-        target_session_id = copy_week_to_another(data, source_session_id, target_date)
-        return redirect(url_for("home", date=target_date.isoformat()))
+        target_dates = parse_target_dates(target_values, range_from, params.get("range_to") or None,
+                                          int(params.get("step_weeks") or 1))
+        report = copy_week_to_many(data, params.get("source_session_id"), target_dates, policy=policy, dry_run=dry_run)
+        if wants_json:
+            return jsonify(report)
+        if dry_run:
+            return render_page(TEMPLATE_COPY_PREVIEW, company=current_tenant().company, report=report, params=params,
+                                          target_dates=[d.isoformat() for d in target_dates])
+        return redirect(url_for("home", date=target_dates[0].isoformat()))
     except ValueError as e:
+        if wants_json:
+            return jsonify({"error": str(e)}), 400
         import_error = str(e)
         qdate = request.args.get("date")
         today = dt.date.today() if not qdate else dt.date.fromisoformat(qdate)
@@ -815,16 +5322,18 @@ def copy_week():
             events = [e for e in events if q in json.dumps(e, ensure_ascii=False).lower()]
         compute_conflicts(events)
         compute_attendees_location_conflicts(events)
+        events = sorted(events, key=lambda x: (x["date"], x["session_buoi"], x["start_time"]))
 
-        return render_template_string(
+        return render_page(
             TEMPLATE_INDEX,
-            company=COMPANY_NAME,
-            chair_colors=CHAIR_COLORS,
-            categories=CATEGORIES,
-            rooms=ROOMS,
+            company=current_tenant().company,
+            chair_colors=current_tenant().chair_colors,
+            categories=current_tenant().categories,
+            rooms=current_tenant().rooms,
             session=sess,
             sessions=sessions_sorted,
-            events=sorted(events, key=lambda x: (x["date"], x["session_buoi"], x["start_time"])),
+            events=events,
+            table_rows=render_week_fragments(sess, [], {}, events)[1],
             week_start=dt.date.fromisoformat(sess["week_start"]),
             week_end=dt.date.fromisoformat(sess["week_end"]),
             today=today,
@@ -908,10 +5417,21 @@ TEMPLATE_INDEX = """
     .ev .actions{position:absolute;right:8px;bottom:8px;display:flex;gap:6px}
     .ev .actions button{padding:6px 8px;border:1px solid var(--border);border-radius:6px;background:#fff;cursor:pointer}
     .ev .actions .danger{background:var(--danger);color:#fff;border-color:transparent}
+    .ev.flash{animation:flash 1.6s ease-out}
+    @keyframes flash{from{box-shadow:0 0 0 3px var(--primary)}to{box-shadow:inset 0 0 0 1px rgba(0,0,0,.05)}}
+    .live-banner{display:none;position:fixed;right:18px;bottom:18px;z-index:40;background:var(--text);color:#fff;
+      padding:10px 14px;border-radius:10px;box-shadow:0 4px 14px rgba(0,0,0,.2)}
+    .live-banner a{text-decoration:underline}
 
     /* attendees checkboxes */
     .checkbox-wrap{margin-top:8px}
     .checkbox-group{display:flex;flex-wrap:wrap;gap:12px;margin-top:6px}
+    .ac-wrap{position:relative}
+    .ac-list{display:none;position:absolute;left:0;right:0;top:100%;z-index:20;max-height:300px;overflow:auto;
+      background:#fff;border:1px solid #e5e7eb;border-radius:10px;box-shadow:0 8px 24px rgba(0,0,0,.12)}
+    .ac-item{padding:7px 10px;cursor:pointer;border-bottom:1px solid #f3f4f6}
+    .ac-item:hover,.ac-item.active{background:#eef2ff}
+    .ac-item small{color:var(--muted)}
     .checkbox-group label{display:flex;align-items:center;gap:6px;cursor:pointer;user-select:none}
 
     /* tables */
@@ -929,23 +5449,27 @@ TEMPLATE_INDEX = """
 
   <!-- ===== HEADER ===== -->
   <header class="header">
-    <a class="brand" href="/">
+    <a class="brand" href="{{ request.script_root }}/">
       <span class="logo-wrap">
-        <img class="logo" src="/static/logo.png" alt="Logo"
+        <img class="logo" src="{{ static_url('logo.png') }}" alt="Logo"
              onerror="this.style.display='none'; this.parentElement.nextElementSibling.style.display='grid';">
       </span>
       <span class="logo-fallback">🏢</span>
       <span>{{ company }}</span>
     </a>
     <div class="nav">
-      <a href="/" class="primary">🏠 Trang chủ</a>
-      <form method="post" action="/export/{{ session.id }}/excel" style="display:inline">
+      <a href="{{ request.script_root }}/" class="primary">🏠 Trang chủ</a>
+      <form method="post" action="{{ request.script_root }}/export/{{ session.id }}/excel" style="display:inline">
         <button type="submit">📤 Export Excel</button>
       </form>
-      <form method="post" action="/export/{{ session.id }}/ics" style="display:inline">
+      <form method="post" action="{{ request.script_root }}/export/{{ session.id }}/ics" style="display:inline">
         <button type="submit">📆 Export ICS</button>
       </form>
-      <a href="/backup/json">🗄️ Backup JSON</a>
+      <a href="{{ request.script_root }}/range">🗓️ Xem theo tháng</a>
+      <a href="{{ request.script_root }}/analytics">📈 Thống kê</a>
+      <a href="{{ request.script_root }}/backup/json">🗄️ Backup JSON</a>
+      <a href="{{ request.script_root }}/export/events.csv" title="Toàn bộ lịch sử, mỗi cuộc họp 1 dòng">📊 Xuất CSV</a>
+      <a href="{{ request.script_root }}/offline" title="Xem lịch đã lưu trên máy khi mất mạng">📴 Xem offline</a>
     </div>
   </header>
 
@@ -957,7 +5481,7 @@ TEMPLATE_INDEX = """
       <h2>Tuần &amp; Tính năng</h2>
       <div class="content">
         <!-- Mở tuần -->
-        <form method="post" action="/switch-session" class="row" style="margin-bottom:12px">
+        <form method="post" action="{{ request.script_root }}/switch-session" class="row" style="margin-bottom:12px">
           <div>
             <label class="muted">Chọn bất kỳ ngày trong tuần</label>
             <input type="date" name="any_date" value="{{ today.isoformat() }}">
@@ -972,7 +5496,7 @@ TEMPLATE_INDEX = """
         </div>
 
         <!-- Tìm kiếm -->
-        <form method="get" action="/" class="row" style="margin-top:6px">
+        <form method="get" action="{{ request.script_root }}/" class="row" style="margin-top:6px">
           <input type="hidden" name="date" value="{{ week_start.isoformat() }}">
           <input type="text" name="q" placeholder="Tìm kiếm..." value="{{ q }}">
           <button type="submit">Lọc</button>
@@ -982,28 +5506,62 @@ TEMPLATE_INDEX = """
 
         <!-- Xoá toàn tuần -->
         <div class="row">
-          <form method="post" action="/event/{{ session.id }}/clear" onsubmit="return confirm('Xoá toàn bộ sự kiện của tuần này?')">
+          <form method="post" action="{{ request.script_root }}/event/{{ session.id }}/clear" onsubmit="return confirm('Xoá toàn bộ sự kiện của tuần này?')">
             <button class="danger" type="submit">🗑️ Xoá toàn tuần</button>
           </form>
         </div>
 
         <!-- Import từ Excel -->
         <hr style="margin:14px 0">
-        <form method="post" action="/import" enctype="multipart/form-data" class="row">
+        <form method="post" action="{{ request.script_root }}/import" enctype="multipart/form-data" class="row">
           <input type="date" name="target_date" value="{{ today.isoformat() }}">
-          <input type="file" name="file" accept=".xlsx">
-          <button class="primary" type="submit">📥 Import từ Excel</button>
+          <input type="file" name="file" accept=".xlsx,.ics,.csv,.jsonl,.ndjson" title="Excel theo mẫu, hoặc ICS/CSV/JSONL">
+          <button class="primary" type="submit">📥 Import (Excel/ICS/CSV/JSONL)</button>
+        </form>
+
+        <!-- Khôi phục từ backup JSON -->
+        <form id="restore-form" method="post" action="{{ request.script_root }}/restore" enctype="multipart/form-data" class="row" style="margin-top:6px">
+          <input type="file" name="file" accept=".json" title="File tải từ Backup JSON">
+          <select name="policy">
+            <option value="merge_id">Gộp theo id (cập nhật sự kiện trùng id)</option>
+            <option value="merge_content">Gộp theo nội dung (bỏ qua cuộc họp đã có)</option>
+            <option value="replace">Thay thế toàn bộ dữ liệu</option>
+          </select>
+          <button type="submit">♻️ Khôi phục backup</button>
         </form>
+        <script>
+          document.getElementById('restore-form').addEventListener('submit', async (e)=>{
+            e.preventDefault();
+            const form=e.target, body=new FormData(form);
+            if(body.get('policy')==='replace'){
+              if(!confirm('Thay thế TOÀN BỘ dữ liệu bằng file backup?')) return;
+              body.set('confirm','1');
+            }
+            const r=await fetch(form.action,{method:'POST',body}), s=await r.json();
+            if(!r.ok){ alert(s.error); return; }
+            alert(`Khôi phục xong: thêm ${s.created}, cập nhật ${s.updated}, xoá ${s.deleted}, `+
+                  `không đổi ${s.unchanged}, trùng ${s.duplicates}, lỗi ${s.invalid}`+
+                  (s.errors.length?'\\n'+s.errors.slice(0,5).map(x=>x.error).join('\\n'):''));
+            location.reload();
+          });
+        </script>
 
         <!-- Sao chép tuần -->
         <hr style="margin:14px 0">
-        <form method="post" action="/copy-week" class="row">
+        <form method="post" action="{{ request.script_root }}/copy-week" class="row">
           <select name="source_session_id">
             {% for s in sessions %}
               <option value="{{ s.id }}">{{ s.id }} ({{ s.week_start }} → {{ s.week_end }})</option>
             {% endfor %}
           </select>
-          <input type="date" name="target_date" value="{{ today.isoformat() }}">
+          <input type="date" name="target_date" value="{{ today.isoformat() }}" title="Tuần đích (hoặc tuần bắt đầu)">
+          <input type="date" name="range_to" title="Đến tuần (tuỳ chọn, sao chép cho mọi tuần trong khoảng)">
+          <select name="policy">
+            <option value="skip">Bỏ qua sự kiện trùng</option>
+            <option value="merge">Gộp, cập nhật sự kiện trùng</option>
+            <option value="overwrite">Ghi đè tuần đích</option>
+          </select>
+          <button type="submit" name="dry_run" value="1">👁 Xem trước</button>
           <button class="primary" type="submit">📑 Sao chép tuần</button>
         </form>
 
@@ -1024,7 +5582,7 @@ TEMPLATE_INDEX = """
                 {% for s in sessions %}
                 <tr>
                   <td><b>{{ s.id }}</b><br><span class="muted">{{ s.week_start }} → {{ s.week_end }}</span></td>
-                  <td class="nowrap"><a href="/?date={{ s.week_start }}"><button type="button">Xem</button></a></td>
+                  <td class="nowrap"><a href="{{ request.script_root }}/?date={{ s.week_start }}"><button type="button">Xem</button></a></td>
                 </tr>
                 {% endfor %}
               </tbody>
@@ -1038,7 +5596,7 @@ TEMPLATE_INDEX = """
     <section class="card">
       <h2>Thêm/Chỉnh sửa sự kiện</h2>
       <div class="content">
-        <form id="event-form" method="post" action="/event">
+        <form id="event-form" method="post" action="{{ request.script_root }}/event">
           <input type="hidden" name="id" id="fld-id">
 
           <div class="grid3">
@@ -1083,9 +5641,10 @@ TEMPLATE_INDEX = """
           </div>
 
           <div class="grid2" style="margin-top:8px">
-            <div>
+            <div class="ac-wrap">
               <label>Tên họp</label>
-              <input type="text" name="title" id="fld-title" placeholder="VD: Họp giao ban tuần" required>
+              <input type="text" name="title" id="fld-title" placeholder="VD: Họp giao ban tuần" autocomplete="off" required>
+              <div class="ac-list" id="title-suggest"></div>
             </div>
             <div>
               <label>Địa điểm</label>
@@ -1140,39 +5699,8 @@ TEMPLATE_INDEX = """
               <div class="cal-buoi">{{ buoi }}</div>
               {% for d in dates %}
                 {% set key = d.isoformat() %}
-                <div class="cal-cell">
-                  {% for ev in schedule.get(key, {}).get(buoi, []) %}
-                    {% set bg = chair_colors.get(ev.chair, '#f3f4f6') %}
-                    <div class="ev"
-                         style="background:{{ bg }}"
-                         data-id="{{ ev.id }}"
-                         data-date="{{ ev.date }}"
-                         data-buoi="{{ ev.session_buoi }}"
-                         data-start="{{ ev.start_time }}"
-                         data-end="{{ ev.end_time }}"
-                         data-title="{{ ev.title|e }}"
-                         data-chair="{{ ev.chair }}"
-                         data-attendees="{{ ev.attendees|e }}"
-                         data-location="{{ ev.location|e }}"
-                         data-category="{{ ev.category|e }}"
-                         data-has-conflict="{{ '1' if (ev.conflict or ev.attendees_conflict or ev.location_conflict) else '0' }}">
-                      <div class="tt">• {{ ev.start_time }}–{{ ev.end_time }}: {{ ev.title }}</div>
-                      <div>Chủ trì: <b>{{ ev.chair }}</b></div>
-                      {% if ev.attendees %}<div>- Thành phần tham dự: {{ ev.attendees }} {% if ev.attendees_conflict %}<span class="warn">⚠ Trùng thành phần</span>{% endif %}</div>{% endif %}
-                      {% if ev.location %}<div>- Địa điểm: {{ ev.location }} {% if ev.location_conflict %}<span class="warn">⚠ Trùng địa điểm</span>{% endif %}</div>{% endif %}
-                      {% if ev.category %}<div>- Loại: {{ ev.category }}</div>{% endif %}
-                      {% if ev.conflict %}<div class="warn">⚠ Trùng giờ</div>{% endif %}
-
-                      <div class="actions">
-                        <button type="button" onclick="editEventFromCard(this)">Sửa</button>
-                        <form method="post" action="/event/{{ session.id }}/{{ ev.id }}/delete" onsubmit="return confirm('Xoá sự kiện này?')">
-                          <button class="danger" type="submit">Xoá</button>
-                        </form>
-                      </div>
-                    </div>
-                  {% else %}
-                    <div class="muted" style="font-style:italic">—</div>
-                  {% endfor %}
+                <div class="cal-cell" data-date="{{ key }}" data-buoi="{{ buoi }}">
+                  {{ cells[key][buoi] }}
                 </div>
               {% endfor %}
             </div>
@@ -1193,33 +5721,7 @@ TEMPLATE_INDEX = """
               </tr>
             </thead>
             <tbody>
-              {% for ev in events %}
-              <tr
-                data-id="{{ ev.id }}" data-date="{{ ev.date }}" data-buoi="{{ ev.session_buoi }}"
-                data-start="{{ ev.start_time }}" data-end="{{ ev.end_time }}"
-                data-title="{{ ev.title|e }}" data-chair="{{ ev.chair }}"
-                data-attendees="{{ ev.attendees|e }}" data-location="{{ ev.location|e }}"
-                data-category="{{ ev.category|e }}">
-                <td class="nowrap">{{ ev.date }}</td>
-                <td>{{ ev.session_buoi }}</td>
-                <td class="nowrap">{{ ev.start_time }}–{{ ev.end_time }} {% if ev.conflict %}<span class="warn">⚠ Trùng giờ</span>{% endif %}</td>
-                <td><div style="font-weight:600">{{ ev.title }}</div>{% if ev.category %}<div class="muted">Loại: {{ ev.category }}</div>{% endif %}</td>
-                <td>{{ ev.chair }}</td>
-                <td>{{ ev.attendees }} {% if ev.attendees_conflict %}<span class="warn">⚠ Trùng thành phần</span>{% endif %}</td>
-                <td>{{ ev.location }} {% if ev.location_conflict %}<span class="warn">⚠ Trùng địa điểm</span>{% endif %}</td>
-                <td>
-                  {% if ev.conflict %}<div class="warn">⚠ Trùng giờ</div>{% endif %}
-                  {% if ev.attendees_conflict %}<div class="warn">⚠ Trùng thành phần</div>{% endif %}
-                  {% if ev.location_conflict %}<div class="warn">⚠ Trùng địa điểm</div>{% endif %}
-                </td>
-                <td class="nowrap">
-                  <button type="button" onclick="editEvent(this)">Sửa</button>
-                  <form method="post" action="/event/{{ session.id }}/{{ ev.id }}/delete" style="display:inline" onsubmit="return confirm('Xoá sự kiện này?')">
-                    <button class="danger" type="submit">Xoá</button>
-                  </form>
-                </td>
-              </tr>
-              {% endfor %}
+              {{ table_rows }}
             </tbody>
           </table>
           {% else %}
@@ -1231,6 +5733,8 @@ TEMPLATE_INDEX = """
     </section>
   </main>
 
+  <div class="live-banner" id="live-banner"></div>
+
   <!-- ===== FOOTER ===== -->
   <footer class="footer">
     <div class="legend">
@@ -1308,13 +5812,903 @@ TEMPLATE_INDEX = """
 
   function editEvent(btn){ const tr=btn.closest('tr'); fillForm(tr.dataset); }
   function editEventFromCard(btn){ const card=btn.closest('.ev'); fillForm(card.dataset); }
+
+  // Gợi ý tên họp: chọn 1 dòng -> điền sẵn chủ trì, thành phần, địa điểm, loại và giờ kết thúc (theo thời lượng hay dùng)
+  const titleInput=document.getElementById('fld-title'), titleList=document.getElementById('title-suggest');
+  const startInput=document.getElementById('fld-start'), endInput=document.getElementById('fld-end');
+  let titleItems=[], titleActive=-1, titleReq=0, pendingDuration=null;
+  function addMinutes(hhmm,mins){
+    const [h,m]=hhmm.split(':').map(Number), t=Math.min(h*60+m+mins,23*60+59);
+    return String(Math.floor(t/60)).padStart(2,'0')+':'+String(t%60).padStart(2,'0');
+  }
+  function renderTitleList(){
+    titleList.innerHTML=titleItems.map((s,i)=>`<div class="ac-item${i===titleActive?' active':''}" data-i="${i}"><b>${esc(s.title)}</b><br>`+
+      `<small>${esc(s.chair)}${s.location?' · '+esc(s.location):''}${s.duration_minutes?' · '+s.duration_minutes+' phút':''} · ${s.count} lần</small></div>`).join('');
+    titleList.style.display=titleItems.length?'block':'none';
+  }
+  function closeTitleList(){ titleItems=[]; titleActive=-1; renderTitleList(); }
+  function applySuggestion(s){
+    titleInput.value=s.title;
+    const chair=document.getElementById('fld-chair');
+    if(s.chair && Array.from(chair.options).some(o=>o.value===s.chair)) chair.value=s.chair;
+    const set=new Set(s.attendees.map(normLabel));
+    document.querySelectorAll('input[name="attendees"]').forEach(cb=>cb.checked=set.has(normLabel(cb.value)));
+    if(s.location) setSelectOrOther('fld-location-select','fld-location-other','fld-location',s.location);
+    if(s.category) setSelectOrOther('fld-category-select','fld-category-other','fld-category',s.category);
+    pendingDuration=s.duration_minutes;
+    if(startInput.value && pendingDuration){ endInput.value=addMinutes(startInput.value,pendingDuration); pendingDuration=null; }
+    closeTitleList();
+  }
+  startInput.addEventListener('change',()=>{
+    if(startInput.value && pendingDuration && !endInput.value){ endInput.value=addMinutes(startInput.value,pendingDuration); pendingDuration=null; }
+  });
+  titleInput.addEventListener('input',()=>{
+    clearTimeout(titleInput.t);
+    const q=titleInput.value.trim();
+    if(q.length<2){ closeTitleList(); return; }
+    titleInput.t=setTimeout(async()=>{
+      const req=++titleReq;
+      try{
+        const r=await fetch(`{{ request.script_root }}/api/titles?q=${encodeURIComponent(q)}`);
+        const body=await r.json();
+        if(req!==titleReq) return;  // Đã có lần gõ mới hơn
+        titleItems=body.suggestions; titleActive=-1; renderTitleList();
+      }catch(e){ closeTitleList(); }
+    },100);
+  });
+  titleInput.addEventListener('keydown',e=>{
+    if(!titleItems.length) return;
+    if(e.key==='ArrowDown'||e.key==='ArrowUp'){
+      e.preventDefault();
+      titleActive=(titleActive+(e.key==='ArrowDown'?1:-1)+titleItems.length)%titleItems.length;
+      renderTitleList();
+    }else if(e.key==='Enter' && titleActive>=0){
+      e.preventDefault(); applySuggestion(titleItems[titleActive]);
+    }else if(e.key==='Escape'){
+      closeTitleList();
+    }
+  });
+  titleList.addEventListener('mousedown',e=>{
+    const item=e.target.closest('.ac-item');
+    if(item){ e.preventDefault(); applySuggestion(titleItems[+item.dataset.i]); }
+  });
+  titleInput.addEventListener('blur',()=>setTimeout(closeTitleList,150));
+
+  // ===== Cập nhật trực tiếp (SSE) =====
+  const SESSION_ID={{ session.id|tojson }}, CHAIR_COLORS={{ chair_colors|tojson }};
+  let sessionVersion={{ session.version or 0 }};
+  function esc(s){ return (s??'').toString().replace(/[&<>"']/g,c=>({'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;',"'":'&#39;'}[c])); }
+  function showBanner(html,ms){
+    const b=document.getElementById('live-banner'); b.innerHTML=html; b.style.display='block';
+    clearTimeout(showBanner.t); if(ms) showBanner.t=setTimeout(()=>b.style.display='none',ms);
+  }
+  function evFromDataset(ds){
+    return {id:ds.id,date:ds.date,session_buoi:ds.buoi,start_time:ds.start,end_time:ds.end,title:ds.title,
+            chair:ds.chair,attendees:ds.attendees,location:ds.location,category:ds.category};
+  }
+  function evDataAttrs(ev,f){
+    return `data-id="${esc(ev.id)}" data-date="${esc(ev.date)}" data-buoi="${esc(ev.session_buoi)}" data-start="${esc(ev.start_time)}" data-end="${esc(ev.end_time)}"`+
+      ` data-title="${esc(ev.title)}" data-chair="${esc(ev.chair)}" data-attendees="${esc(ev.attendees)}" data-location="${esc(ev.location)}"`+
+      ` data-category="${esc(ev.category)}" data-has-conflict="${(f[0]||f[1]||f[2])?'1':'0'}"`;
+  }
+  function deleteForm(ev,inline){
+    return `<form method="post" action="{{ request.script_root }}/event/${encodeURIComponent(SESSION_ID)}/${encodeURIComponent(ev.id)}/delete"${inline?' style="display:inline"':''} onsubmit="return confirm('Xoá sự kiện này?')"><button class="danger" type="submit">Xoá</button></form>`;
+  }
+  function renderCard(ev,f){
+    const w=t=>`<span class="warn">${t}</span>`;
+    const wrap=document.createElement('div');
+    wrap.innerHTML=`<div class="ev" style="background:${esc(CHAIR_COLORS[ev.chair]||'#f3f4f6')}" ${evDataAttrs(ev,f)}>`+
+      `<div class="tt">• ${esc(ev.start_time)}–${esc(ev.end_time)}: ${esc(ev.title)}</div><div>Chủ trì: <b>${esc(ev.chair)}</b></div>`+
+      (ev.attendees?`<div>- Thành phần tham dự: ${esc(ev.attendees)} ${f[1]?w('⚠ Trùng thành phần'):''}</div>`:'')+
+      (ev.location?`<div>- Địa điểm: ${esc(ev.location)} ${f[2]?w('⚠ Trùng địa điểm'):''}</div>`:'')+
+      (ev.category?`<div>- Loại: ${esc(ev.category)}</div>`:'')+
+      (f[0]?'<div class="warn">⚠ Trùng giờ</div>':'')+
+      `<div class="actions"><button type="button" onclick="editEventFromCard(this)">Sửa</button>${deleteForm(ev,false)}</div></div>`;
+    return wrap.firstChild;
+  }
+  function renderRow(ev,f){
+    const w=t=>`<span class="warn">${t}</span>`, d=t=>`<div class="warn">${t}</div>`;
+    const tb=document.createElement('tbody');
+    tb.innerHTML=`<tr ${evDataAttrs(ev,f)}><td class="nowrap">${esc(ev.date)}</td><td>${esc(ev.session_buoi)}</td>`+
+      `<td class="nowrap">${esc(ev.start_time)}–${esc(ev.end_time)} ${f[0]?w('⚠ Trùng giờ'):''}</td>`+
+      `<td><div style="font-weight:600">${esc(ev.title)}</div>${ev.category?`<div class="muted">Loại: ${esc(ev.category)}</div>`:''}</td>`+
+      `<td>${esc(ev.chair)}</td><td>${esc(ev.attendees)} ${f[1]?w('⚠ Trùng thành phần'):''}</td>`+
+      `<td>${esc(ev.location)} ${f[2]?w('⚠ Trùng địa điểm'):''}</td>`+
+      `<td>${f[0]?d('⚠ Trùng giờ'):''}${f[1]?d('⚠ Trùng thành phần'):''}${f[2]?d('⚠ Trùng địa điểm'):''}</td>`+
+      `<td class="nowrap"><button type="button" onclick="editEvent(this)">Sửa</button> ${deleteForm(ev,true)}</td></tr>`;
+    return tb.firstChild;
+  }
+  const sortKey=ev=>[ev.start_time,ev.end_time,ev.title].join('|');
+  function placeCard(ev,f){
+    const cell=document.querySelector(`.cal-cell[data-date="${ev.date}"][data-buoi="${ev.session_buoi}"]`);
+    if(!cell) return;
+    cell.querySelectorAll(':scope > .muted').forEach(x=>x.remove());
+    const card=renderCard(ev,f); card.classList.add('flash');
+    const next=Array.from(cell.querySelectorAll('.ev')).find(c=>sortKey(evFromDataset(c.dataset))>sortKey(ev));
+    cell.insertBefore(card,next||null);
+  }
+  function placeRow(ev,f){
+    const tbody=document.querySelector('#view-table tbody'); if(!tbody) return;
+    const key=e=>[e.date,e.session_buoi,e.start_time].join('|');
+    const next=Array.from(tbody.rows).find(r=>key(evFromDataset(r.dataset))>key(ev));
+    tbody.insertBefore(renderRow(ev,f),next||null);
+  }
+  function removeEverywhere(id){
+    document.querySelectorAll(`#view-calendar .ev[data-id="${CSS.escape(id)}"], #view-table tr[data-id="${CSS.escape(id)}"]`).forEach(el=>{
+      const cell=el.closest('.cal-cell'); el.remove();
+      if(cell && !cell.querySelector('.ev')) cell.innerHTML='<div class="muted" style="font-style:italic">—</div>';
+    });
+  }
+  function applyFlags(flags){
+    Object.entries(flags||{}).forEach(([id,f])=>{
+      document.querySelectorAll(`#view-calendar .ev[data-id="${CSS.escape(id)}"]`).forEach(c=>c.replaceWith(renderCard(evFromDataset(c.dataset),f)));
+      document.querySelectorAll(`#view-table tr[data-id="${CSS.escape(id)}"]`).forEach(r=>r.replaceWith(renderRow(evFromDataset(r.dataset),f)));
+    });
+  }
+  function applyChange(ch){
+    if(ch.op==='upsert'){
+      const f=(ch.flags||{})[ch.event.id]||[0,0,0];
+      removeEverywhere(ch.event.id); placeCard(ch.event,f); placeRow(ch.event,f);
+    } else if(ch.op==='delete'){
+      removeEverywhere(ch.event_id);
+    } else if(ch.op==='clear'){
+      document.querySelectorAll('#view-calendar .cal-cell').forEach(c=>c.innerHTML='<div class="muted" style="font-style:italic">—</div>');
+      document.querySelectorAll('#view-table tbody tr').forEach(r=>r.remove());
+    }
+    applyFlags(ch.flags);
+    if(onlyConf && onlyConf.checked) onlyConf.dispatchEvent(new Event('change'));
+    sessionVersion=ch.version;
+    showBanner('Lịch vừa được cập nhật bởi người khác.',4000);
+  }
+  if(window.EventSource && !{{ (q != '')|tojson }}){
+    const es=new EventSource(`{{ request.script_root }}/stream/${encodeURIComponent(SESSION_ID)}?since=${sessionVersion}`);
+    const resync=()=>{ es.close(); showBanner('Lịch đã thay đổi. <a href="">Tải lại</a> để xem bản mới nhất.'); };
+    es.addEventListener('change',e=>{
+      const ch=JSON.parse(e.data);
+      if(ch.version===sessionVersion+1) applyChange(ch);
+      else if(ch.version>sessionVersion) resync();  // Thiếu bản giữa chừng -> không vá trên DOM cũ
+    });
+    es.addEventListener('resync',resync);
+  }
+</script>
+<script src="{{ request.script_root }}/offline.js" data-root="{{ request.script_root }}"></script>
+<script>
+  // Cache offline: đăng ký service worker + đồng bộ nền vào IndexedDB (lỗi thì bỏ qua, không ảnh hưởng trang)
+  if('serviceWorker' in navigator) navigator.serviceWorker.register('{{ request.script_root }}/sw.js').catch(()=>{});
+  if(window.indexedDB) setTimeout(()=>LichOffline.sync().catch(()=>{}),1500);
 </script>
 </body>
 </html>
 """
 
+# Mảnh HTML của trang chủ (xem CACHE MẢNH HTML THEO Ô LỊCH): 1 ô lịch ngày × buổi, và các dòng bảng của ô đó
+TEMPLATE_CAL_CELL = """
+{% for ev in cell %}
+  {% set bg = chair_colors.get(ev.chair, '#f3f4f6') %}
+  <div class="ev"
+       style="background:{{ bg }}"
+       data-id="{{ ev.id }}"
+       data-date="{{ ev.date }}"
+       data-buoi="{{ ev.session_buoi }}"
+       data-start="{{ ev.start_time }}"
+       data-end="{{ ev.end_time }}"
+       data-title="{{ ev.title|e }}"
+       data-chair="{{ ev.chair }}"
+       data-attendees="{{ ev.attendees|e }}"
+       data-location="{{ ev.location|e }}"
+       data-category="{{ ev.category|e }}"
+       data-has-conflict="{{ '1' if (ev.conflict or ev.attendees_conflict or ev.location_conflict) else '0' }}">
+    <div class="tt">• {{ ev.start_time }}–{{ ev.end_time }}: {{ ev.title }}</div>
+    <div>Chủ trì: <b>{{ ev.chair }}</b></div>
+    {% if ev.attendees %}<div>- Thành phần tham dự: {{ ev.attendees }} {% if ev.attendees_conflict %}<span class="warn">⚠ Trùng thành phần</span>{% endif %}</div>{% endif %}
+    {% if ev.location %}<div>- Địa điểm: {{ ev.location }} {% if ev.location_conflict %}<span class="warn">⚠ Trùng địa điểm</span>{% endif %}</div>{% endif %}
+    {% if ev.category %}<div>- Loại: {{ ev.category }}</div>{% endif %}
+    {% if ev.conflict %}<div class="warn">⚠ Trùng giờ</div>{% endif %}
+
+    <div class="actions">
+      <button type="button" onclick="editEventFromCard(this)">Sửa</button>
+      <form method="post" action="{{ request.script_root }}/event/{{ session_id }}/{{ ev.id }}/delete" onsubmit="return confirm('Xoá sự kiện này?')">
+        <button class="danger" type="submit">Xoá</button>
+      </form>
+    </div>
+  </div>
+{% else %}
+  <div class="muted" style="font-style:italic">—</div>
+{% endfor %}
+"""
+
+TEMPLATE_TABLE_ROWS = """
+{% for ev in rows %}
+<tr
+  data-id="{{ ev.id }}" data-date="{{ ev.date }}" data-buoi="{{ ev.session_buoi }}"
+  data-start="{{ ev.start_time }}" data-end="{{ ev.end_time }}"
+  data-title="{{ ev.title|e }}" data-chair="{{ ev.chair }}"
+  data-attendees="{{ ev.attendees|e }}" data-location="{{ ev.location|e }}"
+  data-category="{{ ev.category|e }}">
+  <td class="nowrap">{{ ev.date }}</td>
+  <td>{{ ev.session_buoi }}</td>
+  <td class="nowrap">{{ ev.start_time }}–{{ ev.end_time }} {% if ev.conflict %}<span class="warn">⚠ Trùng giờ</span>{% endif %}</td>
+  <td><div style="font-weight:600">{{ ev.title }}</div>{% if ev.category %}<div class="muted">Loại: {{ ev.category }}</div>{% endif %}</td>
+  <td>{{ ev.chair }}</td>
+  <td>{{ ev.attendees }} {% if ev.attendees_conflict %}<span class="warn">⚠ Trùng thành phần</span>{% endif %}</td>
+  <td>{{ ev.location }} {% if ev.location_conflict %}<span class="warn">⚠ Trùng địa điểm</span>{% endif %}</td>
+  <td>
+    {% if ev.conflict %}<div class="warn">⚠ Trùng giờ</div>{% endif %}
+    {% if ev.attendees_conflict %}<div class="warn">⚠ Trùng thành phần</div>{% endif %}
+    {% if ev.location_conflict %}<div class="warn">⚠ Trùng địa điểm</div>{% endif %}
+  </td>
+  <td class="nowrap">
+    <button type="button" onclick="editEvent(this)">Sửa</button>
+    <form method="post" action="{{ request.script_root }}/event/{{ session_id }}/{{ ev.id }}/delete" style="display:inline" onsubmit="return confirm('Xoá sự kiện này?')">
+      <button class="danger" type="submit">Xoá</button>
+    </form>
+  </td>
+</tr>
+{% endfor %}
+"""
+
+TEMPLATE_PREVIEW = """
+<!doctype html>
+<html lang="vi">
+<head>
+  <meta charset="utf-8">
+  <title>Lịch họp tuần {{ session.id }} – {{ company }}</title>
+  <meta name="viewport" content="width=device-width, initial-scale=1" />
+  <style>
+    body{margin:0;padding:18px;background:#fff;color:#1f2937;
+      font:14px/1.45 ui-sans-serif,system-ui,-apple-system,Segoe UI,Roboto,Helvetica,Arial}
+    h1{margin:0;text-align:center;font-size:20px}
+    .sub{text-align:center;color:#6b7280;margin:4px 0 14px}
+    table{width:100%;border-collapse:collapse;table-layout:fixed}
+    th,td{border:1px solid #d1d5db;padding:8px;vertical-align:top}
+    th{background:#4ade80;font-size:15px}
+    td.buoi{width:90px;text-align:center;font-weight:800;font-size:18px;vertical-align:middle;background:#f9fafb}
+    .ev{padding:6px 8px;border-radius:8px;margin-bottom:8px;background:#f3f4f6}
+    .ev .tt{font-weight:700}
+    .muted{color:#6b7280}
+    @media print{ body{padding:0} .ev{break-inside:avoid} }
+  </style>
+</head>
+<body>
+  <h1>LỊCH HỌP TUẦN {{ company|upper }}</h1>
+  <div class="sub">Tuần: {{ session.week_start }} → {{ session.week_end }} ({{ session.id }})</div>
+  <table>
+    <thead>
+      <tr>
+        <th style="width:90px">Buổi</th>
+        {% for d in dates %}<th>{{ weekdays[loop.index0] }}<br><span class="muted">({{ d.strftime('%d.%m.%Y') }})</span></th>{% endfor %}
+      </tr>
+    </thead>
+    <tbody>
+      {% for buoi in ['SÁNG','CHIỀU'] %}
+      <tr>
+        <td class="buoi">{{ buoi }}</td>
+        {% for d in dates %}
+        <td>
+          {% for ev in schedule.get(d.isoformat(), {}).get(buoi, []) %}
+          <div class="ev" style="background:{{ chair_colors.get(ev.chair, '#f3f4f6') }}">
+            <div class="tt">• {{ ev.start_time }}–{{ ev.end_time }}: {{ ev.title }}</div>
+            {% if ev.chair %}<div>Chủ trì: <b>{{ ev.chair }}</b></div>{% endif %}
+            {% if ev.attendees %}<div>- Tham dự: {{ ev.attendees }}</div>{% endif %}
+            {% if ev.location %}<div>- Địa điểm: {{ ev.location }}</div>{% endif %}
+            {% if ev.category %}<div>- Loại: {{ ev.category }}</div>{% endif %}
+          </div>
+          {% else %}
+          <div class="muted" style="font-style:italic">—</div>
+          {% endfor %}
+        </td>
+        {% endfor %}
+      </tr>
+      {% endfor %}
+    </tbody>
+  </table>
+</body>
+</html>
+"""
+
+TEMPLATE_PUBLISHED_INDEX = """
+<!doctype html>
+<html lang="vi">
+<head>
+  <meta charset="utf-8">
+  <title>Lịch họp các tuần – {{ company }}</title>
+  <meta name="viewport" content="width=device-width, initial-scale=1" />
+  <style>
+    body{margin:0;padding:18px;background:#fff;color:#1f2937;
+      font:14px/1.45 ui-sans-serif,system-ui,-apple-system,Segoe UI,Roboto,Helvetica,Arial}
+    h1{margin:0 0 4px;font-size:20px}
+    .muted{color:#6b7280}
+    table{border-collapse:collapse;margin-top:12px}
+    th,td{border-bottom:1px solid #e5e7eb;padding:6px 12px;text-align:left}
+    tr.now{background:#ecfdf5;font-weight:700}
+  </style>
+</head>
+<body>
+  <h1>LỊCH HỌP {{ company|upper }}</h1>
+  <div class="muted">Cập nhật lúc {{ generated }}</div>
+  <table>
+    <thead><tr><th>Tuần</th><th>Từ – đến</th><th>Số cuộc họp</th><th></th></tr></thead>
+    <tbody>
+      {% for w in weeks %}
+      <tr{% if w.id == current %} class="now"{% endif %}>
+        <td>{{ w.id }}{% if w.id == current %} (tuần này){% endif %}</td>
+        <td>{{ w.week_start }} → {{ w.week_end }}</td>
+        <td>{{ w.events }}</td>
+        <td><a href="weeks/{{ w.id }}.html">Xem</a> · <a href="weeks/{{ w.id }}.ics">ICS</a></td>
+      </tr>
+      {% else %}
+      <tr><td colspan="4" class="muted">Chưa có tuần nào.</td></tr>
+      {% endfor %}
+    </tbody>
+  </table>
+</body>
+</html>
+"""
+
+TEMPLATE_COPY_PREVIEW = """
+<!doctype html>
+<html lang="vi">
+<head>
+  <meta charset="utf-8">
+  <title>Xem trước sao chép tuần – {{ company }}</title>
+  <meta name="viewport" content="width=device-width, initial-scale=1" />
+  <style>
+    body{margin:0;padding:18px;background:#f5f7fb;color:#1f2937;
+      font:14px/1.45 ui-sans-serif,system-ui,-apple-system,Segoe UI,Roboto,Helvetica,Arial}
+    .card{background:#fff;border:1px solid #e5e7eb;border-radius:12px;padding:14px 16px;margin-bottom:14px}
+    table{width:100%;border-collapse:collapse}
+    th,td{padding:8px;border-bottom:1px solid #eee;text-align:left;vertical-align:top}
+    .warn{color:#b45309;font-weight:700} .muted{color:#6b7280}
+    button{border:1px solid #e5e7eb;border-radius:8px;padding:10px 12px;background:#fff;cursor:pointer}
+    button.primary{background:#2563eb;border-color:transparent;color:#fff}
+  </style>
+</head>
+<body>
+  <div class="card">
+    <h2 style="margin-top:0">Xem trước sao chép tuần {{ report.source_session_id }}</h2>
+    <div class="muted">Chính sách: <b>{{ {'skip': 'Bỏ qua sự kiện trùng', 'merge': 'Gộp, cập nhật sự kiện trùng', 'overwrite': 'Ghi đè tuần đích'}[report.policy] }}</b>
+      — {{ report.weeks|length }} tuần đích, thêm {{ report.totals.added }}, cập nhật {{ report.totals.updated }},
+      bỏ qua {{ report.totals.skipped }}, xoá {{ report.totals.removed }}, xung đột {{ report.totals.conflicts }}</div>
+  </div>
+  <div class="card">
+    <table>
+      <thead><tr><th>Tuần</th><th>Thêm</th><th>Cập nhật</th><th>Bỏ qua</th><th>Xoá</th><th>Xung đột</th></tr></thead>
+      <tbody>
+        {% for w in report.weeks %}
+        <tr>
+          <td><b>{{ w.session_id }}</b><br><span class="muted">{{ w.week_start }}{% if not w.exists %} (tuần mới){% endif %}</span>
+            {% if w.note %}<div class="muted">{{ w.note }}</div>{% endif %}</td>
+          <td>{{ w.added }}</td><td>{{ w.updated }}</td><td>{{ w.skipped }}</td><td>{{ w.removed }}</td>
+          <td>
+            {% for c in w.conflicts %}
+            <div class="warn">⚠ {{ c.date }} {{ c.start_time }}–{{ c.end_time }} {{ c.title }}
+              <span class="muted">↔ {{ c.with_time }} {{ c.with_title }}
+              ({% for k in c.kinds %}{{ {'time': 'giờ', 'location': 'địa điểm', 'attendees': 'thành phần'}[k] }}{% if not loop.last %}, {% endif %}{% endfor %})</span></div>
+            {% else %}<span class="muted">—</span>{% endfor %}
+          </td>
+        </tr>
+        {% endfor %}
+      </tbody>
+    </table>
+  </div>
+  <form method="post" action="{{ request.script_root }}/copy-week" class="card" style="display:flex;gap:10px">
+    <input type="hidden" name="source_session_id" value="{{ report.source_session_id }}">
+    <input type="hidden" name="target_dates" value="{{ target_dates|join(',') }}">
+    <input type="hidden" name="policy" value="{{ report.policy }}">
+    <button class="primary" type="submit">📑 Xác nhận sao chép</button>
+    <a href="{{ request.script_root }}/"><button type="button">Huỷ</button></a>
+  </form>
+</body>
+</html>
+"""
+
+TEMPLATE_RANGE = """
+<!doctype html>
+<html lang="vi">
+<head>
+  <meta charset="utf-8">
+  <title>Lịch họp {{ start.strftime('%d/%m/%Y') }} → {{ end.strftime('%d/%m/%Y') }} – {{ company }}</title>
+  <meta name="viewport" content="width=device-width, initial-scale=1" />
+  <style>
+    :root{--bg:#f5f7fb;--surface:#fff;--text:#1f2937;--muted:#6b7280;--border:#e5e7eb;--primary:#2563eb;--warn:#b45309}
+    *{box-sizing:border-box}
+    body{margin:0;background:var(--bg);color:var(--text);font:14px/1.45 ui-sans-serif,system-ui,-apple-system,Segoe UI,Roboto,Helvetica,Arial}
+    a{color:inherit;text-decoration:none}
+    .header{background:var(--surface);border-bottom:1px solid var(--border);display:flex;flex-wrap:wrap;align-items:center;gap:12px;
+      padding:10px 18px;position:sticky;top:0;z-index:30}
+    .header form{display:flex;gap:8px;align-items:center;margin-left:auto}
+    input,button{font:inherit;border:1px solid var(--border);border-radius:8px;padding:8px 10px;background:#fff}
+    button.primary,a.primary{background:var(--primary);border-color:transparent;color:#fff}
+    .pill{border:1px solid var(--border);background:var(--surface);padding:8px 10px;border-radius:999px}
+    .weeks{padding:16px;display:grid;gap:16px}
+    .week{background:var(--surface);border:1px solid var(--border);border-radius:12px;min-height:260px}
+    .week h3{margin:0;padding:10px 14px;border-bottom:1px solid var(--border);background:#fafafa;font-size:15px;display:flex;gap:10px}
+    .week h3 .muted{font-weight:400}
+    .muted{color:var(--muted)}
+    .placeholder{padding:40px;text-align:center;color:var(--muted)}
+    .grid{display:grid;grid-template-columns:90px repeat(6,1fr)}
+    .grid>div{border-right:1px solid #f3f4f6;border-bottom:1px solid #f3f4f6;padding:6px}
+    .grid .head{background:#4ade80;font-weight:600;text-align:center}
+    .grid .buoi{background:#f9fafb;font-weight:800;text-align:center}
+    .grid .out{background:#f3f4f6;opacity:.45}
+    .chip{border-radius:8px;padding:4px 6px;margin-bottom:6px;font-size:13px;box-shadow:inset 0 0 0 1px rgba(0,0,0,.05)}
+    .chip b{display:block}
+    .warn{color:var(--warn);font-weight:700}
+  </style>
+</head>
+<body>
+  <header class="header">
+    <a class="pill" href="{{ request.script_root }}/">🏠 Trang chủ</a>
+    <a class="pill" href="{{ request.script_root }}/range?from={{ prev_start.isoformat() }}&to={{ (prev_start + (end - start)).isoformat() }}">◀</a>
+    <b>{{ start.strftime('%d/%m/%Y') }} → {{ end.strftime('%d/%m/%Y') }}</b>
+    <a class="pill" href="{{ request.script_root }}/range?from={{ next_start.isoformat() }}&to={{ (next_start + (end - start)).isoformat() }}">▶</a>
+    <form method="get" action="{{ request.script_root }}/range">
+      <input type="date" name="from" value="{{ start.isoformat() }}">
+      <input type="date" name="to" value="{{ end.isoformat() }}">
+      <button class="primary" type="submit">Xem</button>
+    </form>
+  </header>
+  <main class="weeks">
+    {% for w in weeks %}
+    <section class="week" data-url="{{ request.script_root }}/range/week/{{ w.session_id }}?from={{ start.isoformat() }}&to={{ end.isoformat() }}">
+      <h3><a href="{{ request.script_root }}/?date={{ w.week_start }}">{{ w.session_id }}</a>
+        <span class="muted">{{ w.week_start }} → {{ w.week_end }} · {{ w.event_count }} cuộc họp</span></h3>
+      <div class="body"><div class="placeholder">Đang chờ tải…</div></div>
+    </section>
+    {% endfor %}
+  </main>
+<script>
+  // Chỉ tải tuần khi sắp cuộn tới
+  function loadWeek(sec){
+    if(sec.dataset.loaded) return; sec.dataset.loaded='1';
+    fetch(sec.dataset.url).then(r=>r.ok?r.text():Promise.reject(r.status))
+      .then(html=>{ sec.querySelector('.body').innerHTML=html; })
+      .catch(()=>{ sec.querySelector('.body').innerHTML='<div class="placeholder">Không tải được tuần này.</div>'; delete sec.dataset.loaded; });
+  }
+  const weeks=document.querySelectorAll('.week');
+  if('IntersectionObserver' in window){
+    const io=new IntersectionObserver(entries=>entries.forEach(e=>{ if(e.isIntersecting){ io.unobserve(e.target); loadWeek(e.target); } }),{rootMargin:'300px 0px'});
+    weeks.forEach(w=>io.observe(w));
+  } else {
+    weeks.forEach(loadWeek);
+  }
+</script>
+</body>
+</html>
+"""
+
+TEMPLATE_RANGE_WEEK = """
+<div class="grid">
+  <div class="head">Buổi</div>
+  {% for d in dates %}<div class="head{% if d not in visible %} out{% endif %}">{{ weekdays[loop.index0] }}<br><span class="muted">{{ d.strftime('%d.%m') }}</span></div>{% endfor %}
+  {% for buoi in ['SÁNG','CHIỀU'] %}
+    <div class="buoi">{{ buoi }}</div>
+    {% for d in dates %}
+    <div{% if d not in visible %} class="out"{% endif %}>
+      {% if d in visible %}
+      {% for ev in schedule.get(d.isoformat(), {}).get(buoi, []) %}
+        <div class="chip" style="background:{{ chair_colors.get(ev.chair, '#f3f4f6') }}" title="{{ ev.attendees }}">
+          <b>{{ ev.start_time }}–{{ ev.end_time }} {{ ev.title }}</b>
+          {% if ev.chair %}{{ ev.chair }}{% endif %}{% if ev.location %} · {{ ev.location }}{% endif %}
+          {% if ev.conflict or ev.attendees_conflict or ev.location_conflict %}<span class="warn">⚠</span>{% endif %}
+        </div>
+      {% endfor %}
+      {% endif %}
+    </div>
+    {% endfor %}
+  {% endfor %}
+</div>
+"""
+
+
+TEMPLATE_ANALYTICS = """
+<!doctype html>
+<html lang="vi">
+<head>
+  <meta charset="utf-8">
+  <title>Thống kê sử dụng {{ report.from }} → {{ report.to }} – {{ company }}</title>
+  <meta name="viewport" content="width=device-width, initial-scale=1" />
+  <style>
+    :root{--bg:#f5f7fb;--surface:#fff;--text:#1f2937;--muted:#6b7280;--border:#e5e7eb;--primary:#2563eb;--warn:#b45309}
+    *{box-sizing:border-box}
+    body{margin:0;background:var(--bg);color:var(--text);font:14px/1.45 ui-sans-serif,system-ui,-apple-system,Segoe UI,Roboto,Helvetica,Arial}
+    a{color:inherit;text-decoration:none}
+    .header{background:var(--surface);border-bottom:1px solid var(--border);display:flex;flex-wrap:wrap;align-items:center;gap:12px;
+      padding:10px 18px;position:sticky;top:0;z-index:30}
+    .header form{display:flex;gap:8px;align-items:center;margin-left:auto}
+    input,button,select{font:inherit;border:1px solid var(--border);border-radius:8px;padding:8px 10px;background:#fff}
+    button.primary{background:var(--primary);border-color:transparent;color:#fff}
+    .pill{border:1px solid var(--border);background:var(--surface);padding:8px 10px;border-radius:999px}
+    .muted{color:var(--muted)}
+    .cards{padding:16px;display:grid;gap:16px;grid-template-columns:repeat(auto-fit,minmax(320px,1fr))}
+    .card{background:var(--surface);border:1px solid var(--border);border-radius:12px;padding:12px 14px;overflow:auto}
+    .card.wide{grid-column:1/-1}
+    .card h3{margin:0 0 8px;font-size:15px}
+    table{border-collapse:collapse;width:100%}
+    th,td{border-bottom:1px solid #f3f4f6;padding:4px 6px;text-align:left}
+    td.num,th.num{text-align:right}
+    .bar{height:8px;background:var(--primary);border-radius:4px;opacity:.7}
+    .warn{color:var(--warn);font-weight:700}
+    .heat td{text-align:center;min-width:26px;font-size:12px}
+  </style>
+</head>
+<body>
+  <header class="header">
+    <a class="pill" href="{{ request.script_root }}/">🏠 Trang chủ</a>
+    <b>📈 Thống kê sử dụng</b>
+    <span class="muted">{{ report.totals.events }} cuộc họp · {{ report.totals.hours }} giờ · tính trong {{ report.elapsed_ms }} ms</span>
+    <form method="get" action="{{ request.script_root }}/analytics">
+      <input type="date" name="from" value="{{ report.from }}">
+      <input type="date" name="to" value="{{ report.to }}">
+      <select name="group">
+        {% for g, label in [("week", "Theo tuần"), ("month", "Theo tháng"), ("year", "Theo năm")] %}
+        <option value="{{ g }}" {% if report.group == g %}selected{% endif %}>{{ label }}</option>
+        {% endfor %}
+      </select>
+      <button class="primary" type="submit">Xem</button>
+    </form>
+  </header>
+  <main class="cards">
+    <section class="card wide">
+      <h3>Theo kỳ</h3>
+      <table>
+        <tr><th>Kỳ</th><th class="num">Cuộc họp</th><th class="num">Giờ</th><th class="num">Tỉ lệ cảnh báo</th><th>Trùng giờ / thành phần / địa điểm</th></tr>
+        {% for p in report.periods %}
+        <tr><td>{{ p.period }}</td><td class="num">{{ p.events }}</td><td class="num">{{ p.hours }}</td>
+          <td class="num {% if p.conflict_rate > 0.2 %}warn{% endif %}">{{ (p.conflict_rate * 100)|round(1) }}%</td>
+          <td class="muted">{{ p.conflicts.time }} / {{ p.conflicts.attendees }} / {{ p.conflicts.location }}</td></tr>
+        {% else %}
+        <tr><td colspan="5" class="muted">Không có cuộc họp trong khoảng này.</td></tr>
+        {% endfor %}
+      </table>
+    </section>
+    {% for title, rows in [("Phòng họp (giờ)", report.totals.rooms), ("Chủ trì (giờ)", report.totals.chairs), ("Thành phần tham dự (giờ)", report.totals.attendees)] %}
+    <section class="card">
+      <h3>{{ title }}</h3>
+      <table>
+        {% set top = rows[0].hours if rows else 1 %}
+        {% for r in rows %}
+        <tr><td>{{ r.name }}</td><td class="num">{{ r.hours }}</td><td style="width:40%"><div class="bar" style="width:{{ (100 * r.hours / top)|round(1) }}%"></div></td></tr>
+        {% else %}
+        <tr><td class="muted">Chưa có dữ liệu.</td></tr>
+        {% endfor %}
+      </table>
+    </section>
+    {% endfor %}
+    <section class="card">
+      <h3>Số cuộc họp theo loại</h3>
+      <table>
+        {% for name, count in report.totals.categories.items() %}
+        <tr><td>{{ name or "(Không phân loại)" }}</td><td class="num">{{ count }}</td></tr>
+        {% endfor %}
+      </table>
+    </section>
+    <section class="card wide">
+      <h3>Giờ cao điểm <span class="muted">(số cuộc họp diễn ra trong từng giờ)</span></h3>
+      {% set peak = report.totals.heatmap|map('max')|max or 1 %}
+      <table class="heat">
+        <tr><th></th>{% for h in hours %}<th>{{ h }}h</th>{% endfor %}</tr>
+        {% for d in range(7) %}
+        <tr><th>{{ weekday_labels[d] }}</th>
+          {% for h in hours %}{% set v = report.totals.heatmap[d][h] %}
+          <td style="background:rgba(37,99,235,{{ (v / peak * 0.85)|round(2) }});{% if v / peak > 0.5 %}color:#fff{% endif %}">{{ v or "" }}</td>
+          {% endfor %}</tr>
+        {% endfor %}
+      </table>
+    </section>
+  </main>
+</body>
+</html>
+"""
+
+TEMPLATE_AGENDA = """
+<!doctype html>
+<html lang="vi">
+<head>
+  <meta charset="utf-8">
+  <title>Lịch của {{ agenda.person.name }} – {{ company }}</title>
+  <meta name="viewport" content="width=device-width, initial-scale=1" />
+  <style>
+    :root{--bg:#f5f7fb;--surface:#fff;--text:#1f2937;--muted:#6b7280;--border:#e5e7eb;--primary:#2563eb;--warn:#b45309}
+    *{box-sizing:border-box}
+    body{margin:0;background:var(--bg);color:var(--text);font:14px/1.45 ui-sans-serif,system-ui,-apple-system,Segoe UI,Roboto,Helvetica,Arial}
+    a{color:inherit;text-decoration:none}
+    .header{background:var(--surface);border-bottom:1px solid var(--border);display:flex;flex-wrap:wrap;align-items:center;gap:12px;
+      padding:10px 18px;position:sticky;top:0;z-index:30}
+    .header form{display:flex;gap:8px;align-items:center;margin-left:auto}
+    input,button{font:inherit;border:1px solid var(--border);border-radius:8px;padding:8px 10px;background:#fff}
+    button.primary{background:var(--primary);border-color:transparent;color:#fff}
+    .pill{border:1px solid var(--border);background:var(--surface);padding:8px 10px;border-radius:999px}
+    .pill.off{opacity:.4;pointer-events:none}
+    .muted{color:var(--muted)}
+    .days{padding:16px;display:grid;gap:12px;max-width:900px;margin:0 auto}
+    .day{background:var(--surface);border:1px solid var(--border);border-radius:12px}
+    .day h3{margin:0;padding:8px 14px;border-bottom:1px solid var(--border);background:#fafafa;font-size:15px}
+    .item{display:flex;gap:12px;padding:8px 14px;border-bottom:1px solid #f3f4f6}
+    .item:last-child{border-bottom:0}
+    .item .time{min-width:110px;font-weight:700}
+    .item.clash{background:#fff7ed;box-shadow:inset 3px 0 0 var(--warn)}
+    .tag{font-size:12px;border-radius:999px;padding:1px 8px;background:#eef2ff}
+    .warn{color:var(--warn);font-weight:700}
+    .pager{display:flex;justify-content:space-between;max-width:900px;margin:0 auto 24px;padding:0 16px}
+  </style>
+</head>
+<body>
+  <header class="header">
+    <a class="pill" href="{{ request.script_root }}/">🏠 Trang chủ</a>
+    <b>👤 {{ agenda.person.name }}</b>
+    <span class="muted">{{ agenda.count }} cuộc họp{% if agenda.conflicts %} · <span class="warn">{{ agenda.conflicts }} bị trùng lịch</span>{% endif %}</span>
+    <form method="get" action="{{ request.script_root }}/me">
+      <input name="name" placeholder="Tên / chức danh…" value="{{ role }}">
+      <button class="primary" type="submit">Xem lịch</button>
+    </form>
+  </header>
+  <main class="days">
+    {% for date, items in agenda.events|groupby('date') %}
+    {% set d = parse_date(date) %}
+    <section class="day">
+      <h3>{{ weekday_labels[d.weekday()] }}, {{ d.strftime('%d/%m/%Y') }} <a class="muted" href="{{ request.script_root }}/?date={{ date }}">· tuần {{ items[0].session_id }}</a></h3>
+      {% for ev in items %}
+      <div class="item{% if ev.conflicts_with %} clash{% endif %}">
+        <div class="time">{{ ev.start_time }}–{{ ev.end_time }}</div>
+        <div>
+          <b>{{ ev.title }}</b>
+          <span class="tag" style="background:{{ chair_colors.get(ev.chair, '#eef2ff') }}">{{ "Chủ trì" if ev.role == "chair" else "Tham dự" }}</span>
+          <div class="muted">{% if ev.chair %}Chủ trì: {{ ev.chair }}{% endif %}{% if ev.location %} · {{ ev.location }}{% endif %}</div>
+          {% for c in ev.conflicts_with %}<div class="warn">⚠ Trùng với {{ c.label }}</div>{% endfor %}
+        </div>
+      </div>
+      {% endfor %}
+    </section>
+    {% else %}
+    <div class="muted" style="text-align:center;padding:40px">Không có cuộc họp nào.</div>
+    {% endfor %}
+  </main>
+  <nav class="pager">
+    <a class="pill{% if not agenda.prev_cursor %} off{% endif %}" href="?before={{ agenda.prev_cursor or '' }}">◀ Trước đó</a>
+    <a class="pill{% if not agenda.next_cursor %} off{% endif %}" href="?after={{ agenda.next_cursor or '' }}">Tiếp theo ▶</a>
+  </nav>
+</body>
+</html>
+"""
+
+# Thư viện client: IndexedDB (1 CSDL mỗi chi nhánh) + đồng bộ qua /api/sync. Dùng chung cho trang chủ và /offline.
+OFFLINE_JS = """
+const LichOffline = (() => {
+  const script = document.currentScript;
+  const ROOT = script ? (script.dataset.root || '') : '';
+  const WEEKS_BACK = {{ weeks_back }}, WEEKS_AHEAD = {{ weeks_ahead }};
+  const DB_NAME = 'lichhop' + ROOT;
+
+  const done = r => new Promise((ok, err) => { r.onsuccess = () => ok(r.result); r.onerror = () => err(r.error); });
+  const finished = t => new Promise((ok, err) => { t.oncomplete = () => ok(); t.onerror = t.onabort = () => err(t.error); });
+
+  function open() {
+    const r = indexedDB.open(DB_NAME, 1);
+    r.onupgradeneeded = () => {
+      const db = r.result;
+      db.createObjectStore('events', {keyPath: 'id'}).createIndex('session_id', 'session_id');
+      db.createObjectStore('meta');
+    };
+    return done(r);
+  }
+
+  async function getJSON(url) {
+    const r = await fetch(ROOT + url, {headers: {'Accept': 'application/json'}, cache: 'no-store'});
+    if (!r.ok) throw new Error(url + ': ' + r.status);
+    return r.json();
+  }
+
+  const isoDay = d => d.toISOString().slice(0, 10);
+
+  async function fullLoad(db) {
+    // Lấy phiên bản TRƯỚC khi tải: thay đổi xảy ra trong lúc tải sẽ được /api/sync phát lại (áp dụng lại vô hại)
+    const {version} = await getJSON('/api/sync');
+    const now = Date.now(), day = 86400000;
+    const from = isoDay(new Date(now - WEEKS_BACK * 7 * day)), to = isoDay(new Date(now + WEEKS_AHEAD * 7 * day));
+    const events = [];
+    let cursor = '';
+    do {
+      const page = await getJSON(`/api/events?from=${from}&to=${to}&limit=500` + (cursor ? '&cursor=' + encodeURIComponent(cursor) : ''));
+      events.push(...page.events);
+      cursor = page.next_cursor;
+    } while (cursor);
+    const t = db.transaction(['events', 'meta'], 'readwrite');
+    t.objectStore('events').clear();
+    events.forEach(ev => t.objectStore('events').put(ev));
+    t.objectStore('meta').put(version, 'version');
+    t.objectStore('meta').put(new Date().toISOString(), 'synced_at');
+    await finished(t);
+    return {full: true, events: events.length, version};
+  }
+
+  async function applyChanges(db, feed) {
+    const t = db.transaction(['events', 'meta'], 'readwrite');
+    const store = t.objectStore('events');
+    for (const c of feed.changes) {
+      if (c.op === 'upsert') store.put({...c.event, session_id: c.session_id});
+      else if (c.op === 'delete') store.delete(c.id);
+      else if (c.op === 'clear') {
+        const keys = await done(store.index('session_id').getAllKeys(c.session_id));
+        keys.forEach(k => store.delete(k));
+      }
+    }
+    t.objectStore('meta').put(feed.version, 'version');
+    t.objectStore('meta').put(new Date().toISOString(), 'synced_at');
+    await finished(t);
+  }
+
+  async function sync() {
+    const db = await open();
+    let since = await done(db.transaction('meta').objectStore('meta').get('version'));
+    if (since === undefined) return fullLoad(db);
+    let applied = 0;
+    for (;;) {
+      const feed = await getJSON('/api/sync?since=' + since);
+      if (feed.reset) return fullLoad(db);
+      await applyChanges(db, feed);
+      applied += feed.changes.length;
+      since = feed.version;
+      if (!feed.more) return {full: false, changes: applied, version: since};
+    }
+  }
+
+  async function snapshot() {
+    const db = await open();
+    const t = db.transaction(['events', 'meta']);
+    const [events, version, syncedAt] = await Promise.all([
+      done(t.objectStore('events').getAll()), done(t.objectStore('meta').get('version')),
+      done(t.objectStore('meta').get('synced_at'))]);
+    return {events, version, syncedAt};
+  }
+
+  return {sync, snapshot, root: ROOT};
+})();
+"""
+
+SERVICE_WORKER_JS = """
+// Service worker: giữ sẵn trang /offline + offline.js; mất mạng khi mở trang bất kỳ -> trả về /offline
+const ROOT = {{ root|tojson }};
+const CACHE = 'lichhop' + ROOT + '-' + {{ build|tojson }};
+const SHELL = [ROOT + '/offline', ROOT + '/offline.js'];
+
+self.addEventListener('install', e => {
+  e.waitUntil(caches.open(CACHE).then(c => c.addAll(SHELL)).then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', e => {
+  e.waitUntil(caches.keys()
+    .then(keys => Promise.all(keys.filter(k => k.startsWith('lichhop' + ROOT + '-') && k !== CACHE).map(k => caches.delete(k))))
+    .then(() => self.clients.claim()));
+});
+
+self.addEventListener('fetch', e => {
+  const req = e.request;
+  if (req.method !== 'GET') return;
+  if (req.mode === 'navigate') {
+    e.respondWith(fetch(req).catch(() => caches.match(ROOT + '/offline')));
+    return;
+  }
+  const path = new URL(req.url).pathname;
+  if (SHELL.includes(path)) {
+    // Mạng trước (bản mới nhất), lỗi mạng thì dùng bản đã lưu
+    e.respondWith(fetch(req).then(r => {
+      const copy = r.clone();
+      caches.open(CACHE).then(c => c.put(req, copy));
+      return r;
+    }).catch(() => caches.match(req)));
+  }
+});
+"""
+
+TEMPLATE_OFFLINE = """
+<!doctype html>
+<html lang="vi">
+<head>
+  <meta charset="utf-8">
+  <title>Lịch họp (offline) – {{ company }}</title>
+  <meta name="viewport" content="width=device-width, initial-scale=1" />
+  <style>
+    body{margin:0;padding:16px;background:#f8fafc;color:#1f2937;
+      font:14px/1.45 ui-sans-serif,system-ui,-apple-system,Segoe UI,Roboto,Helvetica,Arial}
+    h1{margin:0 0 4px;font-size:20px}
+    .muted{color:#6b7280}
+    .bar{display:flex;gap:8px;align-items:center;flex-wrap:wrap;margin:10px 0}
+    .pill{display:inline-block;padding:4px 10px;border:1px solid #d1d5db;border-radius:999px;background:#fff;color:inherit;text-decoration:none;cursor:pointer}
+    .grid{display:grid;grid-template-columns:80px repeat(6,minmax(0,1fr));gap:4px}
+    .grid>div{background:#fff;border:1px solid #e5e7eb;border-radius:6px;padding:6px;min-height:40px}
+    .head{font-weight:700;text-align:center;background:#4ade80 !important}
+    .buoi{font-weight:800;display:flex;align-items:center;justify-content:center}
+    .chip{border-radius:6px;padding:4px 6px;margin-bottom:4px;background:#f3f4f6}
+    #state.off{color:#b91c1c;font-weight:700}
+  </style>
+</head>
+<body>
+  <h1>LỊCH HỌP {{ company|upper }}</h1>
+  <div class="muted"><span id="state"></span> · <span id="synced"></span></div>
+  <div class="bar">
+    <button class="pill" id="prev">◀</button>
+    <select id="week"></select>
+    <button class="pill" id="next">▶</button>
+    <button class="pill" id="sync">🔄 Đồng bộ</button>
+    <a class="pill" href="{{ request.script_root }}/">🏠 Trang chủ</a>
+  </div>
+  <div id="grid" class="grid"></div>
+
+  <script src="{{ request.script_root }}/offline.js" data-root="{{ request.script_root }}"></script>
+  <script>
+  const CHAIR_COLORS={{ chair_colors|tojson }}, DAYS=['Thứ 2','Thứ 3','Thứ 4','Thứ 5','Thứ 6','Thứ 7'];
+  const $=id=>document.getElementById(id);
+  const esc=s=>String(s||'').replace(/[&<>"']/g,c=>({'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;',"'":'&#39;'}[c]));
+  let byWeek={};
+
+  function isoWeekId(d){
+    const t=new Date(Date.UTC(d.getFullYear(),d.getMonth(),d.getDate()));
+    const day=t.getUTCDay()||7; t.setUTCDate(t.getUTCDate()+4-day);
+    const y=t.getUTCFullYear(), w=Math.ceil(((t-Date.UTC(y,0,1))/86400000+1)/7);
+    return y+'-W'+String(w).padStart(2,'0');
+  }
+
+  function render(){
+    const sid=$('week').value, events=byWeek[sid]||[];
+    const dates=[...new Set(events.map(e=>e.date))].sort();
+    const monday=dates.length?new Date(dates[0]+'T00:00:00'):new Date();
+    monday.setDate(monday.getDate()-((monday.getDay()+6)%7));
+    const days=DAYS.map((_,i)=>{const d=new Date(monday); d.setDate(d.getDate()+i); return d;});
+    const iso=d=>d.getFullYear()+'-'+String(d.getMonth()+1).padStart(2,'0')+'-'+String(d.getDate()).padStart(2,'0');
+    let html='<div class="head">Buổi</div>'+days.map((d,i)=>`<div class="head">${DAYS[i]}<br><span class="muted">${d.toLocaleDateString('vi-VN')}</span></div>`).join('');
+    for(const buoi of ['SÁNG','CHIỀU']){
+      html+=`<div class="buoi">${buoi}</div>`;
+      for(const d of days){
+        const cell=events.filter(e=>e.date===iso(d)&&e.session_buoi===buoi).sort((a,b)=>a.start_time.localeCompare(b.start_time));
+        html+='<div>'+(cell.map(e=>`<div class="chip" style="background:${esc(CHAIR_COLORS[e.chair]||'#f3f4f6')}">`+
+          `<b>${esc(e.start_time)}–${esc(e.end_time)} ${esc(e.title)}</b><br>${esc(e.chair)}${e.location?' · '+esc(e.location):''}`+
+          (e.attendees?`<div class="muted">${esc(e.attendees)}</div>`:'')+'</div>').join('')||'<span class="muted">—</span>')+'</div>';
+      }
+    }
+    $('grid').innerHTML=html;
+  }
+
+  async function load(){
+    const snap=await LichOffline.snapshot();
+    byWeek={};
+    snap.events.forEach(e=>(byWeek[e.session_id]=byWeek[e.session_id]||[]).push(e));
+    const weeks=Object.keys(byWeek).sort(), current=$('week').value||isoWeekId(new Date());
+    if(!weeks.includes(current)) weeks.push(current), weeks.sort();
+    $('week').innerHTML=weeks.map(w=>`<option${w===current?' selected':''}>${w}</option>`).join('');
+    $('synced').textContent=snap.syncedAt?'Đồng bộ lúc '+new Date(snap.syncedAt).toLocaleString('vi-VN')+' (phiên bản '+snap.version+')':'Chưa có dữ liệu offline';
+    render();
+  }
+
+  async function sync(){
+    $('state').textContent=navigator.onLine?'Đang đồng bộ…':'Offline';
+    $('state').className=navigator.onLine?'':'off';
+    try{
+      const r=await LichOffline.sync();
+      $('state').textContent=r.full?`Đã tải ${r.events} cuộc họp`:`Cập nhật ${r.changes} thay đổi`;
+    }catch(e){
+      $('state').textContent='Offline – đang xem dữ liệu đã lưu'; $('state').className='off';
+    }
+    await load();
+  }
+
+  $('week').onchange=render;
+  $('prev').onclick=()=>{ if($('week').selectedIndex>0){ $('week').selectedIndex--; render(); } };
+  $('next').onclick=()=>{ if($('week').selectedIndex<$('week').options.length-1){ $('week').selectedIndex++; render(); } };
+  $('sync').onclick=sync;
+  window.addEventListener('online',sync);
+  window.addEventListener('offline',()=>{ $('state').textContent='Offline'; $('state').className='off'; });
+  load().then(sync);
+  </script>
+</body>
+</html>
+"""
 
 # ========== MAIN ==========
+STARTUP["imported"] = time.time()
+if os.environ.get("WARM_START") == "1":
+    warm_up()
+
 if __name__ == "__main__":
     ensure_data_file()
     app.run(debug=True, host="0.0.0.0", port=5000)
\ No newline at end of file
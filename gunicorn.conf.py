@@ -0,0 +1,16 @@
+# Cấu hình gunicorn: nạp app 1 lần ở master (preload_app), warm-up rồi mới fork worker
+# -> các worker dùng chung dữ liệu/chỉ mục/template đã nạp (copy-on-write) và phản hồi ngay request đầu tiên.
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+# Số luồng mỗi worker chỉ đặt ở đây. app.py đọc lại GUNICORN_THREADS để chia luồng cho các nhóm
+# heavy / sse / interactive (xem KIỂM SOÁT TẢI), nên giá trị được ghi ngược vào môi trường trước khi nạp app.
+os.environ.setdefault("GUNICORN_THREADS", "12")
+threads = int(os.environ["GUNICORN_THREADS"])
+workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+preload_app = True
+
+
+def when_ready(server):
+    from app import warm_up
+    warm_up()
@@ -0,0 +1,44 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Cấu hình trước khi import app: không gửi nhắc lịch, không xuất bản trang tĩnh, có token admin
+os.environ.setdefault("REMINDER_SINK", "off")
+os.environ.setdefault("PUBLISH_DIR", "")
+os.environ.setdefault("ADMIN_TOKEN", "test-token")
+os.environ.setdefault("PROFILE_DIR", tempfile.mkdtemp())
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as scheduler  # noqa: E402
+
+ADMIN = {"X-Admin-Token": os.environ["ADMIN_TOKEN"]}
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    # Mỗi test: thư mục dữ liệu riêng + bộ cache chi nhánh mới (không dùng chung chỉ mục/snapshot giữa các test)
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    for name, filename in (("DATA_PATH", "meeting_schedule.json"), ("REGISTRY_PATH", "registry.json"),
+                           ("BROKER_PATH", "changes.log"), ("SNAPSHOT_PATH", "snapshot.bin"),
+                           ("AUDIT_CACHE_PATH", "audit_cache.json"), ("REMINDER_STATE_PATH", "reminders_sent.json"),
+                           ("REMINDER_LOG_PATH", "reminders.log"), ("SYNC_LOG_PATH", "sync.log")):
+        monkeypatch.setattr(scheduler, name, str(data_dir / filename))
+    monkeypatch.setattr(scheduler, "TENANTS_DIR", str(data_dir / "tenants"))
+    monkeypatch.setattr(scheduler, "tenants", scheduler.TenantCache())
+    scheduler._schedule_cache.clear()
+    scheduler._current_tenant.set(None)
+    yield scheduler
+    for tenant in scheduler.tenants.loaded.values():
+        tenant.close()
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+def make_event(date="2025-09-02", start="08:00", end="09:00", title="Họp giao ban", **extra):
+    return {"date": date, "start_time": start, "end_time": end, "title": title, "chair": "CEO", **extra}
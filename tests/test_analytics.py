@@ -0,0 +1,46 @@
+from conftest import make_event
+
+
+def test_analytics_counts_only_days_inside_range(client):
+    for date in ("2025-09-29", "2025-10-01", "2025-10-07", "2025-10-20"):
+        assert client.post("/event", data=make_event(date=date, title=f"Họp {date}")).status_code == 302
+
+    report = client.get("/api/analytics?from=2025-09-30&to=2025-10-15&group=month").get_json()
+    assert report["totals"]["events"] == 2
+    assert [(p["period"], p["events"]) for p in report["periods"]] == [("2025-10", 2)]
+
+    weekly = client.get("/api/analytics?from=2025-09-30&to=2025-10-15&group=week").get_json()
+    assert [(p["period"], p["events"]) for p in weekly["periods"]] == [("2025-W40", 1), ("2025-W41", 1)]
+
+    year = client.get("/api/analytics?from=2025-01-01&to=2025-12-31&group=year").get_json()
+    assert [(p["period"], p["events"]) for p in year["periods"]] == [("2025", 4)]
+
+
+def test_analytics_hours_by_room_chair_and_category(client):
+    for start, end, chair, room, category in (("08:00", "09:30", "CEO", "Phòng 1", "Nội bộ"),
+                                              ("10:00", "11:00", "CFO", "Phòng 1", "Đối ngoại"),
+                                              ("14:00", "16:00", "CEO", "Phòng 2", "Nội bộ")):
+        client.post("/event", data={**make_event(start=start, end=end, title=f"Họp {start}"),
+                                    "chair": chair, "location": room, "category": category})
+
+    totals = client.get("/api/analytics?from=2025-09-01&to=2025-09-07").get_json()["totals"]
+    assert totals["hours"] == 4.5
+    assert [(r["name"], r["hours"]) for r in totals["rooms"]] == [("Phòng 1", 2.5), ("Phòng 2", 2.0)]
+    assert [(c["name"], c["hours"]) for c in totals["chairs"]] == [("CEO", 3.5), ("CFO", 1.0)]
+    assert totals["categories"] == {"Nội bộ": 2, "Đối ngoại": 1}
+
+
+def test_analytics_recomputes_only_changed_week(app_module, client):
+    client.post("/event", data=make_event(date="2025-09-02", title="Tuần 36"))
+    client.post("/event", data=make_event(date="2025-09-09", title="Tuần 37"))
+    assert client.get("/api/analytics?from=2025-09-01&to=2025-09-14").get_json()["totals"]["events"] == 2
+    rollups = next(iter(app_module.tenants.loaded.values())).analytics_rollups
+    w36, w37 = (app_module.session_id_from_date(app_module.dt.date(2025, 9, d)) for d in (2, 9))
+    before = dict(rollups.weeks)
+
+    client.post("/event", data=make_event(date="2025-09-10", start="10:00", end="12:00", title="Thêm"))
+    report = client.get("/api/analytics?from=2025-09-01&to=2025-09-14").get_json()
+    assert report["totals"]["events"] == 3 and report["totals"]["hours"] == 4.0
+    assert [(p["period"], p["events"]) for p in report["periods"]] == [(w36, 1), (w37, 2)]
+    assert rollups.weeks[w36] is before[w36]  # Tuần không đổi: giữ nguyên bản tổng hợp cũ
+    assert rollups.weeks[w37] is not before[w37]
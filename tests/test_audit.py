@@ -0,0 +1,16 @@
+from conftest import ADMIN, make_event
+
+
+def test_conflict_audit_requires_admin_and_uses_cache(client):
+    client.post("/event", data={**make_event(title="Họp A"), "location": "Phòng 1"})
+    client.post("/event", data={**make_event(start="08:30", end="09:30", title="Họp B"), "location": "Phòng 1"})
+
+    assert client.get("/api/audit/conflicts").status_code == 403
+    assert client.get("/api/audit/conflicts?workers=64").status_code == 403
+
+    first = client.get("/api/audit/conflicts", headers=ADMIN).get_json()
+    assert first["totals"]["time"] == 1
+    assert first["recomputed"] == 1 and "workers" not in first
+    again = client.get("/api/audit/conflicts", headers=ADMIN).get_json()
+    assert again["recomputed"] == 0 and again["cached"] == 1
+    assert again["totals"] == first["totals"]
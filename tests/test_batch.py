@@ -0,0 +1,45 @@
+from conftest import make_event
+
+
+def events_by_title(client):
+    return {ev["title"]: ev for ev in client.get("/api/events").get_json()["events"]}
+
+
+def test_batch_with_an_invalid_operation_changes_nothing(app_module, client):
+    client.post("/event", data=make_event(title="Có sẵn"))
+    existing = events_by_title(client)["Có sẵn"]
+    with open(app_module.DATA_PATH, "rb") as f:
+        before = f.read()
+
+    r = client.post("/api/events:batch", json={"operations": [
+        {"op": "create", "event": make_event(date="2025-09-10", title="Mới")},
+        {"op": "update", "id": existing["id"], "event": {"title": "Đã sửa"}},
+        {"op": "delete", "id": "khong-ton-tai"},
+    ]})
+    assert r.status_code == 422
+    body = r.get_json()
+    assert body["committed"] is False
+    assert [res["ok"] for res in body["results"]] == [True, True, False]
+    with open(app_module.DATA_PATH, "rb") as f:
+        assert f.read() == before
+    assert set(events_by_title(client)) == {"Có sẵn"}
+
+
+def test_batch_commits_every_operation_in_one_write(app_module, client):
+    client.post("/event", data=make_event(title="Dời tuần"))
+    client.post("/event", data=make_event(start="10:00", end="11:00", title="Xoá"))
+    titles = events_by_title(client)
+    latest_before = client.get("/api/sync").get_json()["version"]
+
+    r = client.post("/api/events:batch", json={"operations": [
+        {"op": "create", "event": make_event(date="2025-09-03", start="14:00", end="15:00", title="Mới")},
+        {"op": "update", "id": titles["Dời tuần"]["id"], "event": {"date": "2025-09-10"}},
+        {"op": "delete", "id": titles["Xoá"]["id"]},
+    ]})
+    assert r.status_code == 200 and r.get_json()["committed"] is True
+    assert set(r.get_json()["versions"]) == {"2025-W36", "2025-W37"}
+
+    after = events_by_title(client)
+    assert set(after) == {"Mới", "Dời tuần"}
+    assert after["Dời tuần"]["date"] == "2025-09-10"
+    assert client.get("/api/sync").get_json()["version"] > latest_before
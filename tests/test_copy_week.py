@@ -0,0 +1,59 @@
+import datetime as dt
+
+import pytest
+
+from conftest import make_event
+
+
+def week_events(client, monday):
+    saturday = (dt.date.fromisoformat(monday) + dt.timedelta(days=5)).isoformat()
+    events = client.get("/api/events").get_json()["events"]
+    return {ev["title"]: ev for ev in events if monday <= ev["date"] <= saturday}
+
+
+@pytest.fixture
+def weeks(client):
+    # Tuần nguồn W36: A, B. Tuần đích W37 đã có bản trùng của A (khác phòng) và X.
+    client.post("/event", data={**make_event(title="A"), "location": "Phòng 1"})
+    client.post("/event", data=make_event(start="10:00", end="11:00", title="B"))
+    client.post("/event", data={**make_event(date="2025-09-09", title="A"), "location": "Phòng 2"})
+    client.post("/event", data=make_event(date="2025-09-11", title="X"))
+    return client
+
+
+def copy(client, policy, **extra):
+    r = client.post("/copy-week", json={"source_session_id": "2025-W36", "target_dates": ["2025-09-09"],
+                                        "policy": policy, **extra})
+    assert r.status_code == 200, r.get_data(as_text=True)
+    return r.get_json()
+
+
+def test_dry_run_reports_without_writing(weeks):
+    report = copy(weeks, "skip", dry_run=True)
+    assert (report["totals"]["added"], report["totals"]["skipped"]) == (1, 1)
+    assert set(week_events(weeks, "2025-09-08")) == {"A", "X"}
+
+
+@pytest.mark.parametrize("policy, titles, a_room", [
+    ("skip", {"A", "B", "X"}, "Phòng 2"),
+    ("merge", {"A", "B", "X"}, "Phòng 1"),
+    ("overwrite", {"A", "B"}, "Phòng 1"),
+])
+def test_copy_policies(weeks, policy, titles, a_room):
+    report = copy(weeks, policy)
+    assert report["totals"]["invalid"] == 0
+    target = week_events(weeks, "2025-09-08")
+    assert set(target) == titles
+    assert target["A"]["location"] == a_room
+    assert target["B"]["date"] == "2025-09-09"
+    assert set(week_events(weeks, "2025-09-01")) == {"A", "B"}  # Tuần nguồn giữ nguyên
+
+
+def test_copy_fans_out_to_many_weeks(weeks):
+    r = weeks.post("/copy-week", json={"source_session_id": "2025-W36", "target_dates": ["2025-09-15"],
+                                       "range_to": "2025-09-29", "policy": "skip"})
+    report = r.get_json()
+    assert [w["session_id"] for w in report["weeks"]] == ["2025-W38", "2025-W39", "2025-W40"]
+    assert report["totals"]["added"] == 6
+    for monday in ("2025-09-15", "2025-09-22", "2025-09-29"):
+        assert set(week_events(weeks, monday)) == {"A", "B"}
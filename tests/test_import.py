@@ -0,0 +1,37 @@
+import io
+
+from conftest import make_event
+
+ICS = """BEGIN:VCALENDAR
+BEGIN:VEVENT
+UID:ics-utc-1
+DTSTART:20250902T010000Z
+DTEND:20250902T023000Z
+SUMMARY:Họp từ Google Calendar
+END:VEVENT
+END:VCALENDAR
+"""
+
+
+def stored_events(app_module):
+    with app_module.app.test_request_context():
+        return {ev["id"]: ev for s in app_module.load_data()["sessions"] for ev in s["events"]}
+
+
+def test_ics_utc_times_are_stored_in_local_time(app_module, client):
+    r = client.post("/api/import", data={"file": (io.BytesIO(ICS.encode("utf-8")), "lich.ics")})
+    assert r.status_code == 200 and r.get_json()["imported"] == 1
+    ev = stored_events(app_module)["ics-utc-1"]
+    assert (ev["date"], ev["start_time"], ev["end_time"]) == ("2025-09-02", "08:00", "09:30")
+
+
+def test_ics_export_round_trips_through_import(app_module, client):
+    client.post("/event", data=make_event(start="08:00", end="09:00", title="Họp xuất ICS"))
+    sid = app_module.session_id_from_date(app_module.dt.date(2025, 9, 2))
+    ics = client.post(f"/export/{sid}/ics").get_data(as_text=True)
+    assert "DTSTART:20250902T010000Z" in ics
+
+    (event_id,) = stored_events(app_module)
+    client.post("/api/import", data={"file": (io.BytesIO(ics.encode("utf-8")), "lich.ics"), "on_duplicate": "update"})
+    ev = stored_events(app_module)[event_id]
+    assert (ev["start_time"], ev["end_time"]) == ("08:00", "09:00")
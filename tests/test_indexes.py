@@ -0,0 +1,43 @@
+from conftest import ADMIN, make_event
+
+
+def titles(response):
+    return sorted(ev["title"] for ev in response.get_json()["events"])
+
+
+def test_event_index_resyncs_after_alias_merge(client):
+    client.post("/event", data=make_event(title="Zed chủ trì", chair="Zed Person"))
+    client.post("/event", data={**make_event(start="10:00", end="11:00", title="Zed dự"), "attendees": "Zed Person"})
+    client.post("/event", data=make_event(start="13:00", end="14:00", title="CFO chủ trì", chair="CFO"))
+    assert titles(client.get("/api/events?chair=Zed Person")) == ["Zed chủ trì"]
+    assert titles(client.get("/api/events?attendee=CFO")) == ["CFO chủ trì"]
+
+    r = client.post("/api/registry/alias", json={"alias": "Zed Person", "name": "CFO"}, headers=ADMIN)
+    assert r.status_code == 200
+
+    # Không có lần ghi nào sau khi gộp: chỉ mục phải tự đánh lại theo epoch mới của danh mục
+    assert titles(client.get("/api/events?chair=Zed Person")) == ["CFO chủ trì", "Zed chủ trì"]
+    assert titles(client.get("/api/events?attendee=CFO")) == ["CFO chủ trì", "Zed chủ trì", "Zed dự"]
+    assert "Zed dự" in client.get("/me/CFO?from=2025-09-01&to=2025-09-07").get_data(as_text=True)
+
+
+def test_event_index_sees_writes_from_other_processes(app_module, client):
+    client.post("/event", data=make_event(title="Trước"))
+    assert titles(client.get("/api/events")) == ["Trước"]
+    # Ghi thẳng vào file như một worker khác: lần đọc sau phải thấy sự kiện mới
+    with app_module.app.test_request_context():
+        data = app_module.load_data()
+        sess = app_module.get_or_create_session(data, app_module.dt.date(2025, 9, 3))
+        app_module.upsert_event(sess, make_event(date="2025-09-03", title="Sau"))
+        app_module.write_atomic(app_module.DATA_PATH, app_module.json.dumps(data).encode("utf-8"))
+    assert titles(client.get("/api/events")) == ["Sau", "Trước"]
+
+
+def test_home_etag_changes_after_alias_merge(client):
+    client.post("/event", data=make_event(title="Zed chủ trì", chair="Zed Person"))
+    first = client.get("/?date=2025-09-02")
+    etag = first.headers["ETag"]
+    assert client.get("/?date=2025-09-02", headers={"If-None-Match": etag}).status_code == 304
+
+    client.post("/api/registry/alias", json={"alias": "Zed Person", "name": "CFO"}, headers=ADMIN)
+    assert client.get("/?date=2025-09-02", headers={"If-None-Match": etag}).status_code == 200
@@ -0,0 +1,30 @@
+from conftest import ADMIN
+
+
+def test_cpu_profile_is_serialized(app_module, client):
+    headers = {**ADMIN, "X-Profile": "cpu"}
+    assert app_module._cpu_profile_lock.acquire(blocking=False)
+    try:
+        assert client.get("/api/events", headers=headers).status_code == 409
+    finally:
+        app_module._cpu_profile_lock.release()
+
+    r = client.get("/api/events", headers=headers)
+    assert r.status_code == 200 and r.headers["X-Profile-Capture"]
+    assert not app_module._cpu_profile_lock.locked()
+
+
+def test_profile_needs_matching_admin_token(client):
+    r = client.get("/api/events", headers={"X-Admin-Token": "sai", "X-Profile": "cpu"})
+    assert r.status_code == 200 and "X-Profile-Capture" not in r.headers
+
+
+def test_profile_files_do_not_record_admin_token(app_module, client):
+    token = ADMIN["X-Admin-Token"]
+    r = client.get(f"/api/events?date=2025-09-02&admin_token={token}&_profile=all")
+    prefix = r.headers["X-Profile-Capture"]
+    for ext in (".cpu.txt", ".mem.txt"):
+        with open(app_module.os.path.join(app_module.PROFILE_DIR, prefix + ext), encoding="utf-8") as f:
+            head = f.readline()
+        assert head.startswith("GET /api/events?date=2025-09-02&_profile=all -> 200")
+        assert token not in head
@@ -0,0 +1,30 @@
+import datetime as dt
+import time
+
+import pytest
+
+
+@pytest.fixture
+def utc_host(monkeypatch):
+    # Server chạy giờ UTC (như Render) trong khi giờ họp lưu theo UTC+7
+    monkeypatch.setenv("TZ", "UTC")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_reminder_fires_lead_minutes_before_local_start(app_module, tmp_path, utc_host):
+    start = (dt.datetime.now(app_module.SCHEDULE_TZ) + dt.timedelta(hours=2)).replace(second=0, microsecond=0)
+    ev = {"id": "r1", "date": start.date().isoformat(), "start_time": start.strftime("%H:%M"), "end_time": "23:59",
+          "title": "Họp nhắc", "chair": "CEO"}
+    week = {"id": "w", "week_start": start.date().isoformat(), "week_end": start.date().isoformat(),
+            "version": 1, "events": [ev]}
+    sched = app_module.ReminderScheduler("", str(tmp_path / "state.json"), str(tmp_path / "data.json"))
+    sched.sync({"sessions": [week]})
+
+    fire = sched.pending[sched.key_of(ev)][0]
+    assert fire == start.timestamp() - app_module.REMINDER_LEAD_MINUTES * 60
+    assert abs(fire - (time.time() + 2 * 3600 - app_module.REMINDER_LEAD_MINUTES * 60)) < 120
+    assert sched.pop_due(time.time()) == []
+    assert [key for key, _, _ in sched.pop_due(fire)] == [sched.key_of(ev)]
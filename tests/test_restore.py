@@ -0,0 +1,78 @@
+import io
+
+import pytest
+
+from conftest import make_event
+
+
+def events(client):
+    return sorted((ev["title"], ev["id"]) for ev in client.get("/api/events").get_json()["events"])
+
+
+def restore(client, backup, policy, **form):
+    return client.post("/restore", data={"file": (io.BytesIO(backup), "backup.json"), "policy": policy, **form})
+
+
+@pytest.fixture
+def backed_up(client):
+    # Backup có A, B; sau đó A bị đổi tên thành "A sửa" và thêm C
+    client.post("/event", data=make_event(title="A"))
+    client.post("/event", data=make_event(start="10:00", end="11:00", title="B"))
+    backup = client.get("/backup/json").get_data()
+    a_id = dict(events(client))["A"]
+    client.post("/event", data={**make_event(title="A sửa"), "id": a_id})
+    client.post("/event", data=make_event(date="2025-09-03", title="C"))
+    return client, backup, a_id
+
+
+def test_merge_by_id_restores_changed_events_and_keeps_new_ones(backed_up):
+    client, backup, a_id = backed_up
+    stats = restore(client, backup, "merge_id").get_json()
+    assert (stats["updated"], stats["unchanged"], stats["created"], stats["deleted"]) == (1, 1, 0, 0)
+    titles = dict(events(client))
+    assert set(titles) == {"A", "B", "C"} and titles["A"] == a_id
+
+
+def test_replace_needs_confirmation_then_matches_backup(backed_up):
+    client, backup, a_id = backed_up
+    assert restore(client, backup, "replace").status_code == 400
+    assert {t for t, _ in events(client)} == {"A sửa", "B", "C"}
+
+    stats = restore(client, backup, "replace", confirm="1").get_json()
+    assert (stats["updated"], stats["deleted"]) == (1, 1)
+    assert {t for t, _ in events(client)} == {"A", "B"}
+
+
+def test_merge_by_content_skips_duplicates_and_renumbers_clashing_ids(backed_up):
+    client, backup, a_id = backed_up
+    stats = restore(client, backup, "merge_content").get_json()
+    assert (stats["created"], stats["duplicates"]) == (1, 1)
+    restored = events(client)
+    assert [t for t, _ in restored] == ["A", "A sửa", "B", "C"]
+    assert dict(restored)["A"] != a_id and dict(restored)["A sửa"] == a_id
+
+
+def test_invalid_backup_changes_nothing(backed_up):
+    client, _, _ = backed_up
+    before = events(client)
+    r = restore(client, b'{"sessions": [{"events": [', "merge_id")
+    assert r.status_code == 400
+    assert events(client) == before
+
+
+def test_cli_restore_runs_under_the_data_lock(app_module, backed_up, tmp_path, monkeypatch):
+    client, backup, _ = backed_up
+    path = tmp_path / "backup.json"
+    path.write_bytes(backup)
+    depths = []
+    apply_batch = app_module.apply_batch
+
+    def spy(*args, **kwargs):
+        depths.append(getattr(app_module._data_lock_depth, "n", 0))
+        return apply_batch(*args, **kwargs)
+
+    monkeypatch.setattr(app_module, "apply_batch", spy)
+    result = app_module.app.test_cli_runner().invoke(args=["restore", str(path)])
+    assert result.exit_code == 0, result.output
+    assert depths and depths[0] > 0
+    assert {t for t, _ in events(client)} == {"A", "B", "C"}
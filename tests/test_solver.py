@@ -0,0 +1,46 @@
+import datetime as dt
+
+from conftest import make_event
+
+WEEK = "2025-09-01"
+
+
+def solve(client, requests, **extra):
+    r = client.post("/api/solver/week", json={"week": WEEK, "requests": requests, **extra})
+    assert r.status_code == 200, r.get_data(as_text=True)
+    return r.get_json()
+
+
+def test_requests_without_rooms_use_the_tenant_rooms(app_module, client):
+    result = solve(client, [{"title": "Họp dự án", "duration": 60, "chair": "CEO"}])
+    (a,) = result["assignments"]
+    assert a["status"] == "placed"
+    assert a["room"] in app_module.ROOMS
+    assert (a["date"], a["start_time"], a["end_time"]) == ("2025-09-01", "07:30", "08:30")
+
+    many = solve(client, [{"title": f"Họp {i}", "duration": 45} for i in range(150)])
+    assert many["stats"]["unplaced"] == 0
+
+
+def test_commit_writes_placed_meetings(client):
+    result = solve(client, [{"title": "Họp kho", "duration": 30, "chair": "CFO", "rooms": ["Phòng họp 2"],
+                             "days": ["2025-09-03"], "buoi": ["CHIỀU"]}], commit=True)
+    assert result["committed"] is True
+    (a,) = result["assignments"]
+    assert (a["status"], a["date"], a["buoi"], a["room"]) == ("placed", "2025-09-03", "CHIỀU", "Phòng họp 2")
+    events = client.get("/api/events").get_json()["events"]
+    assert [(ev["id"], ev["title"], ev["start_time"]) for ev in events] == [(a["event_id"], "Họp kho", "13:00")]
+
+
+def test_busy_chair_gets_least_conflicting_slot_with_explanation(client):
+    # CEO bận kín mọi buổi trong tuần
+    for i in range(6):
+        day = (dt.date.fromisoformat(WEEK) + dt.timedelta(days=i)).isoformat()
+        client.post("/event", data=make_event(date=day, start="07:30", end="12:00", title=f"Bận sáng {i}"))
+        client.post("/event", data=make_event(date=day, start="13:00", end="17:30", title=f"Bận chiều {i}"))
+
+    result = solve(client, [{"title": "Họp gấp", "duration": 60, "chair": "CEO"}])
+    (a,) = result["assignments"]
+    assert a["status"] == "conflict"
+    assert a["conflicts"] and all(c["shared"] == ["CEO"] for c in a["conflicts"])
+    assert a["conflicts"][0]["with"].startswith("Bận")
@@ -0,0 +1,77 @@
+from conftest import ADMIN, make_event
+
+def test_streams_over_cap_fall_back_to_polling(app_module, client):
+    client.post("/event", data=make_event())
+    sid = app_module.session_id_from_date(app_module.dt.date(2025, 9, 2))
+    held = []
+    for _ in range(app_module.SSE_MAX_STREAMS):
+        r = client.get(f"/stream/{sid}", buffered=False)
+        assert next(iter(r.response)).decode().startswith("retry: 3000")
+        held.append(r)
+    pools = client.get("/admin/pools", headers=ADMIN).get_json()["pools"]
+    assert pools["sse"]["active"] == app_module.SSE_MAX_STREAMS
+    # Stream đang mở không chiếm chỗ của trang thường
+    assert pools["interactive"]["active"] == 1  # chính request /admin/pools
+
+    # Quá giới hạn: gửi phần đã lỡ (since=0) rồi đóng ngay, trình duyệt hỏi lại sau SSE_POLL_SECONDS
+    r = client.get(f"/stream/{sid}?since=0", buffered=False)
+    body = "".join(chunk.decode() for chunk in r.response)
+    assert body.startswith(f"retry: {app_module.SSE_POLL_SECONDS * 1000}")
+    assert "event: " in body
+
+    for r in held:
+        r.close()
+    assert client.get("/admin/pools", headers=ADMIN).get_json()["pools"]["sse"]["active"] == 0
+
+
+def test_thread_budget_counts_sse_streams(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "WORKER_THREADS", 12)
+    pools = app_module.build_admission_pools()
+    assert (pools["sse"].workers, pools["heavy"].workers, pools["heavy"].queue) == (4, 2, 2)
+    monkeypatch.setattr(app_module, "WORKER_THREADS", 8)
+    pools = app_module.build_admission_pools()
+    assert (pools["sse"].workers, pools["heavy"].queue) == (2, 0)
+    monkeypatch.setattr(app_module, "WORKER_THREADS", 6)
+    pools = app_module.build_admission_pools()
+    assert pools["sse"].workers == 0 and not pools["sse"].enter()
+
+
+def test_broker_drains_rotated_log_before_switching(app_module, tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, "BROKER_MAX_BYTES", 200)
+    monkeypatch.setattr(app_module, "BROKER_POLL_SECONDS", 0.5)
+    broker = app_module.ChangeBroker(str(tmp_path / "changes.log"))
+    change = lambda v: {"op": "delete", "session_id": "s", "version": v, "event_id": "x" * 80}
+    broker.publish([change(1)])
+    q = broker.subscribe("s")
+    app_module.time.sleep(0.1)  # Luồng đọc mở file trước khi ghi tiếp
+    try:
+        broker.publish([change(2), change(3)])  # Vượt ngưỡng -> đổi tên thành .1 khi chưa ai đọc
+        broker.publish([change(4)])
+        got = [q.get(timeout=3)["version"] for _ in range(3)]
+    finally:
+        broker.stopped = True
+    assert got == [2, 3, 4]
+
+
+def test_stream_gap_sends_resync(app_module, client):
+    client.post("/event", data=make_event())
+    sid = app_module.session_id_from_date(app_module.dt.date(2025, 9, 2))
+    r = client.get(f"/stream/{sid}", buffered=False)
+    chunks = iter(r.response)
+    next(chunks)
+    broker = next(iter(app_module.tenants.loaded.values())).change_broker
+    broker._dispatch({"op": "delete", "session_id": sid, "version": 3, "event_id": "x"})
+    assert next(chunks).decode().startswith("event: resync")
+    r.close()
+
+
+def test_unread_stream_does_not_leak_subscriber(app_module, client):
+    client.post("/event", data=make_event())
+    sid = app_module.session_id_from_date(app_module.dt.date(2025, 9, 2))
+    broker = next(iter(app_module.tenants.loaded.values())).change_broker
+    with app_module.app.test_request_context(f"/stream/{sid}"):
+        r = app_module.stream_session(sid)
+    # Response không bao giờ được đọc (client ngắt trước khi gửi byte đầu) -> không giữ subscriber
+    assert broker.subscribers == {}
+    r.close()
+    assert broker.subscribers == {}
@@ -0,0 +1,72 @@
+import json
+import threading
+
+import pytest
+
+from conftest import make_event
+
+
+def test_concurrent_posts_keep_every_event(app_module, client):
+    errors, statuses = [], []
+
+    def worker(n):
+        c = app_module.app.test_client()
+        for i in range(10):
+            try:
+                r = c.post("/event", data={**make_event(start=f"{8 + i % 8:02d}:00", end=f"{8 + i % 8:02d}:30",
+                                                        title=f"Họp {n}-{i}"), "attendees": "CFO"})
+                statuses.append(r.status_code)
+            except Exception as e:  # pragma: no cover - chỉ để báo lỗi rõ ràng
+                errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert statuses and all(s == 302 for s in statuses)
+    with open(app_module.DATA_PATH, encoding="utf-8") as f:
+        data = json.load(f)
+    titles = {ev["title"] for s in data["sessions"] for ev in s["events"]}
+    assert titles == {f"Họp {n}-{i}" for n in range(8) for i in range(10)}
+
+
+def test_save_data_replaces_file_atomically(app_module, monkeypatch):
+    with app_module.app.test_request_context():
+        data = app_module.load_data()
+        app_module.get_or_create_session(data, app_module.dt.date(2025, 9, 2))
+        inode = app_module.os.stat(app_module.DATA_PATH).st_ino
+        app_module.save_data(data)
+        # Ghi ra file tạm rồi os.replace: file cũ không bị ghi đè tại chỗ, không còn file tạm
+        assert app_module.os.stat(app_module.DATA_PATH).st_ino != inode
+        assert not [p for p in app_module.os.listdir(app_module.os.path.dirname(app_module.DATA_PATH)) if p.endswith(".tmp")]
+
+
+def test_snapshot_round_trips_json_store(app_module, client):
+    client.post("/event", data={**make_event(title="Họp snapshot"), "attendees": "CFO, Kế toán"})
+    client.post("/event", data=make_event(date="2025-09-10", title="Tuần sau", location="Phòng 2"))
+    with app_module.app.test_request_context():
+        data = app_module.load_data()
+        snap = app_module.current_snapshot()
+        assert snap is not None
+        assert snap.registry_epoch == app_module.name_registry.epoch
+        by_id = {s["id"]: s for s in snap.sessions()}
+        for s in data["sessions"]:
+            assert app_module.session_event_count(by_id[s["id"]]) == len(s["events"])
+            assert by_id[s["id"]]["events"] == s["events"]
+
+
+def test_snapshot_decodes_strings_lazily(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, "SNAPSHOT_STRING_CACHE", 2)
+    client.post("/event", data=make_event(title="Họp chuỗi", location="Phòng Đông"))
+    with app_module.app.test_request_context():
+        app_module.load_data_readonly()
+        snap = app_module.Snapshot(app_module.current_tenant().snapshot_path)
+        assert not hasattr(snap, "strings")  # Không giải mã cả bảng chuỗi khi mở
+        ev = snap.sessions()[0]["events"][0]
+        assert (ev["title"], ev["location"]) == ("Họp chuỗi", "Phòng Đông")
+        assert snap.string.cache_info().currsize <= 2
+        with pytest.raises(IndexError):
+            snap.string(snap.n_strings)
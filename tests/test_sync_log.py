@@ -0,0 +1,32 @@
+import threading
+
+
+def test_reads_never_straddle_a_compaction(app_module, tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, "SYNC_LOG_MAX_ENTRIES", 40)
+    log = app_module.SyncLog(str(tmp_path / "sync.log"))
+    reader_log = app_module.SyncLog(log.path)  # như một worker khác: chỉ mục riêng, cùng file
+    done, problems = threading.Event(), []
+
+    def writer():
+        for n in range(400):
+            log.append([{"op": "delete", "session_id": "2025-W36", "event_id": f"e{n}"}])
+        done.set()
+
+    def reader():
+        while not done.is_set():
+            try:
+                latest, entries, reset = reader_log.read(max(reader_log.latest() - 10, 0), 100)
+            except ValueError as e:  # dòng JSON bị cắt ngang: đọc trúng file vừa bị nén
+                problems.append(e)
+                continue
+            seqs = [e["seq"] for e in entries]
+            if not reset and seqs != list(range(seqs[0], seqs[0] + len(seqs)) if seqs else []):
+                problems.append(seqs)
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not problems
+    assert log.latest() == reader_log.latest() == 400
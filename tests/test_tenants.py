@@ -0,0 +1,36 @@
+import os
+
+from conftest import ADMIN, make_event
+
+
+def create_tenant(app_module, slug, company):
+    result = app_module.app.test_cli_runner().invoke(args=["tenant-create", slug, "--company", company])
+    assert result.exit_code == 0, result.output
+
+
+def titles(response):
+    return sorted(ev["title"] for ev in response.get_json()["events"])
+
+
+def test_tenants_keep_data_indexes_and_registry_apart(app_module, client):
+    create_tenant(app_module, "hn", "Chi nhánh Hà Nội")
+    client.post("/event", data=make_event(title="Họp trụ sở", chair="Zed Person"))
+    assert client.post("/t/hn/event", data=make_event(title="Họp Hà Nội", chair="Zed Person")).status_code == 302
+
+    assert titles(client.get("/api/events")) == ["Họp trụ sở"]
+    assert titles(client.get("/t/hn/api/events")) == ["Họp Hà Nội"]
+    assert "Họp Hà Nội" not in client.get("/?date=2025-09-02").get_data(as_text=True)
+    assert "Chi nhánh Hà Nội" in client.get("/t/hn/?date=2025-09-02").get_data(as_text=True)
+    assert os.path.isfile(app_module.tenant_paths("hn")["data"])
+
+    # Gộp alias ở chi nhánh không ảnh hưởng danh mục của trụ sở
+    r = client.post("/t/hn/api/registry/alias", json={"alias": "Zed Person", "name": "CFO"}, headers=ADMIN)
+    assert r.status_code == 200
+    assert titles(client.get("/t/hn/api/events?chair=CFO")) == ["Họp Hà Nội"]
+    assert titles(client.get("/api/events?chair=CFO")) == []
+    assert titles(client.get("/api/events?chair=Zed Person")) == ["Họp trụ sở"]
+
+
+def test_unknown_tenant_is_404(client):
+    assert client.get("/t/khong-co/").status_code == 404
+    assert client.get("/t/../api/events").status_code == 404